@@ -0,0 +1,4944 @@
+"""
+Barebones pure-python PostGreSQL
+
+"""
+# Copyright (C) 2001-2008 Barry Pederson <bp@barryp.org>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+
+import binascii
+import datetime
+import errno
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import select
+import socket
+import sys
+import time
+import types
+import uuid
+from collections import deque
+from collections import OrderedDict
+from decimal import Decimal
+from functools import partial
+from itertools import chain, islice
+from struct import pack as _pack
+from struct import unpack as _unpack
+from struct import Struct as _Struct
+
+if sys.version_info > (3,):
+    long = int
+    unicode = str
+    basestring = str
+else:
+    from exceptions import *
+
+#
+# See Python sys.version and sys.version_info
+#
+version = '2.0 alpha 2'
+version_info = (2, 0, 0, 'alpha', 2)
+
+#
+# Module Globals specified by DB-API 2.0
+#
+apilevel = '2.0'
+threadsafety = 1          # Threads may share the module, but not connections.
+paramstyle = 'pyformat'   # we also understand plain-format
+
+#
+# Constructors specified by DB-API 2.0
+#
+Date = datetime.date
+Time = datetime.time
+Timestamp = datetime.datetime
+DateFromTicks = datetime.date.fromtimestamp
+
+def TimeFromTicks(t):
+    dt = datetime.datetime.fromtimestamp(t)
+    return datetime.time(dt.hour, dt.minute, dt.second)
+
+TimestampFromTicks = datetime.datetime.fromtimestamp
+
+class Binary(bytes):
+    """
+    Wrapper class for plain byte string to indicate it
+    should be passed as a binary value to PostgreSQL.
+
+    """
+    pass
+
+#
+# Type identifiers specified by DB-API 2.0
+#
+STRING = object()
+BINARY = object()
+NUMBER = object()
+DATETIME = object()
+ROWID = object()
+
+#
+# Exception hierarchy from DB-API 2.0 spec
+#
+class Error(Exception):
+    """
+    Exception that is the base class of all other error
+     You can use this to catch all errors with one
+    single 'except' statement. Warnings are not considered
+    errors and thus should not use this class as base.
+
+    """
+    pass
+
+class Warning(Exception):
+    """
+    Exception raised for important warnings like data
+    truncations while inserting, etc.
+
+    """
+    pass
+
+class InterfaceError(Error):
+    """
+    Exception raised for errors that are related to the
+    database interface rather than the database itself.
+
+    """
+    pass
+
+class DatabaseError(Error):
+    """
+    Exception raised for errors that are related to the
+    database.
+
+    """
+    pass
+
+class InternalError(DatabaseError):
+    """
+    Exception raised when the database encounters an internal
+    error, e.g. the cursor is not valid anymore, the
+    transaction is out of sync, etc.
+
+    """
+    pass
+
+class OperationalError(DatabaseError):
+    """
+    Exception raised for errors that are related to the
+    database's operation and not necessarily under the control
+    of the programmer, e.g. an unexpected disconnect occurs,
+    the data source name is not found, a transaction could not
+    be processed, a memory allocation error occurred during
+    processing, etc.
+
+    """
+    pass
+
+class ProgrammingError(DatabaseError):
+    """
+    Exception raised for programming errors, e.g. table not
+    found or already exists, syntax error in the SQL
+    statement, wrong number of parameters specified, etc.
+
+    """
+    pass
+
+class IntegrityError(DatabaseError):
+    """
+    Exception raised when the relational integrity of the
+    database is affected, e.g. a foreign key check fails.
+
+    """
+    pass
+
+class DataError(DatabaseError):
+    """
+    Exception raised for errors that are due to problems with
+    the processed data like division by zero, numeric value
+    out of range, etc.
+
+    """
+    pass
+
+class NotSupportedError(DatabaseError):
+    """
+    Exception raised in case a method or database API was used
+    which is not supported by the database, e.g. requesting a
+    .rollback() on a connection that does not support
+    transaction or has transactions turned off.
+
+    """
+    pass
+
+#
+# Custom exceptions raised by this driver
+#
+
+class PostgreSQL_Timeout(InterfaceError):
+    """
+    Exception raised by wait_notify() when timeout has expired.
+
+    """
+    pass
+
+class QueryTimeout(OperationalError):
+    """
+    Exception raised when a command executed with a timeout
+    ran over it and was canceled.
+
+    """
+    pass
+
+
+#
+# Constants relating to Large Object support
+#
+INV_WRITE   = 0x00020000
+INV_READ    = 0x00040000
+
+SEEK_SET    = 0
+SEEK_CUR    = 1
+SEEK_END    = 2
+
+
+################################
+#
+# Type conversion functions
+
+
+_OCTAL_ESCAPE = re.compile(br'\\(\d\d\d)')
+
+def _binary_to_python(s):
+    """
+    Convert a PgSQL binary value to a plain Python string.  Handles
+    both the 'hex' and older 'escape' bytea output formats.
+
+    """
+    if s.startswith(b'\\x'):
+        return Binary(binascii.unhexlify(s[2:]))
+    s = _OCTAL_ESCAPE.sub(lambda x: _pack('B', int(x.group(1), 8)), s)
+    return Binary(s.replace(b'\\\\', b'\\'))
+
+
+def _bool_to_python(s):
+    """
+    Convert PgSQL boolean string to Python boolean
+
+    """
+    if s == b't':
+        return True
+    if s == b'f':
+        return False
+    raise InterfaceError('Boolean type came across as unknown value [%r]' % s)
+
+
+def _char_to_python(s):
+    """
+    Convert character data, which should be utf-8 strings, to Python Unicode strings
+
+    """
+    return s.decode('utf-8')
+
+
+def _date_to_python(s):
+    """
+    Convert date string to Python datetime.date object
+
+    """
+    y, m, d = s.split(b'-')
+    return datetime.date(int(y), int(m), int(d))
+
+
+def _numeric_to_python(s):
+    """
+    Convert numeric string to Python Decimal object
+
+    """
+    return Decimal(s.decode('ascii'))
+
+
+class _SimpleTzInfo(datetime.tzinfo):
+    """
+    Concrete subclass of datetime.tzinfo that can represent
+    the hour and minute offsets PgSQL supplies in the
+    '... with time zone' types.
+
+    """
+    def __init__(self, tz):
+        super(_SimpleTzInfo, self).__init__()
+        if isinstance(tz, datetime.timedelta):
+            self.offset = tz
+            return
+        if ':' in tz:
+            hour, minute = tz.split(':')[:2]
+        else:
+            hour = tz
+            minute = 0
+        hour = int(hour)
+        minute = int(minute)
+        if hour < 0:
+            minute = -minute
+        self.offset = datetime.timedelta(hours=hour, minutes=minute)
+
+    def dst(self, dt):
+        return None
+
+    def utcoffset(self, dt):
+        return self.offset
+
+
+def _time_to_python(timepart):
+    """
+    Convert time string to Python datetime.time object
+
+    """
+    timepart = timepart.decode('ascii')
+    if '+' in timepart:
+        timepart, tz = timepart.split('+')
+        tz = _SimpleTzInfo(tz)
+    elif '-' in timepart:
+        timepart, tz = timepart.split('-')
+        tz = _SimpleTzInfo('-' + tz)
+    else:
+        tz = None
+
+    hour, minute, second = timepart.split(':')
+    if '.' in second:
+        second, frac = second.split('.')
+        frac = int(Decimal('0.' + frac) * 1000000)
+    else:
+        frac = 0
+
+    return datetime.time(int(hour), int(minute), int(second), frac, tz)
+
+
+def _timestamp_to_python(s):
+    """
+    Convert timestamp string to Python datetime.datetime object
+
+    """
+    datepart, timepart = s.split(b' ')
+    d = _date_to_python(datepart)
+    t = _time_to_python(timepart)
+    return datetime.datetime(d.year, d.month, d.day,
+        t.hour, t.minute, t.second,
+        t.microsecond, t.tzinfo)
+
+
+def _uuid_to_python(s):
+    """
+    Convert uuid string to Python uuid.UUID object
+
+    """
+    return uuid.UUID(s.decode('ascii'))
+
+
+#
+# Conversion functions for values sent by the server in binary format,
+# the formats are defined by the <type>send() functions in the server
+# source (src/backend/utils/adt).
+#
+_INT2_BINARY = _Struct('!h')
+_INT4_BINARY = _Struct('!i')
+_INT8_BINARY = _Struct('!q')
+_OID_BINARY = _Struct('!I')
+_FLOAT4_BINARY = _Struct('!f')
+_FLOAT8_BINARY = _Struct('!d')
+_TIMETZ_BINARY = _Struct('!qi')
+_NUMERIC_HEADER_BINARY = _Struct('!hhHh')
+
+_PG_EPOCH = datetime.datetime(2000, 1, 1)
+_PG_EPOCH_ORDINAL = _PG_EPOCH.toordinal()
+_UTC = _SimpleTzInfo(datetime.timedelta(0))
+
+_NUMERIC_SIGNS = {
+    0x0000: 0,
+    0x4000: 1,
+    }
+_NUMERIC_SPECIALS = {
+    0xC000: Decimal('NaN'),
+    0xD000: Decimal('Infinity'),
+    0xF000: Decimal('-Infinity'),
+    }
+
+def _binary_int2_to_python(s):
+    return _INT2_BINARY.unpack(s)[0]
+
+def _binary_int4_to_python(s):
+    return _INT4_BINARY.unpack(s)[0]
+
+def _binary_int8_to_python(s):
+    return _INT8_BINARY.unpack(s)[0]
+
+def _binary_oid_to_python(s):
+    return _OID_BINARY.unpack(s)[0]
+
+def _binary_float4_to_python(s):
+    return _FLOAT4_BINARY.unpack(s)[0]
+
+def _binary_float8_to_python(s):
+    return _FLOAT8_BINARY.unpack(s)[0]
+
+def _binary_bool_to_python(s):
+    return s != b'\0'
+
+def _binary_bytea_to_python(s):
+    return Binary(s)
+
+def _binary_uuid_to_python(s):
+    return uuid.UUID(bytes=s)
+
+
+def _binary_date_to_python(s):
+    """
+    Convert binary date, a count of days since 2000-01-01,
+    to Python datetime.date object
+
+    """
+    days = _INT4_BINARY.unpack(s)[0]
+    try:
+        return datetime.date.fromordinal(_PG_EPOCH_ORDINAL + days)
+    except (ValueError, OverflowError):
+        raise DataError('date out of range for Python: %d days from 2000-01-01' % days)
+
+
+def _usecs_to_time(usecs, tz=None):
+    seconds, usec = divmod(usecs, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return datetime.time(hour, minute, second, usec, tz)
+
+
+def _binary_time_to_python(s):
+    """
+    Convert binary time, a count of microseconds since
+    midnight, to Python datetime.time object
+
+    """
+    return _usecs_to_time(_INT8_BINARY.unpack(s)[0])
+
+
+def _binary_timetz_to_python(s):
+    """
+    Convert binary 'time with time zone', microseconds since midnight
+    followed by the zone's offset in seconds west of UTC, to Python
+    datetime.time object
+
+    """
+    usecs, zone = _TIMETZ_BINARY.unpack(s)
+    return _usecs_to_time(usecs, _SimpleTzInfo(datetime.timedelta(seconds=-zone)))
+
+
+def _binary_timestamp_to_python(s):
+    """
+    Convert binary timestamp, a count of microseconds since
+    2000-01-01 00:00:00, to Python datetime.datetime object
+
+    """
+    usecs = _INT8_BINARY.unpack(s)[0]
+    try:
+        return _PG_EPOCH + datetime.timedelta(microseconds=usecs)
+    except OverflowError:
+        raise DataError('timestamp out of range for Python: %d microseconds from 2000-01-01' % usecs)
+
+
+def _binary_timestamptz_to_python(s):
+    """
+    Convert binary 'timestamp with time zone', which is always sent
+    in UTC, to Python datetime.datetime object
+
+    """
+    return _binary_timestamp_to_python(s).replace(tzinfo=_UTC)
+
+
+def _binary_numeric_to_python(s):
+    """
+    Convert binary numeric to Python Decimal object.  The value is sent
+    as a header followed by base-10000 digits, 'weight' is the power of
+    10000 of the first digit and 'dscale' the number of decimal digits
+    after the point.
+
+    """
+    ndigits, weight, sign, dscale = _NUMERIC_HEADER_BINARY.unpack_from(s)
+    if sign in _NUMERIC_SPECIALS:
+        return _NUMERIC_SPECIALS[sign]
+
+    digits = []
+    for d in _unpack('!%dh' % ndigits, s[8:8 + 2 * ndigits]):
+        digits.extend((d // 1000, d // 100 % 10, d // 10 % 10, d % 10))
+
+    # Line up the last digit with the display scale
+    exponent = 4 * (weight - ndigits + 1)
+    if exponent + dscale > 0:
+        digits.extend([0] * (exponent + dscale))
+    elif exponent + dscale < 0:
+        del digits[exponent + dscale:]
+
+    return Decimal((_NUMERIC_SIGNS[sign], tuple(digits) or (0,), -dscale))
+
+
+_ESCAPE_CHARS = re.compile("[\x00-\x1f'\\\\\x7f]")
+def _binary_to_pgsql(b):
+    """
+    Convert a python string (probably subclassed as 'Binary') to
+    a PgSQL bytea, using the hex input format.
+
+    """
+    return "'\\x%s'::bytea" % binascii.hexlify(b).decode('ascii')
+
+
+def _datetime_to_pgsql(dt):
+    """
+    Convert Python datetime.datetime to PgSQL timestamp.
+    """
+    if dt.tzinfo:
+        return "'%s'::timestamp with time zone" % dt.isoformat(' ')
+    return "'%s'::timestamp" % dt.isoformat(' ')
+
+
+def _time_to_pgsql(t):
+    """
+    Convert Python datetime.time to PgSQL time.
+
+    """
+    if t.tzinfo:
+        return "'%s'::time with time zone" % t.isoformat()
+    return "'%s'::time" % t.isoformat()
+
+
+#
+# Type oids of the builtin PgSQL types we send parameters as, these are
+# fixed in the server source (src/include/catalog/pg_type.dat)
+#
+_UNKNOWN_OID = 0
+_BOOL_OID = 16
+_BYTEA_OID = 17
+_INT8_OID = 20
+_INT2_OID = 21
+_INT4_OID = 23
+_FLOAT8_OID = 701
+_DATE_OID = 1082
+_TIME_OID = 1083
+_TIMESTAMP_OID = 1114
+_TIMESTAMPTZ_OID = 1184
+_TIMETZ_OID = 1266
+_NUMERIC_OID = 1700
+
+def _datetime_param_type(dt):
+    if dt.utcoffset() is None:
+        return _TIMESTAMP_OID
+    return _TIMESTAMPTZ_OID
+
+
+def _time_param_type(t):
+    if t.utcoffset() is None:
+        return _TIME_OID
+    return _TIMETZ_OID
+
+
+def _int_param_type(n):
+    """
+    Pick the smallest of int4, int8 or numeric that can hold a Python int
+    or long, so the server sees the same types as for a literal.
+
+    """
+    if -0x80000000 <= n <= 0x7fffffff:
+        return _INT4_OID
+    if -0x8000000000000000 <= n <= 0x7fffffffffffffff:
+        return _INT8_OID
+    return _NUMERIC_OID
+
+
+#
+# Map Python classes to callables that return the type oid to use
+# when sending values of that class as statement parameters.  Strings
+# go across as 'unknown' so the server works out the type from the
+# context, the same as it would for a quoted literal.
+#
+_PARAM_TYPES = {
+    type(None): lambda x: _UNKNOWN_OID,
+    bool: lambda x: _BOOL_OID,
+    int: _int_param_type,
+    long: _int_param_type,
+    float: lambda x: _FLOAT8_OID,
+    Decimal: lambda x: _NUMERIC_OID,
+    str: lambda x: _UNKNOWN_OID,
+    unicode: lambda x: _UNKNOWN_OID,
+    Binary: lambda x: _BYTEA_OID,
+    datetime.datetime: _datetime_param_type,
+    datetime.date: lambda x: _DATE_OID,
+    datetime.time: _time_param_type,
+    }
+
+if bytes is not str:
+    _PARAM_TYPES[bytes] = _PARAM_TYPES[Binary]
+
+
+def _text_param(x):
+    if not isinstance(x, basestring):
+        x = unicode(x)
+    return _encode(x)
+
+
+def _numeric_param(x):
+    """
+    Convert a Decimal, or an int too big for int8, to PgSQL's
+    binary numeric format, the reverse of _binary_numeric_to_python()
+
+    """
+    if not isinstance(x, Decimal):
+        x = Decimal(x)
+    sign, digits, exponent = x.as_tuple()
+    if exponent in ('n', 'N'):
+        return _NUMERIC_HEADER_BINARY.pack(0, 0, 0xC000, 0)
+    if exponent == 'F':
+        return _NUMERIC_HEADER_BINARY.pack(0, 0, sign and 0xF000 or 0xD000, 0)
+
+    dscale = max(0, -exponent)
+    digits = ''.join([str(d) for d in digits]) + '0' * max(0, exponent)
+
+    # pad both sides to whole base-10000 digits around the decimal point
+    int_len = len(digits) - dscale
+    if int_len < 0:
+        digits = '0' * -int_len + digits
+        int_len = 0
+    digits = '0' * (-int_len % 4) + digits + '0' * (-dscale % 4)
+    weight = (int_len + 3) // 4 - 1
+
+    groups = [int(digits[i:i+4]) for i in range(0, len(digits), 4)]
+    while groups and not groups[0]:
+        del groups[0]
+        weight -= 1
+    while groups and not groups[-1]:
+        del groups[-1]
+    if not groups:
+        weight = 0
+
+    return _NUMERIC_HEADER_BINARY.pack(len(groups), weight, sign and 0x4000 or 0, dscale) \
+        + _pack('!%dh' % len(groups), *groups)
+
+
+def _time_usecs(t):
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1000000 + t.microsecond
+
+
+def _timestamp_param(dt):
+    delta = dt - _PG_EPOCH
+    return _INT8_BINARY.pack((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _timestamptz_param(dt):
+    return _timestamp_param((dt - dt.utcoffset()).replace(tzinfo=None))
+
+
+def _timetz_param(t):
+    return _TIMETZ_BINARY.pack(_time_usecs(t), -(t.utcoffset().days * 86400 + t.utcoffset().seconds))
+
+
+#
+# Map the type oids picked above to the format code (0 for text, 1 for
+# binary) to send values in, and callables that turn a Python value into
+# that format for the type.  The binary formats are the ones read by the
+# <type>recv() functions in the server source.
+#
+_PARAM_ENCODERS = {
+    _UNKNOWN_OID: (0, _text_param),
+    _BOOL_OID: (1, lambda x: x and b'\x01' or b'\x00'),
+    _BYTEA_OID: (1, bytes),
+    _INT4_OID: (1, _INT4_BINARY.pack),
+    _INT8_OID: (1, _INT8_BINARY.pack),
+    _NUMERIC_OID: (1, _numeric_param),
+    _FLOAT8_OID: (1, _FLOAT8_BINARY.pack),
+    _DATE_OID: (1, lambda x: _INT4_BINARY.pack(x.toordinal() - _PG_EPOCH_ORDINAL)),
+    _TIME_OID: (1, lambda x: _INT8_BINARY.pack(_time_usecs(x))),
+    _TIMETZ_OID: (1, _timetz_param),
+    _TIMESTAMP_OID: (1, _timestamp_param),
+    _TIMESTAMPTZ_OID: (1, _timestamptz_param),
+    }
+
+#
+# Types that a parameter can be sent as if a statement was
+# already prepared for a wider type
+#
+_WIDER_PARAM_TYPES = {
+    _INT4_OID: (_INT8_OID, _NUMERIC_OID),
+    _INT8_OID: (_NUMERIC_OID,),
+    }
+
+
+################
+#
+# Binary COPY encoding, used by Cursor.copy_records().  Here the
+# column's type decides the format, so the encoders are looked up by
+# PgSQL type name, and produce whole fields: the int32 length followed
+# by the value in the type's binary format.
+#
+
+_COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\0' + _pack('!ii', 0, 0)
+_COPY_BINARY_TRAILER = _INT2_BINARY.pack(-1)
+_COPY_NULL_FIELD = _INT4_BINARY.pack(-1)
+
+def _fixed_copy_field(fmt, convert=None):
+    st = _Struct('!i' + fmt)
+    size = st.size - 4
+    pack = st.pack
+    if convert is None:
+        return partial(pack, size)
+    return lambda x: pack(size, convert(x))
+
+
+def _copy_field(encode):
+    pack = _INT4_BINARY.pack
+    def field(x):
+        data = encode(x)
+        return pack(len(data)) + data
+    return field
+
+
+def _copy_text(x, pack=_INT4_BINARY.pack):
+    if isinstance(x, unicode):
+        x = x.encode('utf-8')
+    elif not isinstance(x, bytes):
+        x = _text_param(x)
+    return pack(len(x)) + x
+
+
+def _copy_timestamptz(dt):
+    # naive datetimes are taken to be in UTC
+    if dt.utcoffset() is None:
+        return _timestamp_param(dt)
+    return _timestamptz_param(dt)
+
+
+def _copy_timetz(t):
+    if t.utcoffset() is None:
+        t = t.replace(tzinfo=_UTC)
+    return _timetz_param(t)
+
+
+def _json_text(x):
+    """
+    Strings are taken to be JSON text already, other values
+    are serialized with json.dumps().
+
+    """
+    if isinstance(x, (basestring, bytes)):
+        return _text_param(x)
+    try:
+        return _encode(json.dumps(x))
+    except (TypeError, ValueError) as e:
+        raise DataError("Can't copy %r into a json column: %s" % (x, e))
+
+
+def _uuid_param(x):
+    if not isinstance(x, uuid.UUID):
+        x = uuid.UUID(x)
+    return x.bytes
+
+
+_COPY_ENCODERS = {
+    'bool': _fixed_copy_field('?'),
+    'int2': _fixed_copy_field('h'),
+    'int4': _fixed_copy_field('i'),
+    'int8': _fixed_copy_field('q'),
+    'oid': _fixed_copy_field('I'),
+    'float4': _fixed_copy_field('f'),
+    'float8': _fixed_copy_field('d'),
+    'numeric': _copy_field(_numeric_param),
+    'bytea': _copy_field(bytes),
+    'char': _copy_text,
+    'bpchar': _copy_text,
+    'varchar': _copy_text,
+    'text': _copy_text,
+    'name': _copy_text,
+    'json': _copy_field(_json_text),
+    'jsonb': _copy_field(lambda x: b'\x01' + _json_text(x)),
+    'uuid': _copy_field(_uuid_param),
+    'date': _fixed_copy_field('i', lambda x: x.toordinal() - _PG_EPOCH_ORDINAL),
+    'time': _fixed_copy_field('q', _time_usecs),
+    'timetz': _copy_field(_copy_timetz),
+    'timestamp': _copy_field(_timestamp_param),
+    'timestamptz': _copy_field(_copy_timestamptz),
+    }
+
+
+def _copy_binary_chunks(records, encoders, size):
+    """
+    Generate PgSQL's binary COPY format for an iterable of records
+    (sequences of Python values), in chunks of about size bytes.
+
+    """
+    nfields = len(encoders)
+    count = _INT2_BINARY.pack(nfields)
+    null = _COPY_NULL_FIELD
+    pending = [_COPY_BINARY_HEADER]
+    append = pending.append
+    extend = pending.extend
+
+    # Rather than adding up the size of every field, count the pieces
+    # and guess how many make up a chunk from the previous chunk
+    limit = max(size // 16, 1)
+    for record in records:
+        if len(record) != nfields:
+            raise ProgrammingError('Record has %d fields, but %d columns are being copied' % (len(record), nfields))
+        append(count)
+        extend([null if value is None else encode(value) for encode, value in zip(encoders, record)])
+        if len(pending) >= limit:
+            data = b''.join(pending)
+            limit = max(size * len(pending) // max(len(data), 1), 1)
+            del pending[:]
+            yield data
+    append(_COPY_BINARY_TRAILER)
+    yield b''.join(pending)
+
+
+class _BinaryRecordParser(object):
+    """
+    Incremental parser of PgSQL's binary COPY format.  feed() it byte
+    strings, which don't have to split it at any particular place, and
+    it returns the tuples of values converted by the decoders that have
+    been completed.  .finished is set once the trailer is seen.
+
+    """
+    def __init__(self, decoders):
+        self.decoders = decoders
+        self.header = True
+        self.finished = False
+        self.rest = b''
+
+    def feed(self, chunk):
+        decoders = self.decoders
+        nfields = len(decoders)
+        unpack_int32 = _INT4_BINARY.unpack_from
+        unpack_int16 = _INT2_BINARY.unpack_from
+        rows = []
+        rest = self.rest
+        data = rest + chunk if rest else chunk
+        end = len(data)
+        pos = 0
+
+        if self.header:
+            if end < 19:
+                self.rest = data
+                return rows
+            if data[:11] != _COPY_BINARY_HEADER[:11]:
+                raise InterfaceError('Unrecognized binary COPY header')
+            pos = 19 + unpack_int32(data, 15)[0]    # skip header extension
+            if pos > end:
+                self.rest = data
+                return rows
+            self.header = False
+
+        while end - pos >= 2:
+            count = unpack_int16(data, pos)[0]
+            if count == -1:
+                self.finished = True
+                self.rest = b''
+                return rows
+            if count != nfields:
+                raise InterfaceError('Binary COPY tuple has %d fields, expected %d' % (count, nfields))
+            p = pos + 2
+            row = []
+            for decode in decoders:
+                if end - p < 4:
+                    break
+                size = unpack_int32(data, p)[0]
+                p += 4
+                if size < 0:
+                    row.append(None)
+                elif end - p < size:
+                    break
+                else:
+                    row.append(decode(data[p:p+size]))
+                    p += size
+            else:
+                rows.append(tuple(row))
+                pos = p
+                continue
+            break   # tuple continues in the next chunk
+        self.rest = data[pos:]
+        return rows
+
+
+def _copy_binary_records(chunks, decoders):
+    """
+    Parse PgSQL's binary COPY format from an iterable of byte strings,
+    which don't have to split it at any particular place, and
+    generate tuples of the values converted by the decoders.  The
+    chunks are read to the end even after the trailer, so whatever's
+    generating them can finish up.
+
+    """
+    parser = _BinaryRecordParser(decoders)
+    for chunk in chunks:
+        if not parser.finished:
+            for row in parser.feed(chunk):
+                yield row
+
+
+#
+# Text format COPY, for executemany(method='copy').  Map Python classes
+# to callables giving the unicode text a value is written as in a COPY
+# row, with the characters COPY treats specially escaped.
+#
+def _copy_text_escape(x):
+    return x.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_text_bytea(b):
+    # hex bytea input, with the backslash escaped for COPY
+    return '\\\\x' + binascii.hexlify(b).decode('ascii')
+
+
+_COPY_TEXT_ENCODERS = {
+    type(None): lambda x: '\\N',
+    bool: lambda x: x and 't' or 'f',
+    int: unicode,
+    long: unicode,
+    float: repr,
+    Decimal: unicode,
+    unicode: _copy_text_escape,
+    Binary: _copy_text_bytea,
+    datetime.datetime: lambda x: x.isoformat(' '),
+    datetime.date: lambda x: x.isoformat(),
+    datetime.time: lambda x: x.isoformat(),
+    uuid.UUID: unicode,
+    }
+
+if bytes is str:
+    _COPY_TEXT_ENCODERS[str] = lambda x: _copy_text_escape(x.decode('utf-8'))
+else:
+    _COPY_TEXT_ENCODERS[bytes] = _COPY_TEXT_ENCODERS[Binary]
+
+
+def _copy_text_chunks(records, keys, encode, size):
+    """
+    Generate PgSQL's text COPY format for an iterable of records
+    (sequences or mappings of Python values), taking the values
+    from each record by keys and converting them with encode(),
+    in chunks of about size bytes.
+
+    """
+    nfields = len(keys)
+    positional = keys == list(range(nfields))
+    pending = []
+    append = pending.append
+
+    # Same guessing of rows per chunk as _copy_binary_chunks()
+    limit = max(size // 64, 1)
+    for record in records:
+        if isinstance(record, dict):
+            try:
+                record = [record[k] for k in keys]
+            except KeyError as e:
+                raise ProgrammingError('Missing parameter: %s' % e)
+        elif len(record) != nfields:
+            raise ProgrammingError('Command has %d parameters, but %d were supplied' % (nfields, len(record)))
+        elif not positional:
+            record = [record[k] for k in keys]
+        append('\t'.join([encode(value) for value in record]))
+        if len(pending) >= limit:
+            pending.append('')
+            data = '\n'.join(pending).encode('utf-8')
+            limit = max(size * len(pending) // max(len(data), 1), 1)
+            del pending[:]
+            yield data
+    if pending:
+        pending.append('')
+        yield '\n'.join(pending).encode('utf-8')
+
+
+################
+#
+# Helper classes and functions
+#
+
+def _parseDSN(s):
+    """
+    Parse a string containing PostgreSQL libpq-style connection info in the form:
+
+       "keyword1=val1 keyword2='val2 with space' keyword3 = val3"
+
+    into a dictionary::
+
+       {'keyword1': 'val1', 'keyword2': 'val2 with space', 'keyword3': 'val3'}
+
+    Returns empty dict if s is empty string or None.
+    """
+    if not s:
+        return {}
+
+    result = {}
+    state = 1
+    buf = ''
+    for ch in s.strip():
+        if state == 1:        # reading keyword
+            if ch in '=':
+                keyword = buf.strip()
+                buf = ''
+                state = 2
+            else:
+                buf += ch
+        elif state == 2:        # have read '='
+            if ch == "'":
+                state = 3
+            elif ch != ' ':
+                buf = ch
+                state = 4
+        elif state == 3:        # reading single-quoted val
+            if ch == "'":
+                result[keyword] = buf
+                buf = ''
+                state = 1
+            else:
+                buf += ch
+        elif state == 4:        # reading non-quoted val
+            if ch == ' ':
+                result[keyword] = buf
+                buf = ''
+                state = 1
+            else:
+                buf += ch
+    if state == 4:              # was reading non-quoted val when string ran out
+        result[keyword] = buf
+    return result
+
+
+_PLACEHOLDER = re.compile(r'%(?:\(([^)]*)\))?(.)')
+
+#
+# Commands that can take $n parameters when prepared, after any leading
+# whitespace, comments and parentheses.  Utility commands such as SET,
+# NOTIFY or CREATE TABLE can't, so their parameters are plugged into
+# the command text instead.
+#
+_PREPARABLE = re.compile(r'(?:\s+|--[^\n]*\n?|/\*.*?\*/|\()*'
+                         r'(?:SELECT|INSERT|UPDATE|DELETE|MERGE|VALUES|WITH|TABLE|DECLARE|EXPLAIN|CALL)\b',
+                         re.I | re.S)
+
+#
+# Pieces of SQL that matter when looking for the semicolons between
+# statements: quoted strings and identifiers, dollar-quoted strings,
+# comments, and the semicolons themselves
+#
+_STATEMENT_TOKEN = re.compile(r"""[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|"(?:[^"]|"")*"|"""
+                              r"""(\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$).*?\1|--[^\n]*|/\*.*?\*/|;""", re.S)
+
+def _multiple_statements(cmd):
+    """
+    Check whether a command holds more than one SQL statement,
+    which can't be prepared.
+
+    """
+    for m in _STATEMENT_TOKEN.finditer(cmd):
+        if (m.group() == ';') and cmd[m.end():].strip(' \t\r\n;'):
+            return True
+    return False
+
+
+def _convert_placeholders(cmd, named):
+    """
+    Convert a command using 'format' (%s) or 'pyformat' (%(name)s)
+    parameter markers into one using PostgreSQL's numbered $1, $2,...
+    markers.  Returns a tuple of the converted command and, when
+    'named' is True, the list of parameter names in numbered order
+    (otherwise the number of parameters).
+
+    Returns None if the command uses some other kind of % formatting
+    that can't be handled this way.
+
+    """
+    names = []
+    result = []
+    pos = 0
+    for m in _PLACEHOLDER.finditer(cmd):
+        name, conversion = m.groups()
+        result.append(cmd[pos:m.start()])
+        pos = m.end()
+        if conversion == '%' and name is None:
+            result.append('%')
+        elif conversion not in 'sd' or (name is None) == named:
+            return None
+        elif named:
+            if name not in names:
+                names.append(name)
+            result.append('$%d' % (names.index(name) + 1))
+        else:
+            names.append(None)
+            result.append('$%d' % len(names))
+    result.append(cmd[pos:])
+
+    if named:
+        return ''.join(result), names
+    return ''.join(result), len(names)
+
+
+#
+# Pieces of SQL that matter when looking for the VALUES list of an
+# INSERT command: quoted strings and identifiers, comments, the VALUES
+# keyword and parentheses
+#
+_INSERT_TOKEN = re.compile(r"""[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|/\*.*?\*/|\bVALUES\b|[(),]""", re.I | re.S)
+_INSERT = re.compile(r'\s*INSERT\s', re.I)
+_RETURNING = re.compile(r'\bRETURNING\b', re.I)
+_DO_UPDATE = re.compile(r'\bON\s+CONFLICT\b.*\bDO\s+UPDATE\b', re.I | re.S)
+
+def _split_insert_values(cmd):
+    """
+    Split an 'INSERT ... VALUES (...) ...' command with a single row of
+    values into the text before the row, the row itself and the text
+    after it.  Returns None for other kinds of commands, and for ones
+    with a RETURNING clause or ON CONFLICT ... DO UPDATE, which fails if
+    two rows of the same command update the same row.
+
+    """
+    if not _INSERT.match(cmd):
+        return None
+
+    start = None
+    depth = 0
+    for m in _INSERT_TOKEN.finditer(cmd):
+        token = m.group()
+        if start is None:
+            if token.upper() == 'VALUES' and not depth:
+                # the row has to come right after VALUES
+                start = m.end()
+                while cmd[start:start+1].isspace():
+                    start += 1
+                if cmd[start:start+1] != '(':
+                    return None
+            elif token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+        elif token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            if not depth:
+                end = m.end()
+                rest = cmd[end:].lstrip()
+                if rest.startswith(',') or _RETURNING.search(rest) or _DO_UPDATE.search(rest):
+                    return None
+                return cmd[:start], cmd[start:end], cmd[end:]
+    return None
+
+
+_COPY_INSERT = re.compile(r'\s*INSERT\s+INTO\s+(\S.*?)\s*VALUES\s*$', re.I | re.S)
+_COPY_ROW = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)$')
+
+def _copy_insert_target(prefix, row, suffix):
+    """
+    Given the pieces of an INSERT command split by
+    _split_insert_values(), with the row of values converted by
+    _batch_placeholders(), return the table and column list to COPY
+    into, or None if the command does anything more than insert the
+    parameters as they are.
+
+    """
+    m = _COPY_INSERT.match(prefix)
+    if (m is None) or ('%' in prefix) or suffix.strip(' \t\r\n;') \
+    or not _COPY_ROW.match(row):
+        return None
+    return m.group(1)
+
+
+def _batch_placeholders(row, named):
+    """
+    Convert a row of values using 'format' (%s) or 'pyformat'
+    (%(name)s) parameter markers into one with a %s marker for every
+    parameter, returning it with the list of keys (names or positions)
+    to look the values up by.  Returns None if the row uses some other
+    kind of % formatting.
+
+    """
+    keys = []
+    result = []
+    pos = 0
+    for m in _PLACEHOLDER.finditer(row):
+        name, conversion = m.groups()
+        result.append(row[pos:m.start()])
+        pos = m.end()
+        if conversion == '%' and name is None:
+            result.append('%%')
+        elif conversion not in 'sd' or (name is None) == named:
+            return None
+        else:
+            keys.append(named and name or len(keys))
+            result.append('%s')
+    result.append(row[pos:])
+    return ''.join(result), keys
+
+
+def _executemany_pages(cmd, params, named, page_size):
+    """
+    Return an iterator over the (command, args) pairs that execute
+    an 'INSERT ... VALUES (...)' command for pages of up to page_size
+    of the parameter sets in the params iterator, by repeating the row
+    of values.  Returns None if the command can't be batched that way.
+
+    """
+    split = (page_size > 1) and _split_insert_values(cmd)
+    if not split:
+        return None
+    prefix, row, suffix = split
+    batch = _batch_placeholders(row, named)
+    if (batch is None) or (_batch_placeholders(prefix, False) != (prefix, [])) \
+    or (_batch_placeholders(suffix, False) != (suffix, [])):
+        # parameters outside the row of values
+        return None
+
+    row, keys = batch
+    if keys:
+        page_size = min(page_size, _MAX_PARAMETERS // len(keys))
+    return _executemany_page_commands(prefix, row, suffix, keys, params, page_size)
+
+
+def _executemany_page_commands(prefix, row, suffix, keys, params, page_size):
+    while True:
+        page = list(islice(params, page_size))
+        if not page:
+            break
+        args = []
+        for p in page:
+            if (not isinstance(p, dict)) and (len(p) != len(keys)):
+                raise ProgrammingError('Command has %d parameters, but %d were supplied' % (len(keys), len(p)))
+            try:
+                args.extend([p[k] for k in keys])
+            except KeyError as e:
+                raise ProgrammingError('Missing parameter: %s' % e)
+        yield prefix + ', '.join([row] * len(page)) + suffix, args
+
+
+def _executemany_copy(cmd, named):
+    """
+    Turn a plain 'INSERT INTO table (columns) VALUES (%s, ...)' command
+    into the COPY FROM STDIN command executemany(method='copy') runs
+    instead, returning it with the keys to look the values up by.
+
+    """
+    split = _split_insert_values(cmd)
+    batch = split and _batch_placeholders(split[1], named)
+    target = batch and _copy_insert_target(split[0], batch[0], split[2])
+    if not target:
+        raise NotSupportedError("executemany(method='copy') needs a plain 'INSERT INTO table (columns) VALUES (%s, ...)' command")
+    return 'COPY %s FROM STDIN' % target, batch[1]
+
+
+#
+# Conversion functions that row decoders do inline instead of calling
+# them, as an expression for the field at msg[pos:pos+size] and the
+# object the expression uses as c<n>, if any
+#
+_INLINE_CONVERSIONS = {
+    _char_to_python: ("msg[pos:pos+size].decode('utf-8')", None),
+    _binary_int2_to_python: ('c%d(msg, pos)[0]', _INT2_BINARY.unpack_from),
+    _binary_int4_to_python: ('c%d(msg, pos)[0]', _INT4_BINARY.unpack_from),
+    _binary_int8_to_python: ('c%d(msg, pos)[0]', _INT8_BINARY.unpack_from),
+    _binary_oid_to_python: ('c%d(msg, pos)[0]', _OID_BINARY.unpack_from),
+    _binary_float4_to_python: ('c%d(msg, pos)[0]', _FLOAT4_BINARY.unpack_from),
+    _binary_float8_to_python: ('c%d(msg, pos)[0]', _FLOAT8_BINARY.unpack_from),
+    }
+
+#
+# Row decoders compiled for each sequence of field expressions
+#
+_ROW_DECODER_FACTORIES = {}
+
+def _row_decoder(conversion):
+    """
+    Return a function that converts the fields of a DataRow message,
+    given the message and the offset of its first field, to a list of
+    Python values using one conversion function per column.  The fields
+    are unrolled into straight-line code rather than looped over, with
+    the common conversions done inline.
+
+    """
+    fields = []
+    args = []
+    for convert in conversion:
+        expression, arg = _INLINE_CONVERSIONS.get(convert, ('c%d(msg[pos:pos+size])', convert))
+        fields.append(expression)
+        args.append(arg)
+
+    signature = tuple(fields)
+    factory = _ROW_DECODER_FACTORIES.get(signature)
+    if factory is None:
+        columns = range(len(fields))
+        source = ['def factory(unpack_from%s):' % ''.join([', c%d' % i for i in columns]),
+                  '    def decode_row(msg, pos):']
+        for i, expression in enumerate(fields):
+            if '%d' in expression:
+                expression = expression % i
+            source.extend([
+                '        size = unpack_from(msg, pos)[0]',
+                '        pos += 4',
+                '        if size < 0:',
+                '            v%d = None' % i,
+                '        else:',
+                '            v%d = %s' % (i, expression),
+                '            pos += size'])
+        source.extend([
+                '        return [%s]' % ', '.join(['v%d' % i for i in columns]),
+                '    return decode_row'])
+        namespace = {}
+        exec(compile('\n'.join(source), '<bpgsql row decoder>', 'exec'), namespace)
+        factory = _ROW_DECODER_FACTORIES[signature] = namespace['factory']
+    return factory(_INT32.unpack_from, *args)
+
+
+#
+# Socket options that can be given as connection keywords, with their
+# defaults (None leaves the system default).  TCP_NODELAY and
+# keepalives are on by default, as they are for libpq.
+#
+_SOCKET_OPTIONS = {
+    'tcp_nodelay': '1',
+    'keepalives': '1',
+    'keepalives_idle': None,
+    'keepalives_interval': None,
+    'keepalives_count': None,
+    'rcvbuf': None,
+    'sndbuf': None,
+    }
+
+#
+# Connection keywords for picking a server out of the comma-separated
+# list of hosts, and limiting how long connecting to each one may take
+#
+_CONNECT_OPTIONS = {
+    'connect_timeout': None,
+    'target_session_attrs': 'any',
+    }
+
+_SESSION_ATTRS = ('any', 'read-write', 'read-only', 'primary', 'standby', 'prefer-standby')
+
+#
+# Seconds to give a connection attempt before starting on the next
+# address as well, and to remember what a host name resolved to
+#
+_CONNECT_STAGGER = 0.25
+_DNS_TTL = 60.0
+
+_dns_cache = {}     # (host, port) -> (expiry, [(family, address), ...])
+
+#
+# Seconds to wait for the server to take a cancel request when
+# there's no connect_timeout
+#
+_CANCEL_TIMEOUT = 10.0
+
+#
+# For servers before 14, which don't report default_transaction_read_only
+# and in_hot_standby
+#
+_SESSION_STATE_QUERY = "SELECT current_setting('transaction_read_only'), " \
+    "CASE WHEN pg_is_in_recovery() THEN 'on' ELSE 'off' END"
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# TCP_KEEPIDLE is called TCP_KEEPALIVE on macOS
+_TCP_KEEPIDLE = getattr(socket, 'TCP_KEEPIDLE', getattr(socket, 'TCP_KEEPALIVE', None))
+
+def _configure_socket(s, args, tcp):
+    """
+    Set the options for a new socket from the connection keywords in
+    args, before it's connected so the buffer sizes can affect the TCP
+    window.  The TCP-only options are skipped for Unix sockets.
+
+    """
+    try:
+        options = dict([(k, args[k] and int(args[k])) for k in _SOCKET_OPTIONS if args[k] is not None])
+    except ValueError as e:
+        raise InterfaceError('Bad socket option: %s' % e)
+
+    if options.get('rcvbuf'):
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, options['rcvbuf'])
+    if options.get('sndbuf'):
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, options['sndbuf'])
+    if not tcp:
+        return
+
+    if 'tcp_nodelay' in options:
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(bool(options['tcp_nodelay'])))
+    if 'keepalives' in options:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(bool(options['keepalives'])))
+    if options.get('keepalives'):
+        for name, opt in [('keepalives_idle', _TCP_KEEPIDLE),
+                          ('keepalives_interval', getattr(socket, 'TCP_KEEPINTVL', None)),
+                          ('keepalives_count', getattr(socket, 'TCP_KEEPCNT', None))]:
+            if options.get(name) and (opt is not None):
+                s.setsockopt(socket.IPPROTO_TCP, opt, options[name])
+
+
+def _connect_args(dsn, username, password, host, dbname, port, opt, options):
+    """
+    Work out the connection keywords from a dsn and the other
+    arguments given to connect(), the dsn taking precedence.
+
+    """
+    #
+    # Come up with a reasonable default host for
+    # win32 and presumably Unix platforms
+    #
+    if host == None:
+        if sys.platform == 'win32':
+            host = '127.0.0.1'
+        else:
+            host = '/tmp/.s.PGSQL.5432'
+
+    args = _parseDSN(dsn)
+
+    if 'host' not in args:
+        args['host'] = host
+    if 'port' not in args:
+        args['port'] = port or 5432
+    if 'dbname' not in args:
+        args['dbname'] = dbname
+    if 'user' not in args:
+        args['user'] = username
+    if 'password' not in args:
+        args['password'] = password
+    if 'options' not in args:
+        args['options'] = opt
+    unknown = [name for name in options if (name not in _SOCKET_OPTIONS) and (name not in _CONNECT_OPTIONS)]
+    if unknown:
+        raise InterfaceError('Unknown connection keyword: %s' % ', '.join(sorted(unknown)))
+    for name, default in chain(_SOCKET_OPTIONS.items(), _CONNECT_OPTIONS.items()):
+        if name not in args:
+            args[name] = options.get(name, default)
+    if args['target_session_attrs'] not in _SESSION_ATTRS:
+        raise InterfaceError('Bad target_session_attrs: %r' % args['target_session_attrs'])
+
+    if not args['user']:
+        #
+        # If no userid specified in the args, try to use the userid
+        # this process is running under, if we can figure that out.
+        #
+        try:
+            import pwd
+            args['user'] = pwd.getpwuid(os.getuid())[0]
+        except:
+            pass
+
+    return args
+
+
+def _connect_timeout(args):
+    """
+    The connect_timeout keyword in seconds, or None if connecting
+    isn't to be given up on.  Zero or less means no limit, as for libpq.
+
+    """
+    value = args['connect_timeout']
+    try:
+        value = value and float(value)
+    except ValueError:
+        raise InterfaceError('Bad connect_timeout: %r' % value)
+    if value and (value > 0):
+        return value
+    return None
+
+
+def _connect_targets(args):
+    """
+    The (host, port) pairs to try connecting to, in order, from the
+    comma-separated lists in the host and port keywords.  A single
+    port goes with every host.
+
+    """
+    hosts = [h.strip() for h in str(args['host']).split(',')]
+    ports = [p.strip() for p in str(args['port']).split(',')]
+    if len(ports) == 1:
+        ports = ports * len(hosts)
+    elif len(ports) != len(hosts):
+        raise InterfaceError('Got %d ports for %d hosts' % (len(ports), len(hosts)))
+
+    try:
+        return [(h, int(p or 5432)) for h, p in zip(hosts, ports)]
+    except ValueError as e:
+        raise InterfaceError('Bad port: %s' % e)
+
+
+def _resolve(host, port):
+    """
+    The (family, address) pairs a host can be reached at: a Unix
+    socket if the host is a path, otherwise whatever getaddrinfo()
+    comes up with, remembered for _DNS_TTL seconds so reconnecting
+    doesn't wait on the resolver every time.
+
+    """
+    if host.startswith('/'):
+        return [(socket.AF_UNIX, host)]
+
+    now = _clock()
+    cached = _dns_cache.get((host, port))
+    if cached and (cached[0] > now):
+        return cached[1]
+
+    try:
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except socket.error as e:
+        raise OperationalError("Couldn't resolve %s: %s" % (host, e))
+
+    addresses = []
+    for family, socktype, proto, canonname, address in infos:
+        if (family, address) not in addresses:
+            addresses.append((family, address))
+    _dns_cache[(host, port)] = (now + _DNS_TTL, addresses)
+    return addresses
+
+
+def _wait_writable(socks, timeout):
+    """
+    Wait up to timeout seconds (None for no limit) for any of the
+    sockets to finish connecting, one way or the other, returning
+    the ones that have.
+
+    """
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        fds = {}
+        for s in socks:
+            poller.register(s, select.POLLOUT)
+            fds[s.fileno()] = s
+        if timeout is not None:
+            timeout = int(math.ceil(timeout * 1000))
+        return [fds[fd] for fd, event in poller.poll(timeout)]
+
+    # Windows reports failed connects as exceptional conditions
+    r, w, x = select.select([], socks, socks, timeout)
+    return w + [s for s in x if s not in w]
+
+
+def _wait_socket(sock, timeout):
+    """
+    Wait up to timeout seconds (None for no limit) for a socket to
+    have data to read or room to write, returning a (readable,
+    writable) pair of flags, both False if it timed out.
+
+    """
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        poller.register(sock, select.POLLIN | select.POLLOUT)
+        if timeout is not None:
+            timeout = int(math.ceil(timeout * 1000))
+        events = 0
+        for fd, event in poller.poll(timeout):
+            events |= event
+        # errors and hangups show up when reading
+        return bool(events & ~select.POLLOUT), bool(events & select.POLLOUT)
+
+    r, w, _ = select.select([sock], [sock], [], timeout)
+    return bool(r), bool(w)
+
+
+def _wait_readable(sock, timeout):
+    """
+    Wait up to timeout seconds (None for no limit) for data to arrive
+    on a socket, returning whether it has.  poll() is used where
+    available, which unlike select() copes with file descriptors
+    above FD_SETSIZE.
+
+    """
+    if hasattr(select, 'poll'):
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        if timeout is not None:
+            timeout = int(math.ceil(timeout * 1000))
+        return bool(poller.poll(timeout))
+
+    r, _, _ = select.select([sock], [], [], timeout)
+    return bool(r)
+
+
+def _connect_socket(targets, args, timeout, errors):
+    """
+    Connect a socket to the first of the (host, port) targets that
+    answers, returning the socket and the target.  The addresses are
+    tried in order, each one started as soon as the one before fails,
+    or if it hasn't connected within _CONNECT_STAGGER seconds
+    (RFC 8305 "Happy Eyeballs"), and the first to connect wins.
+    An attempt is given up on after timeout seconds (None for no
+    limit).  Why attempts failed is added to the errors list, and
+    OperationalError raised if none connects.
+
+    """
+    addresses = []
+    for target in targets:
+        try:
+            addresses.extend([(target, family, address) for family, address in _resolve(*target)])
+        except OperationalError as e:
+            errors.append(str(e))
+    addresses.reverse()
+
+    pending = {}    # socket -> (target, deadline)
+    start_next = None
+    try:
+        while addresses or pending:
+            now = _clock()
+            if addresses and ((not pending) or (now >= start_next)):
+                target, family, address = addresses.pop()
+                try:
+                    s = socket.socket(family, socket.SOCK_STREAM)
+                except socket.error as e:
+                    errors.append('%s: %s' % (target[0], e))
+                    continue
+                unix = (family == getattr(socket, 'AF_UNIX', None))
+                try:
+                    _configure_socket(s, args, not unix)
+                    s.setblocking(False)
+                    err = s.connect_ex(address)
+                except:
+                    s.close()
+                    raise
+                if not err:
+                    s.setblocking(True)
+                    return s, target
+                if (err == errno.EINPROGRESS) or ((err == errno.EWOULDBLOCK) and not unix):
+                    pending[s] = (target, (timeout is not None) and (now + timeout))
+                    start_next = now + _CONNECT_STAGGER
+                else:
+                    s.close()
+                    _dns_cache.pop(target, None)
+                    errors.append('%s: %s' % (target[0], os.strerror(err)))
+                continue
+
+            #
+            # Wait for one of the pending attempts to finish, until it's
+            # time to start the next one or give up on one of them
+            #
+            wait = [d for t, d in pending.values() if d is not False]
+            if addresses:
+                wait.append(start_next)
+            if wait:
+                wait = max(min(wait) - now, 0)
+            else:
+                wait = None
+            for s in _wait_writable(list(pending), wait):
+                target, deadline = pending.pop(s)
+                err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if not err:
+                    s.setblocking(True)
+                    return s, target
+                s.close()
+                _dns_cache.pop(target, None)
+                errors.append('%s: %s' % (target[0], os.strerror(err)))
+
+            now = _clock()
+            for s, (target, deadline) in list(pending.items()):
+                if (deadline is not False) and (now >= deadline):
+                    del pending[s]
+                    s.close()
+                    errors.append('%s: timed out' % target[0])
+            if addresses and not pending:
+                start_next = now
+    finally:
+        for s in pending:
+            s.close()
+
+    raise OperationalError("Couldn't connect to server: %s" % '; '.join(errors))
+
+
+def _send_cancel(address, message, timeout):
+    """
+    Send a CancelRequest message to the server at a (family, address)
+    pair over a connection of its own, and wait for the server to
+    close it, which it does once it's passed the request on to the
+    backend.  Raises OperationalError if that doesn't work out within
+    timeout seconds.
+
+    """
+    family, address = address
+    s = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        s.settimeout(timeout)
+        s.connect(address)
+        s.sendall(message)
+        s.recv(1)
+    except socket.error as e:
+        raise OperationalError("Couldn't send cancel request: %s" % (e,))
+    finally:
+        s.close()
+
+
+def _query_timeout(result, timeout):
+    """
+    Turn the error of a result whose command was canceled for running
+    over its timeout into a QueryTimeout.  If the command finished
+    before the cancel request got to the backend, the result is left
+    alone.
+
+    """
+    error = result.error
+    if (error is not None) and (getattr(error, 'pgcode', None) == '57014'):
+        result.error = QueryTimeout('Command canceled after %s seconds (%s)' % (timeout, error))
+        result.error.pgcode = error.pgcode
+
+
+def _session_matches(wanted, read_only, standby):
+    """
+    Whether a session that's read_only or not, on a server that's a
+    standby or not, is one target_session_attrs asks for.
+
+    """
+    if wanted == 'read-write':
+        return not read_only
+    if wanted == 'read-only':
+        return read_only
+    if wanted == 'primary':
+        return not standby
+    if wanted == 'standby':
+        return standby
+    return True
+
+
+def _session_passes(wanted):
+    """
+    The target_session_attrs to go through the hosts with, in
+    turn: prefer-standby settles for any server if there's no standby.
+
+    """
+    if wanted == 'prefer-standby':
+        return ['standby', 'any']
+    return [wanted]
+
+
+def _packet_handlers(cls):
+    """
+    Map the message type bytes the backend sends to the _pkt_<c>
+    methods of a Connection class that handle them.  Built once
+    for each class, so subclasses can override the methods.
+
+    """
+    handlers = cls.__dict__.get('_packet_table')
+    if handlers is None:
+        handlers = {}
+        for name in dir(cls):
+            if name.startswith('_pkt_'):
+                handlers[_encode(name[5:])] = getattr(cls, name)
+        cls._packet_table = handlers
+    return handlers
+
+
+def _message(msg_type, payload=b''):
+    """
+    Frame a frontend message, adding the length header.
+
+    """
+    return msg_type + _INT32.pack(len(payload) + 4) + payload
+
+
+def _encode(s):
+    """
+    Encode a unicode string as utf-8, plain byte strings
+    are passed through as-is.
+
+    """
+    if isinstance(s, unicode):
+        return s.encode('utf-8')
+    return s
+
+
+def _copy_chunks(source, size):
+    """
+    Generate the data for a COPY FROM STDIN in chunks of about size
+    bytes, from a file-like object or an iterable of strings.
+
+    """
+    read = getattr(source, 'read', None)
+    if read is not None:
+        while True:
+            data = read(size)
+            if not data:
+                return
+            yield _encode(data)
+
+    pending = []
+    pending_size = 0
+    for data in source:
+        data = _encode(data)
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= size:
+            yield b''.join(pending)
+            pending = []
+            pending_size = 0
+    if pending:
+        yield b''.join(pending)
+
+
+def _copy_columns(columns):
+    if columns:
+        return ' (%s)' % ', '.join(columns)
+    return ''
+
+
+def _copy_format(format):
+    try:
+        return _COPY_FORMATS[format]
+    except KeyError:
+        raise ProgrammingError('Unknown COPY format: %r' % (format,))
+
+
+def _parse_server_version(s):
+    """
+    Turn a server_version string such as '9.3.5' or '16.2' into an integer
+    in the same format as libpq's PQserverVersion(), such as 90305 or 160002.
+
+    """
+    m = re.match(r'(\d+)(?:\.(\d+))?(?:\.(\d+))?', s)
+    if not m:
+        return None
+    major, minor, patch = [int(x or 0) for x in m.groups()]
+    if major >= 10:
+        # from 10 on there are only two parts to the version
+        return major * 10000 + minor
+    return major * 10000 + minor * 100 + patch
+
+
+def _parse_message_fields(msg):
+    """
+    Parse the body of an ErrorResponse or NoticeResponse message into
+    a dictionary keyed by the single-character field type codes, such
+    as 'S' for severity, 'C' for the SQLSTATE code and 'M' for the message.
+
+    """
+    fields = {}
+    for field in msg.split(b'\0'):
+        if field:
+            fields[field[:1].decode('ascii')] = field[1:].decode('utf-8', 'replace')
+    return fields
+
+
+#
+# Map SQLSTATE classes (the first two characters of
+# the code) to DB-API exceptions
+#
+_SQLSTATE_CLASS_ERRORS = {
+    '08': OperationalError,     # connection exception
+    '0A': NotSupportedError,    # feature not supported
+    '22': DataError,            # data exception
+    '23': IntegrityError,       # integrity constraint violation
+    '28': OperationalError,     # invalid authorization specification
+    '40': OperationalError,     # transaction rollback
+    '42': ProgrammingError,     # syntax error or access rule violation
+    '53': OperationalError,     # insufficient resources
+    '54': OperationalError,     # program limit exceeded
+    '55': OperationalError,     # object not in prerequisite state
+    '57': OperationalError,     # operator intervention
+    '58': OperationalError,     # system error
+    'XX': InternalError,        # internal error
+    }
+
+def _error_from_fields(fields):
+    """
+    Create a DB-API exception from the fields of an ErrorResponse.  The
+    SQLSTATE code is available as the exception's 'pgcode' attribute.
+
+    """
+    code = fields.get('C')
+    klass = _SQLSTATE_CLASS_ERRORS.get((code or '')[:2], DatabaseError)
+    exc = klass('%s:  %s' % (fields.get('S', 'ERROR'), fields.get('M', '')))
+    exc.pgcode = code
+    return exc
+
+
+class Notification(object):
+    """
+    A notification from the backend, sent when a client executes
+    NOTIFY on a channel the connection is listening on: the channel
+    name, the payload string ('' if none was given) and the pid of
+    the backend process that sent it.
+
+    """
+    def __init__(self, channel, payload, pid):
+        self.channel = channel
+        self.payload = payload
+        self.pid = pid
+
+    def __repr__(self):
+        return 'Notification(%r, %r, %d)' % (self.channel, self.payload, self.pid)
+
+    def __eq__(self, other):
+        return isinstance(other, Notification) and \
+            ((self.channel, self.payload, self.pid) == (other.channel, other.payload, other.pid))
+
+    def __ne__(self, other):
+        return not (self == other)
+
+
+class _LargeObject(object):
+    """
+    Make a PostgreSQL Large Object look somewhat like
+    a Python file.  Should be created from Connection object
+    open or create methods.
+
+    """
+    def __init__(self, client, fd):
+        self.__client = client
+        self.__fd = fd
+
+    def __del__(self):
+        if self.__client:
+            self.close()
+
+    def close(self):
+        """
+        Close an opened Large Object
+        """
+        try:
+            self.__client._lo_funcall('lo_close', self.__fd)
+        finally:
+            self.__client = self.__fd = None
+
+    def flush(self):
+        pass
+
+    def read(self, readlen):
+        return self.__client._lo_funcall('loread', self.__fd, readlen)
+
+    def seek(self, offset, whence):
+        self.__client._lo_funcall('lo_lseek', self.__fd, offset, whence)
+
+    def tell(self):
+        r = self.__client._lo_funcall('lo_tell', self.__fd)
+        return _unpack('!i', r)[0]
+
+    def write(self, data):
+        """
+        Write data to lobj, return number of bytes written
+        """
+        r = self.__client._lo_funcall('lowrite', self.__fd, data)
+        return _unpack('!i', r)[0]
+
+
+class _ReceiveBuffer(object):
+    """
+    Growable buffer holding data received from the backend that
+    hasn't been consumed yet.
+
+    Data lives in data[start:end].  Reads just advance 'start', and
+    the unread tail is moved back to the front of the buffer only
+    when more room is needed, so consuming N bytes costs O(N)
+    no matter how they were split up by recv() calls.
+
+    """
+    def __init__(self, size=8192):
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+        self.start = 0
+        self.end = 0
+        self.received = 0                   # total bytes ever received
+
+    def __len__(self):
+        return self.end - self.start
+
+    def copy_data(self, chunks, limit=None):
+        """
+        Move the contents of the complete CopyData messages at the front
+        of the buffer to the chunks list, stopping once at least limit
+        bytes have been moved if a limit is given.  Returns the number
+        of bytes moved, and whether it stopped at some other type of
+        message (rather than running out of data or reaching the limit).
+
+        """
+        data = self.data
+        pos = self.start
+        end = self.end
+        nbytes = 0
+        other = False
+        while (end - pos >= 5) and ((limit is None) or (nbytes < limit)):
+            if data[pos] != 100:    # ord('d')
+                other = True
+                break
+            length = _INT32.unpack_from(data, pos + 1)[0]
+            if end - pos <= length:
+                break
+            chunks.append(self.view[pos+5:pos+1+length].tobytes())
+            nbytes += length - 4
+            pos += 1 + length
+        self.start = pos
+        return nbytes, other
+
+    def data_rows(self, rows, decode_row):
+        """
+        Convert the complete DataRow messages at the front of the
+        buffer with a function made by _row_decoder(), appending the
+        rows to the rows list, and stopping at any other type of
+        message.
+
+        """
+        data = self.data
+        view = self.view
+        unpack_from = _INT32.unpack_from
+        append = rows.append
+        pos = self.start
+        end = self.end
+        while (end - pos >= 5) and (data[pos] == 68):   # ord('D')
+            length = unpack_from(data, pos + 1)[0]
+            if end - pos <= length:
+                break
+            append(decode_row(view[pos+7:pos+1+length].tobytes(), 0))
+            pos += 1 + length
+        self.start = pos
+
+    def find(self, sub):
+        """
+        Return the offset of 'sub' relative to the first unread byte,
+        or -1 if it hasn't been received yet.
+
+        """
+        pos = self.data.find(sub, self.start, self.end)
+        if pos >= 0:
+            pos -= self.start
+        return pos
+
+    def read(self, nbytes):
+        """
+        Consume nbytes from the front of the buffer, returned
+        as a plain string.  Caller must have checked that
+        enough data is available.
+
+        """
+        start = self.start
+        self.start = start + nbytes
+        return self.view[start:self.start].tobytes()
+
+    def skip(self, nbytes):
+        self.start += nbytes
+
+    def peek(self, st):
+        """
+        Unpack a fixed-size value described by the struct.Struct
+        object 'st' from the front of the buffer, without
+        consuming it.
+
+        """
+        return st.unpack_from(self.data, self.start)
+
+    def unpack(self, st):
+        """
+        Consume and unpack a fixed-size value described
+        by the struct.Struct object 'st'.
+
+        """
+        result = st.unpack_from(self.data, self.start)
+        self.start += st.size
+        return result
+
+    def extend(self, data):
+        """
+        Add data received some other way to the end of the buffer.
+
+        """
+        nbytes = len(data)
+        def copy(view):
+            view[:nbytes] = data
+            return nbytes
+        self.recv_into(copy, nbytes)
+
+    def recv_into(self, recv_into, nbytes):
+        """
+        Make room for at least nbytes more data and receive into the
+        free space using the supplied socket-like recv_into callable.
+        Returns the number of bytes received.
+
+        """
+        n = recv_into(self.room(nbytes))
+        self.filled(n)
+        return n
+
+    def room(self, nbytes):
+        """
+        Make room for at least nbytes more data, returning a
+        memoryview of the free space at the end of the buffer
+        for filled() to account for once data is put there.
+
+        """
+        pending = self.end - self.start
+        if not pending:
+            self.start = self.end = 0
+        elif len(self.data) - self.end < nbytes:
+            if pending + nbytes > len(self.data):
+                #
+                # Grow into a fresh bytearray, since the old one can't
+                # be resized while self.view still refers to it.
+                #
+                data = bytearray(max(2 * len(self.data), pending + nbytes))
+                data[:pending] = self.view[self.start:self.end]
+                self.data = data
+                self.view = memoryview(data)
+            else:
+                # compact: move the unread data back to the front
+                self.data[:pending] = self.data[self.start:self.end]
+            self.start = 0
+            self.end = pending
+
+        return self.view[self.end:]
+
+    def filled(self, nbytes):
+        self.end += nbytes
+        self.received += nbytes
+
+
+class _SendBuffer(object):
+    """
+    Data waiting to be sent to the backend, as a list of pieces.
+    Messages with small payloads are framed into a single piece, larger
+    payloads are kept as pieces of their own rather than copied, to be
+    sent along with everything else by a scatter-gather sendmsg()
+    where the platform has one.
+
+    """
+    def __init__(self):
+        self.pieces = []
+        self.size = 0                       # total bytes waiting
+
+    def __len__(self):
+        return self.size
+
+    def append(self, data):
+        if data:
+            self.pieces.append(data)
+            self.size += len(data)
+
+    def message(self, msg_type, payload=b''):
+        """
+        Add a message, with its type and length header.
+
+        """
+        header = msg_type + _INT32.pack(len(payload) + 4)
+        if len(payload) < _SEND_JOIN_SIZE:
+            self.pieces.append(header + payload)
+        else:
+            self.pieces.append(header)
+            self.pieces.append(payload)
+        self.size += len(payload) + 5
+
+    def send(self, sock):
+        """
+        Send as much of the data as the socket takes in one call,
+        returning the number of bytes sent.  Socket errors are left
+        for the caller to deal with.
+
+        """
+        pieces = self.pieces
+        if len(pieces) == 1:
+            n = sock.send(pieces[0])
+        elif hasattr(sock, 'sendmsg'):
+            n = sock.sendmsg(pieces[:_IOV_MAX])
+        else:
+            pieces[:] = [b''.join(pieces)]
+            n = sock.send(pieces[0])
+
+        sent = n
+        self.size -= n
+        i = 0
+        while n:
+            size = len(pieces[i])
+            if n < size:
+                # partly sent
+                pieces[i] = memoryview(pieces[i])[n:]
+                break
+            n -= size
+            i += 1
+        del pieces[:i]
+        return sent
+
+
+class _PgType(object):
+    """
+    Helper class to hold info for mapping from pgsql types
+    to Python objecs.
+
+    """
+    def __init__(self, name, converter, type_id, binary_converter=None):
+        self.name = name
+        self.converter = converter
+        self.binary_converter = binary_converter
+        self.type_id = type_id
+        self.oid = None
+
+_DEFAULT_PGTYPE = _PgType('unknown', _char_to_python, 'unknown')
+
+_INT32 = _Struct('!i')
+_INT16 = _Struct('!h')
+_MSG_HEADER = _Struct('!ci')
+_FIELD_DESCRIPTION = _Struct('!ihihih')
+
+# Bind message result format codes asking for everything as text
+_TEXT_RESULTS = _INT16.pack(0)
+
+#
+# Payloads smaller than _SEND_JOIN_SIZE are copied into one piece with
+# their message header when queued for sending, and sendmsg() is given
+# at most _IOV_MAX pieces at a time
+#
+_SEND_JOIN_SIZE = 8192
+_IOV_MAX = 1024
+
+#
+# Version number sent in the startup packet for
+# the version 3.0 frontend/backend protocol
+#
+_PROTOCOL_VERSION = 196608
+
+#
+# Runtime parameters sent in the startup packet, saves a few
+# round-trips compared to running 'SET' commands afterwards.
+#
+_STARTUP_PARAMETERS = [
+    ('client_encoding', 'UTF8'),
+    ('standard_conforming_strings', 'on'),
+    ]
+
+#
+# Named cursors fetch batches of rows big enough that a round-trip
+# takes at most 1/_PREFETCH_RTT_RATIO of the time spent on each batch,
+# growing the batch by at most _PREFETCH_GROWTH times per fetch, and
+# staying under the cursor's .max_prefetch_bytes
+#
+_PREFETCH_RTT_RATIO = 20
+_PREFETCH_GROWTH = 8
+_PREFETCH_BYTES = 1 << 20
+
+#
+# COPY data is sent and written out in chunks of about this
+# many bytes, rather than a row at a time
+#
+COPY_SIZE = 256 * 1024
+
+#
+# Connections receive from the backend in reads of at least RECV_SIZE
+# bytes, growing up to MAX_RECV_SIZE while large results come in
+#
+RECV_SIZE = 4096
+MAX_RECV_SIZE = 1 << 20
+
+#
+# executemany() inserts up to this many rows per INSERT command, and
+# PostgreSQL allows at most _MAX_PARAMETERS parameters in a command
+#
+EXECUTEMANY_PAGE_SIZE = 100
+_MAX_PARAMETERS = 65535
+
+_COPY_FORMATS = {
+    'text': '',
+    'csv': ' CSV',
+    'binary': ' BINARY',
+    }
+
+
+class _PreparedStatement(object):
+    """
+    Helper class to hold info about a statement prepared on the server
+    by a Connection, kept in the connection's statement cache.
+
+    """
+    def __init__(self, name, sql, params, param_types):
+        self.name = name
+        self.sql = sql
+        self.params = params                # param names or count
+        self.param_types = param_types
+        self.param_formats = None           # packed for Bind messages
+        self.param_encoders = None
+        self.prepared = False               # ParseComplete was received
+        self.description = None             # from RowDescription, if any
+        self.type_oids = None
+        self.results = {}                   # text/binary -> (formats, conversion)
+
+    def accepts(self, param_types, values):
+        """
+        Check if values of the given types can be sent to this statement.
+        NULLs fit anywhere, and numbers can go to wider number types.
+
+        """
+        for mine, theirs, value in zip(self.param_types, param_types, values):
+            if (mine != theirs) and (value is not None) \
+            and (mine not in _WIDER_PARAM_TYPES.get(theirs, ())):
+                return False
+        return True
+
+
+class _StatementCache(object):
+    """
+    Bounded LRU cache of the statements a Connection has prepared,
+    keyed by command text.  Counts hits and misses so the cache
+    can be sized sensibly, a size of 0 disables caching.
+
+    """
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__statements = OrderedDict()
+        self.__counter = 0
+
+    def __iter__(self):
+        return iter(list(self.__statements.values()))
+
+    def __len__(self):
+        return len(self.__statements)
+
+    def clear(self):
+        """
+        Forget all the statements, returning the ones that were cached.
+
+        """
+        result = list(self.__statements.values())
+        self.__statements.clear()
+        return result
+
+    def get(self, key):
+        """
+        Return the statement for the key, marking it as most
+        recently used, or None if it isn't cached.
+
+        """
+        stmt = self.__statements.pop(key, None)
+        if stmt is not None:
+            self.__statements[key] = stmt
+        return stmt
+
+    def new_name(self):
+        if not self.size:
+            return ''   # use the unnamed statement
+        self.__counter += 1
+        return 'bpgsql_%d' % self.__counter
+
+    def put(self, key, stmt):
+        """
+        Add a statement, returning a list of the least recently used
+        ones that had to be evicted to make room for it.
+
+        """
+        evicted = []
+        if self.size:
+            self.__statements[key] = stmt
+            while len(self.__statements) > self.size:
+                evicted.append(self.__statements.popitem(last=False)[1])
+            self.evictions += len(evicted)
+        return evicted
+
+    def remove(self, key, stmt=None):
+        """
+        Remove and return the statement for the key, or None if it isn't
+        cached.  If stmt is given, only remove it if that's the one cached.
+
+        """
+        if (stmt is not None) and (self.__statements.get(key) is not stmt):
+            return None
+        return self.__statements.pop(key, None)
+
+
+class _Request(object):
+    """
+    Helper class only used internally by the Connection class to hold
+    the messages for a command, waiting to be sent, and what's
+    needed to make sense of the response.
+
+    """
+    def __init__(self, data, query):
+        self.data = data
+        self.query = query
+        self.stmt = None                    # _PreparedStatement, if any
+        self.key = None                     # statement cache key
+        self.parse = False                  # data includes Parse and Describe
+        self.closing = []                   # statements data closes
+        self.decode_row = None              # known before the response
+        self.retry = None                   # _request() args to try again
+
+
+class _ResultSet(object):
+    """
+    Helper class only used internally by the Connection class for
+    building up result sets.
+
+    """
+    def __init__(self):
+        self.completed = None
+        self.decode_row = None
+        self.description = None
+        self.error = None
+        self.num_fields = 0
+        self.rows = None
+        self.messages = []
+        self.type_oids = None               # from RowDescription, if any
+        self.copy_out = False               # COPY data for _copy_out() to read
+        self.streaming = False              # rows still coming from the backend
+
+    def set_description(self, description):
+        self.description = description
+        self.num_fields = len(description)
+        self.rows = []
+
+    def counts(self):
+        """
+        The number of rows the command affected and the oid of the
+        row it inserted, from the command completion tag, or -1 and
+        None if they aren't there.
+
+        """
+        rowcount = -1
+        lastrowid = None
+        try:
+            words = self.completed.split(' ')
+            rowcount = int(words[-1])
+            if words[0] == 'INSERT':
+                try:
+                    lastrowid = int(words[-2])
+                except:
+                    pass
+        except:
+            pass
+        return rowcount, lastrowid
+
+
+class Protocol(object):
+    """
+    The PostgreSQL version 3 frontend/backend protocol, without any I/O.
+    Data received from the backend is fed in with receive_data() and
+    handled a message at a time by read_message(), which keeps track of
+    results, statements and the like, and whatever is to be sent to
+    the backend is taken from data_to_send().  Connection drives this
+    over a blocking socket, and other transports can do the same.
+
+    """
+    def __init__(self, statement_cache_size=100):
+        self.__backend_pid = None
+        self.__backend_key = None
+        self._input_buffer = _ReceiveBuffer()
+        self._output_buffer = _SendBuffer()
+        self.__authenticated = 0
+        self._ready = 0
+        self.__result = None
+        self.__current_result = None
+        self.__notify_queue = deque()
+        self.__func_result = None
+        self.__parameters = {}
+        self.__transaction_status = None
+        self.__transaction_serial = 0
+        self.__handlers = _packet_handlers(type(self))
+        self.__row_decoders = {}
+        self.__parsing = deque()
+        self.__describing = deque()
+        self.__closing = []
+        self.__copy_source = None
+        self.__copy_sink = None
+        self.__copy_size = COPY_SIZE
+        self.__copy_out = []
+        self.__copy_out_size = 0
+        self.__copy_error = None
+        self.__passwd = ''
+        self.__userid = ''
+        self._copy_pull = None
+        self._pg_types = {}
+        self._oid_map = {}
+        self._python_converters = []
+        self._param_types = dict(_PARAM_TYPES)
+        self._param_encoders = dict(_PARAM_ENCODERS)
+        self._copy_encoders = dict(_COPY_ENCODERS)
+        self._copy_text_encoders = dict(_COPY_TEXT_ENCODERS)
+        self.server_version = None
+        self.statement_cache = _StatementCache(statement_cache_size)
+        self.binary = False
+
+        self._initialize_types()
+
+
+    def _get_conversion(self, oid):
+        """
+        Given an oid of a PgSQL type, come up with a Python callable
+        that will turn a string holding a representation of the value
+        into a Python object
+
+        """
+        return self._oid_map.get(oid, _DEFAULT_PGTYPE).converter
+
+
+    def __new_result(self):
+        #
+        # Start a new ResultSet
+        #
+        if self.__result is None:
+            self.__result = []
+        self.__current_result = _ResultSet()
+        self.__result.append(self.__current_result)
+
+
+    def _python_to_sql(self, obj):
+        """
+        Convert a Python object to a utf-8 string suitable for insertion
+        into an SQL statement.
+
+        """
+        escape_string = True
+
+        for klass, converter in self._python_converters:
+            if isinstance(obj, klass):
+                obj = converter(obj)
+                escape_string = False
+                break
+
+        if obj is None:
+            return 'NULL'
+
+        if isinstance(obj, unicode) and unicode is not str:
+            obj = obj.encode('utf-8')
+
+        if escape_string and isinstance(obj, basestring):
+            return "E'%s'" % _ESCAPE_CHARS.sub(lambda x: '\\x%02x' % ord(x.group(0)), obj)
+
+        return obj
+
+
+    def _register_oid(self, oid, name):
+        """
+        Tie a numeric type oid to a name, which we may have already
+        registered a conversion function for.  If not, register a
+        default conversion function.
+
+        """
+        if name in self._pg_types:
+            pg_type = self._pg_types[name]
+        else:
+            self._pg_types[name] = pg_type = _PgType(name, _char_to_python, 'oid:%d:%s' % (oid, name))
+
+        pg_type.oid = oid
+        self._oid_map[oid] = pg_type
+        self.__row_decoders.clear()
+
+
+    #-----------------------------------
+    #  Feeding the protocol
+    #
+
+    def startup(self, user, password='', dbname='', options=''):
+        """
+        Queue the startup packet asking for a session as user, specifying
+        protocol version 3.0 (works with PostgreSQL 7.4 or higher).  The
+        password is used if the server asks for one.
+
+        """
+        self.__userid = user
+        self.__passwd = password
+        self._ready = 0
+
+        params = [('user', user)]
+        if dbname:
+            params.append(('database', dbname))
+        if options:
+            params.append(('options', options))
+        params.extend(_STARTUP_PARAMETERS)
+
+        packet = b''.join([_encode(k) + b'\0' + _encode(v) + b'\0' for k, v in params]) + b'\0'
+        self._output_buffer.append(_pack('!ii', len(packet) + 8, _PROTOCOL_VERSION) + packet)
+
+
+    def receive_data(self, data):
+        """
+        Add data received from the backend to the input buffer,
+        to be handled by read_message().
+
+        """
+        self._input_buffer.extend(data)
+
+
+    def data_to_send(self):
+        """
+        Return everything waiting to be sent to the
+        backend as one string, and forget it.
+
+        """
+        buf = self._output_buffer
+        data = b''.join([bytes(x) for x in buf.pieces])
+        del buf.pieces[:]
+        buf.size = 0
+        return data
+
+
+    def read_message(self):
+        """
+        Handle the next message in the input buffer if it has been
+        received completely, returning its type (a single byte), or None
+        if more data is needed first (see bytes_needed()).
+
+        PostgreSQL messages begin with a single character <c> followed
+        by the length of the message.  The message is passed to the
+        _pkt_<c> method found in the class's dispatch table.
+
+        """
+        buf = self._input_buffer
+        if len(buf) < 5:
+            return None
+        pkt_type, length = buf.peek(_MSG_HEADER)
+        if len(buf) <= length:
+            return None
+        buf.skip(5)
+        msg = buf.read(length - 4)
+
+        handler = self.__handlers.get(pkt_type)
+        if handler is None:
+            raise InterfaceError('Unrecognized packet type from server: %r' % pkt_type)
+        handler(self, msg)
+        return pkt_type
+
+
+    def bytes_needed(self):
+        """
+        Return how many more bytes need to be received to complete
+        the next message (or its header) in the input buffer.
+
+        """
+        buf = self._input_buffer
+        if len(buf) < 5:
+            return 5 - len(buf)
+        return max(buf.peek(_MSG_HEADER)[1] + 1 - len(buf), 0)
+
+
+    def __send_message(self, msg_type, payload=b''):
+        #
+        # Queue a message for the backend, adding the length header
+        #
+        self._output_buffer.message(msg_type, payload)
+
+
+    def _bytes_received(self):
+        #
+        # Total number of bytes received from the backend so far
+        #
+        return self._input_buffer.received
+
+
+    def _transaction(self):
+        #
+        # Return the transaction status from the last ReadyForQuery
+        # message (b'I' for idle, b'T' in a transaction block, b'E' in
+        # a failed one) and a number that changes when a transaction ends
+        #
+        return self.__transaction_status, self.__transaction_serial
+
+
+    #-----------------------------------
+    #  Packet Handling Methods
+    #
+
+    def _pkt_A(self, msg):
+        #
+        # Notification Response
+        #
+        pid = _INT32.unpack_from(msg)[0]
+        end = msg.index(b'\0', 4)
+        payload = msg[end + 1:msg.index(b'\0', end + 1)]
+        self.__notify_queue.append(Notification(msg[4:end].decode('utf-8'), payload.decode('utf-8'), pid))
+
+
+    def _pkt_C(self, msg):
+        #
+        # Command Complete
+        #
+        completed = msg[:-1].decode('utf-8')
+        if completed in ('DISCARD ALL', 'DEALLOCATE ALL'):
+            # server-side prepared statements are all gone
+            self.statement_cache.clear()
+        self.__current_result.completed = completed
+        self.__new_result()
+
+
+    def _pkt_D(self, msg):
+        #
+        # Data Row.  Any more DataRows that have already been received
+        # are converted in a tight loop rather than one by one
+        # through __read_response()
+        #
+        result = self.__current_result
+        result.rows.append(result.decode_row(msg, 2))
+        self._input_buffer.data_rows(result.rows, result.decode_row)
+
+
+    def _pkt_E(self, msg):
+        #
+        # Error Response
+        #
+        exc = _error_from_fields(_parse_message_fields(msg))
+
+        if self.__current_result:
+            self.__current_result.error = exc
+            self.__new_result()
+        else:
+            raise exc
+
+
+    def _pkt_G(self, msg):
+        #
+        # CopyIn Response, whatever is driving the protocol sends
+        # the data with _copy_data() and ends with _copy_done()
+        # or _copy_fail()
+        #
+        pass
+
+
+    def _copy_in_source(self):
+        #
+        # The source of the data for a COPY FROM STDIN: the one
+        # _start_copy() was given, or lines from self.stdin if available,
+        # or sys.stdin, generated in chunks.
+        #
+        source = self.__copy_source
+        if source is None:
+            source = _copy_chunks(self.__stdin_lines(), self.__copy_size)
+        return source
+
+
+    def _copy_data(self, data):
+        #
+        # Queue a chunk of data for COPY FROM STDIN
+        #
+        self._output_buffer.message(b'd', data)
+
+
+    def _copy_done(self):
+        self.__send_message(b'c')
+
+
+    def _copy_fail(self, e):
+        #
+        # Reading the source failed, tell the backend the COPY failed
+        # and keep the exception for _end_copy() to return.
+        #
+        if self.__copy_source is not None:
+            self.__copy_error = e
+        self.__send_message(b'f', _encode('%s: %s' % (e.__class__.__name__, e)) + b'\0')
+
+
+    def __stdin_lines(self):
+        #
+        # Generate lines from self.stdin if available, or sys.stdin.
+        # Stops at the terminating line: '\.' (one backslash
+        # followed by a period) if it appears in the input
+        #
+        if hasattr(self, 'stdin') and self.stdin:
+            stdin = self.stdin
+        else:
+            stdin = sys.stdin
+
+        lastline = None
+        while True:
+            s = _encode(stdin.readline())
+            if (not s) or (s == b'\\.\n'):
+                break
+            yield s
+            lastline = s
+        if lastline and (lastline[-1:] != b'\n'):
+            yield b'\n'
+
+
+    def _pkt_H(self, msg):
+        #
+        # CopyOut Response, the data follows in CopyData messages.  When
+        # copying to a sink, _copy_out_data() pulls them out of the
+        # input buffer in a tight loop rather than one by one through
+        # read_message()
+        #
+        if self._copy_pull is not None:
+            # leave the data for _copy_out() to pull out
+            self.__current_result.copy_out = True
+
+
+    def _copy_out_data(self):
+        #
+        # Pass the CopyData messages in the input buffer to the sink
+        # _start_copy() was given.  Returns True once some other message
+        # is next, or if the data isn't going to a sink (so the messages
+        # are handled by _pkt_d).
+        #
+        if (self.__copy_sink is None) or (self._copy_pull is not None):
+            return True
+        while True:
+            nbytes, other = self._input_buffer.copy_data(self.__copy_out, self.__copy_size - self.__copy_out_size)
+            self.__copy_out_size += nbytes
+            if self.__copy_out_size < self.__copy_size:
+                return other
+            self.__flush_copy_out()
+
+
+    def _start_copy(self, source=None, sink=None, size=COPY_SIZE):
+        #
+        # Set up for executing a COPY command, with the chunks of data
+        # generated by source for COPY FROM STDIN, or passing chunks of
+        # about size bytes to the sink callable for COPY TO STDOUT.
+        #
+        self.__copy_source = source
+        self.__copy_sink = sink
+        self.__copy_size = size
+
+
+    def _end_copy(self, complete):
+        #
+        # Clean up after a COPY command, passing the last of the data
+        # to the sink if it completed.  Returns the exception raised
+        # by the source, if any.
+        #
+        try:
+            if complete:
+                self.__flush_copy_out()
+        finally:
+            self.__copy_source = self.__copy_sink = None
+            self.__copy_size = COPY_SIZE
+            self.__copy_out = []
+            self.__copy_out_size = 0
+            error, self.__copy_error = self.__copy_error, None
+        return error
+
+
+    def _pkt_I(self, msg):
+        #
+        # EmptyQuery Response
+        #
+        self.__new_result()
+
+
+    def _pkt_K(self, msg):
+        #
+        # Backend Key data
+        #
+        self.__backend_pid, self.__backend_key = _unpack('!ii', msg)
+
+
+    def _pkt_N(self, msg):
+        #
+        # Notice Response
+        #
+        fields = _parse_message_fields(msg)
+        n = '%s:  %s' % (fields.get('S', 'NOTICE'), fields.get('M', ''))
+        if self.__current_result:
+            self.__current_result.messages.append((Warning, n))
+
+
+    def _pkt_R(self, msg):
+        #
+        # Authentication Request
+        #
+        code = _INT32.unpack_from(msg)[0]
+        if code == 0:
+            self.__authenticated = 1
+            #print 'Authenticated!'
+        elif code == 2:
+            raise InterfaceError('Kerberos V5 authentication is required by server, but not supported by this client')
+        elif code == 3:
+            self.__send_message(b'p', _encode(self.__passwd) + b'\0')
+        elif code == 5:
+            m = hashlib.md5(_encode(self.__passwd) + _encode(self.__userid)).hexdigest()
+            m = hashlib.md5(m.encode('ascii') + msg[4:8]).hexdigest()
+            self.__send_message(b'p', b'md5' + m.encode('ascii') + b'\0')
+        else:
+            raise InterfaceError('Unknown startup response code: R%d (unknown password encryption?)' % code)
+
+
+    def _pkt_S(self, msg):
+        #
+        # Parameter Status
+        #
+        name, value = msg.split(b'\0')[:2]
+        name = name.decode('utf-8')
+        value = value.decode('utf-8')
+        self.__parameters[name] = value
+        if name == 'server_version':
+            self.server_version = _parse_server_version(value)
+
+
+    def _pkt_T(self, msg):
+        #
+        # Row Description
+        #
+        nFields = _INT16.unpack_from(msg)[0]
+        pos = 2
+        descr = []
+        for i in range(nFields):
+            end = msg.index(b'\0', pos)
+            fieldname = msg[pos:end].decode('utf-8')
+            table_oid, column, oid, type_size, type_modifier, format = _FIELD_DESCRIPTION.unpack_from(msg, end + 1)
+            pos = end + 1 + _FIELD_DESCRIPTION.size
+            descr.append((fieldname, oid, type_size, type_modifier))
+
+        description = []
+        for name, oid, size, modifier in descr:
+            pg_type = self._oid_map.get(oid, _DEFAULT_PGTYPE)
+            description.append((name, pg_type.type_id, None, None, None, None, None))
+
+        # a function to convert each row, for the column types
+        decode_row = self.__row_decoder(tuple([d[1] for d in descr]), False)
+
+        if self.__describing:
+            # Describing a statement we're preparing, remember for later executions
+            stmt = self.__describing.popleft()
+            stmt.description = description
+            stmt.type_oids = [d[1] for d in descr]
+
+        # Save the field description list
+        self.__current_result.set_description(description)
+        self.__current_result.decode_row = decode_row
+        self.__current_result.type_oids = [d[1] for d in descr]
+
+
+    def _pkt_V(self, msg):
+        #
+        # Function call response
+        #
+        result_size = _INT32.unpack_from(msg)[0]
+        if result_size < 0:
+            self.__func_result = None
+        else:
+            self.__func_result = msg[4:4+result_size]
+
+
+    def _pkt_Z(self, msg):
+        #
+        # Ready for Query
+        #
+        self._ready = 1
+        self.__transaction_status = msg[:1]
+        if self.__transaction_status == b'I':
+            # a transaction (possibly an implicit one) ended
+            self.__transaction_serial += 1
+        # anything still waiting was skipped because of an error
+        self.__parsing.clear()
+        self.__describing.clear()
+        #print 'Ready for Query'
+
+
+    def _pkt_1(self, msg):
+        #
+        # Parse Complete
+        #
+        self.__parsing.popleft().prepared = True
+
+
+    def _pkt_2(self, msg):
+        #
+        # Bind Complete
+        #
+        pass
+
+
+    def _pkt_3(self, msg):
+        #
+        # Close Complete
+        #
+        pass
+
+
+    def _pkt_c(self, msg):
+        #
+        # CopyDone, the CommandComplete message follows
+        #
+        self.__flush_copy_out()
+
+
+    def _pkt_d(self, msg):
+        #
+        # CopyData, collected up for the sink _copy() was given, or
+        # written to self.stdout if available, or sys.stdout
+        #
+        if self._copy_pull is not None:
+            # _copy_out() gave up on the rest
+            return
+
+        if self.__copy_sink is not None:
+            self.__copy_out.append(msg)
+            self.__copy_out_size += len(msg)
+            if self.__copy_out_size >= self.__copy_size:
+                self.__flush_copy_out()
+            return
+
+        if hasattr(self, 'stdout') and self.stdout:
+            stdout = self.stdout
+        else:
+            stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+        stdout.write(msg)
+
+
+    def __flush_copy_out(self):
+        #
+        # Pass COPY data collected by _pkt_d to the sink in one chunk
+        #
+        if self.__copy_out:
+            data = b''.join(self.__copy_out)
+            self.__copy_out = []
+            self.__copy_out_size = 0
+            self.__copy_sink(data)
+
+
+    def _pkt_n(self, msg):
+        #
+        # No Data, the statement being described doesn't return rows
+        #
+        if self.__describing:
+            self.__describing.popleft().description = None
+
+
+    def _pkt_t(self, msg):
+        #
+        # Parameter Description, we already know the
+        # types since we specified them when preparing
+        #
+        pass
+
+
+    def _pkt_v(self, msg):
+        #
+        # Negotiate Protocol Version, sent when the server doesn't
+        # know a protocol option we asked for.  We don't ask for
+        # any, so nothing needs to be done.
+        #
+        pass
+
+
+    #--------------------------------------
+    # Helper functions for executing commands
+    #
+
+    def _request(self, cmd, args=None, binary=None):
+        #
+        # Work out the messages to send to the backend for a command,
+        # returning a _Request holding them and what's needed to
+        # handle the response.  Nothing is sent yet.
+        #
+        if binary is None:
+            binary = self.binary
+
+        if isinstance(cmd, unicode) and unicode is not str:
+            cmd = cmd.encode('utf-8')
+        elif isinstance(cmd, bytes) and bytes is not str:
+            cmd = cmd.decode('utf-8')
+
+        if (args is not None) and not isinstance(args, (tuple, list, dict)):
+            # Args wasn't a tuple, list, or dict: wrap it up in a tuple
+            args = (args,)
+
+        if (((args is not None) and _PREPARABLE.match(cmd))
+            or ((args is None) and binary and not _multiple_statements(cmd))):
+            request = self.__request_prepared(cmd, args, binary)
+            if request is not None:
+                return request
+
+        if args is not None:
+            if isinstance(args, dict):
+                # replace pyformat markers with dictionary parameters
+                cmd = cmd % dict([(k, self._python_to_sql(v)) for k, v in list(args.items())])
+            else:
+                # Replace plain-format markers with fixed-up tuple parameters
+                cmd = cmd % tuple([self._python_to_sql(a) for a in args])
+
+        return _Request(_message(b'Q', _encode(cmd) + b'\0'), cmd)
+
+
+    def __request_prepared(self, cmd, args, binary):
+        #
+        # Execute a command with parameters using the extended query
+        # protocol, preparing it on the server the first time it's seen
+        # and then reusing the prepared statement and its row
+        # description from the statement cache.  Commands without
+        # parameters only come through here to get binary results.
+        #
+        # Returns None if the command or args can't be handled
+        # this way, so the caller should fall back to plugging
+        # the args into the command text.
+        #
+        if args is None:
+            named = None
+            args = ()
+        else:
+            named = isinstance(args, dict)
+        cache = self.statement_cache
+        key = (cmd, named)
+        stmt = cache.get(key)
+
+        if stmt is not None:
+            sql, params = stmt.sql, stmt.params
+        elif named is None:
+            # no parameters, so no % formatting was wanted
+            sql, params = cmd, 0
+        else:
+            converted = _convert_placeholders(cmd, named)
+            if converted is None:
+                return None
+            sql, params = converted
+
+        if named:
+            try:
+                values = [args[name] for name in params]
+            except KeyError as e:
+                raise ProgrammingError('Missing parameter: %s' % e)
+        elif len(args) != params:
+            raise ProgrammingError('Command has %d parameters, but %d were supplied' % (params, len(args)))
+        else:
+            values = args
+
+        param_types = []
+        for value in values:
+            oid = self.__param_type(value)
+            if oid is None:
+                return None
+            param_types.append(oid)
+
+        msgs = []
+        closing = []
+        if (stmt is not None) and not stmt.accepts(param_types, values):
+            # Prepared for different parameter types, replace it
+            self.__closing.append(cache.remove(key))
+            stmt = None
+
+        if stmt is None:
+            cache.misses += 1
+            stmt = _PreparedStatement(cache.new_name(), sql, params, param_types)
+            encoders = [self._param_encoders[oid] for oid in param_types]
+            stmt.param_formats = _pack('!h%dh' % len(encoders), len(encoders), *[e[0] for e in encoders])
+            stmt.param_encoders = [e[1] for e in encoders]
+            self.__closing.extend(cache.put(key, stmt))
+            closing, self.__closing = self.__closing, []
+            for old in closing:
+                msgs.append(_message(b'C', b'S' + _encode(old.name) + b'\0'))
+
+            name = _encode(stmt.name) + b'\0'
+            msgs.append(_message(b'P', name + _encode(sql) + b'\0'
+                + _pack('!h%dI' % len(param_types), len(param_types), *param_types)))
+            msgs.append(_message(b'D', b'S' + name))
+            parse = True
+        else:
+            cache.hits += 1
+            parse = False
+
+        if stmt.prepared and (stmt.description is not None):
+            # row description known from earlier executions
+            formats, decode_row = self.__result_conversion(stmt, binary)
+        else:
+            formats, decode_row = _TEXT_RESULTS, None
+
+        # unnamed portal, statement name, parameter formats,
+        # the parameter values, result formats
+        bind = [b'\0', _encode(stmt.name), b'\0', stmt.param_formats, _INT16.pack(len(values))]
+        for encode, value in zip(stmt.param_encoders, values):
+            if value is None:
+                bind.append(_INT32.pack(-1))
+            else:
+                data = encode(value)
+                bind.append(_INT32.pack(len(data)))
+                bind.append(data)
+        bind.append(formats)
+
+        msgs.append(_message(b'B', b''.join(bind)))
+        msgs.append(_message(b'E', b'\0' + _INT32.pack(0)))
+        msgs.append(_message(b'S'))
+
+        request = _Request(b''.join(msgs), sql)
+        request.stmt = stmt
+        request.key = key
+        request.parse = parse
+        request.closing = closing
+        request.decode_row = decode_row
+        request.retry = (cmd, (args if named is not None else None), binary)
+        return request
+
+
+    def _start_response(self, request):
+        #
+        # Get ready to handle the backend's response to a request,
+        # returning the first result, which is filled in as the messages
+        # are read until ReadyForQuery.
+        #
+        stmt = request.stmt
+        self._ready = 0
+        self.__result = None
+        self.__new_result()
+        if request.parse:
+            self.__parsing.append(stmt)
+            self.__describing.append(stmt)
+        decode_row = request.decode_row
+        if (decode_row is None) and (stmt is not None) and (not request.parse) \
+        and (stmt.description is not None):
+            # described by an earlier command in the same pipeline,
+            # after this one asked for text results
+            decode_row = self.__result_conversion(stmt, False)[1]
+        if decode_row is not None:
+            self.__current_result.set_description(stmt.description)
+            self.__current_result.decode_row = decode_row
+        return self.__result[0]
+
+
+    def _response_done(self, request, retry):
+        #
+        # Wrap up a response that has been read up to ReadyForQuery,
+        # returning the result, and a new request to send and read the
+        # response to instead if the statement needs preparing again.
+        #
+        stmt = request.stmt
+        result, self.__result = self.__result[0], None
+        result.query = request.query
+        result.streaming = False
+
+        if stmt is None:
+            return result, None
+
+        cache = self.statement_cache
+        if not stmt.prepared:
+            # Parse failed, nothing to reuse
+            cache.remove(request.key, stmt)
+        elif result.error and (result.error.pgcode == '0A000') \
+        and (cache.remove(request.key, stmt) is not None):
+            # Probably 'cached plan must not change result type' after
+            # the tables changed.  Prepare it again, right away if
+            # there's no transaction the error could have spoiled
+            # (and no pipelined responses waiting to be read).
+            self.__closing.append(stmt)
+            if retry and (self.__transaction_status == b'I'):
+                return result, self._request(*request.retry)
+
+        return result, None
+
+
+    def _discard(self, request):
+        #
+        # Forget a request that was never sent, so the statement
+        # cache doesn't refer to a statement that wasn't prepared
+        #
+        if request.parse:
+            self.statement_cache.remove(request.key, request.stmt)
+            self.__closing.extend(request.closing)
+
+
+    def _function_call(self, oid, args):
+        #
+        # Queue a FunctionCall message, and get ready for the response
+        #
+        msg = [_pack('!IhhH', oid, 1, 1, len(args))]
+        for arg in args:
+            if isinstance(arg, (int, long)) and (arg >= 0):
+                # Make sure positive longs, such as OIDs, get
+                # sent back as unsigned ints
+                msg.append(_pack('!iI', 4, arg))
+            elif isinstance(arg, (int, long)):
+                msg.append(_pack('!ii', 4, arg))
+            else:
+                arg = _encode(arg)
+                msg.append(_INT32.pack(len(arg)))
+                msg.append(arg)
+        msg.append(_INT16.pack(1))      # binary result
+
+        self._ready = 0
+        self.__result = None
+        self.__new_result()
+        self.__send_message(b'F', b''.join(msg))
+
+
+    def _function_result(self):
+        #
+        # The result of a function call, once ReadyForQuery is read
+        #
+        error, self.__result = self.__result[0].error, None
+        if error:
+            raise error
+        result, self.__func_result = self.__func_result, None
+        return result
+
+
+    def _notification(self):
+        #
+        # Return the oldest (name, pid) notification
+        # received, or None if there aren't any
+        #
+        if self.__notify_queue:
+            n = self.__notify_queue.popleft()
+            return n.channel, n.pid
+        return None
+
+
+    def _notifications(self):
+        #
+        # Return all the Notifications received so far, oldest first
+        #
+        queue = self.__notify_queue
+        result = list(queue)
+        queue.clear()
+        return result
+
+
+    def __result_conversion(self, stmt, binary):
+        #
+        # Come up with the result format codes to send in a Bind message
+        # for a described statement, and the function to convert its
+        # rows.  For binary results, columns whose type doesn't
+        # have a binary conversion function still come across as text.
+        #
+        result = stmt.results.get(binary)
+        if result is None:
+            if binary:
+                pg_types = [self._oid_map.get(oid, _DEFAULT_PGTYPE) for oid in stmt.type_oids]
+                formats = [int(t.binary_converter is not None) for t in pg_types]
+                formats = _pack('!h%dh' % len(formats), len(formats), *formats)
+            else:
+                formats = _TEXT_RESULTS
+            result = stmt.results[binary] = (formats, self.__row_decoder(tuple(stmt.type_oids), binary))
+        return result
+
+
+    def __row_decoder(self, type_oids, binary):
+        #
+        # Get the function for converting rows with columns of the
+        # given types, shared by all results with the same types
+        # until the type mappings change.
+        #
+        key = (type_oids, binary)
+        decode_row = self.__row_decoders.get(key)
+        if decode_row is None:
+            if binary:
+                pg_types = [self._oid_map.get(oid, _DEFAULT_PGTYPE) for oid in type_oids]
+                conversion = [t.binary_converter or t.converter for t in pg_types]
+            else:
+                conversion = [self._get_conversion(oid) for oid in type_oids]
+            decode_row = self.__row_decoders[key] = _row_decoder(conversion)
+        return decode_row
+
+
+    def _copy_text_value(self, value):
+        #
+        # Convert a Python value to text for a text format COPY.
+        # Classes with a converter registered with register_python()
+        # can't be copied, since it produces an SQL expression.
+        #
+        encode = self._copy_text_encoders.get(type(value))
+        if encode is None:
+            classes = [klass for klass, converter in self._python_converters]
+            for klass in type(value).__mro__:
+                if klass in self._copy_text_encoders:
+                    encode = self._copy_text_encoders[klass]
+                    break
+                if klass in classes:
+                    raise NotSupportedError("Can't COPY %s values converted with register_python()" % type(value).__name__)
+            else:
+                return _copy_text_escape(unicode(value))
+        return encode(value)
+
+
+    def _record_encoders(self, result):
+        #
+        # The functions encoding values in binary COPY format for
+        # the columns of a result set, by their types
+        #
+        encoders = []
+        for d, oid in zip(result.description, result.type_oids):
+            pg_type = self._oid_map.get(oid, _DEFAULT_PGTYPE)
+            encoder = self._copy_encoders.get(pg_type.name)
+            if encoder is None:
+                raise NotSupportedError("Can't copy column %s of type %s in binary format" % (d[0], pg_type.name))
+            encoders.append(encoder)
+        return encoders
+
+
+    def _record_decoders(self, result):
+        #
+        # The functions decoding values in binary COPY format for
+        # the columns of a result set, by their types
+        #
+        decoders = []
+        for d, oid in zip(result.description, result.type_oids):
+            pg_type = self._oid_map.get(oid, _DEFAULT_PGTYPE)
+            if pg_type.binary_converter is None:
+                raise NotSupportedError("Can't copy column %s of type %s in binary format" % (d[0], pg_type.name))
+            decoders.append(pg_type.binary_converter)
+        return decoders
+
+
+    def __param_type(self, value):
+        #
+        # Find the type oid to send a Python value as, or None if a
+        # converter was registered with register_python() for it, which
+        # can only produce something to plug into the command text.
+        #
+        param_type = self._param_types.get(type(value))
+        if param_type is None:
+            classes = [klass for klass, converter in self._python_converters]
+            for klass in type(value).__mro__:
+                if klass in self._param_types:
+                    param_type = self._param_types[klass]
+                    break
+                if klass in classes:
+                    return None
+            else:
+                return _UNKNOWN_OID
+        return param_type(value)
+
+
+    def _initialize_types(self):
+        """
+        Setup mappings between Python and PgSQL types.  Subclasses may
+        want to override or extend this.
+
+        """
+        #
+        ## Map PgSQL -> Python
+        #
+        self.register_pgsql(['char', 'bpchar', 'varchar', 'text', 'name'],
+            _char_to_python, STRING, _char_to_python)
+        self.register_pgsql('bytea', _binary_to_python, BINARY,
+            _binary_bytea_to_python)
+        self.register_pgsql('uuid', _uuid_to_python, STRING,
+            _binary_uuid_to_python)
+
+        self.register_pgsql('int2', int, NUMBER, _binary_int2_to_python)
+        self.register_pgsql('int4', int, NUMBER, _binary_int4_to_python)
+        self.register_pgsql('int8', int, NUMBER, _binary_int8_to_python)
+        self.register_pgsql('float4', float, NUMBER, _binary_float4_to_python)
+        self.register_pgsql('float8', float, NUMBER, _binary_float8_to_python)
+        self.register_pgsql('numeric', _numeric_to_python, NUMBER,
+            _binary_numeric_to_python)
+
+        self.register_pgsql('oid', int, ROWID, _binary_oid_to_python)
+        self.register_pgsql('bool', _bool_to_python, 'bool',
+            _binary_bool_to_python)
+
+        self.register_pgsql('date', _date_to_python, DATETIME,
+            _binary_date_to_python)
+        self.register_pgsql('time', _time_to_python, DATETIME,
+            _binary_time_to_python)
+        self.register_pgsql('timetz', _time_to_python, DATETIME,
+            _binary_timetz_to_python)
+        self.register_pgsql('timestamp', _timestamp_to_python, DATETIME,
+            _binary_timestamp_to_python)
+        self.register_pgsql('timestamptz', _timestamp_to_python, DATETIME,
+            _binary_timestamptz_to_python)
+
+        #
+        ## Map Python -> PgSQL
+        #  the order matters, so put subclasses before superclasses
+        #   (such as datetime before date)
+        #
+        self.register_python(datetime.datetime, _datetime_to_pgsql)
+        self.register_python(datetime.date, lambda x: "'%s'::date" % str(x))
+        self.register_python(datetime.time, _time_to_pgsql)
+        self.register_python(Binary, _binary_to_pgsql)
+
+
+    def _cancel_message(self):
+        #
+        # The CancelRequest for this session, sent on a
+        # separate connection to the server
+        #
+        if self.__backend_key is None:
+            raise InterfaceError("Server didn't send a key for canceling commands")
+        return _pack('!iiii', 16, 80877102, self.__backend_pid, self.__backend_key)
+
+
+    def _session_state(self):
+        #
+        # Whether the session is read-only, and whether the server is a
+        # standby, as reported by servers since PostgreSQL 14.  None if
+        # they're not reported, and _SESSION_STATE_QUERY has to be run.
+        #
+        read_only = self.__parameters.get('default_transaction_read_only')
+        standby = self.__parameters.get('in_hot_standby')
+        if (read_only is None) or (standby is None):
+            return None
+        return (read_only == 'on'), (standby == 'on')
+
+
+    #--------------------------------------
+    # Public methods
+    #
+
+    def get_parameter_status(self, name):
+        """
+        Return the current value of a parameter reported by the server,
+        such as 'server_version', 'TimeZone' or 'client_encoding',
+        without a round trip to the backend.  Returns None for unknown
+        parameters.
+
+        """
+        return self.__parameters.get(name)
+
+
+    def get_backend_pid(self):
+        """
+        Return the process ID of the server process handling the
+        connection, as reported when logging in.
+
+        """
+        return self.__backend_pid
+
+
+    def register_pgsql(self, typenames, converter, type_id, binary_converter=None):
+        """
+        For a PgSQL typename or list of typenames, register a callable
+        that converts strings of those values into Python objects, and
+        a type_id object that will be used to identify the type in
+        result descriptions.
+
+        binary_converter, if given, is a callable that converts the
+        binary format of those values into Python objects, used for
+        binary results.  Values of types without one are always
+        sent as text.
+
+        """
+        # if the first arg is just a single string, put it into a list
+        #
+        if isinstance(typenames, str):
+            typenames = [typenames]
+
+        for name in typenames:
+            #
+            # See if we've already done '_register_oid' on this name
+            #
+            if name in self._pg_types:
+                oid = self._pg_types[name].oid
+            else:
+                oid = None
+
+            self._pg_types[name] = pg_type = _PgType(name, converter, type_id, binary_converter)
+
+            #
+            # Update oid_map if we already did _register_oid on this name
+            #
+            if oid is not None:
+                self._oid_map[oid] = pg_type
+
+        # cached statements and row decoders may have the old conversion functions
+        self.__row_decoders.clear()
+        for stmt in self.statement_cache:
+            stmt.results.clear()
+
+
+    def register_python(self, klass, converter):
+        """
+        Register a callable for converting a Python object
+        to a string suitable for use as a value in an SQL statement.  The
+        result should ideally be a utf-8 encoded plain string, or else a
+        unicode string.
+
+        Converters are searched in the order they're added, so be sure
+        to register more specific types before general times (for example,
+        datetime.datetime before datetime.date).
+
+        """
+        self._python_converters.append((klass, converter))
+
+
+class Connection(Protocol):
+    """
+    connection objects are created by calling this module's connect function.
+
+    """
+    def __init__(self, dsn=None, username='', password='',
+        host=None, dbname='', port='', opt='', statement_cache_size=100, **options):
+        self.__socket = None
+        self.__pid = os.getpid()
+        Protocol.__init__(self, statement_cache_size)
+        self.__recv_size = RECV_SIZE
+        self.__streaming = None
+        self.__lo_funcs = {}
+        self.__lo_funcnames = {}
+        self._pipeline = None
+        self.__cancel_address = None
+        self.__cancel_timeout = None
+        self.__deadline = None
+        self.__canceled = False
+
+        args = _connect_args(dsn, username, password, host, dbname, port, opt, options)
+        self.__connect(args, statement_cache_size)
+
+        #
+        # Get type info from the backend to help put together some dictionaries
+        # to help in converting Pgsql types to Python types.
+        #
+        self.__initialize_type_map()
+
+
+    def __connect(self, args, statement_cache_size):
+        #
+        # Log in to the first server in the host list that takes the
+        # connection and has the session attributes asked for, giving
+        # each one connect_timeout seconds to get that far.  Failing
+        # authentication ends it there rather than trying the rest.
+        #
+        timeout = _connect_timeout(args)
+        targets = _connect_targets(args)
+        errors = []
+        for wanted in _session_passes(args['target_session_attrs']):
+            remaining = list(targets)
+            while remaining:
+                try:
+                    s, target = _connect_socket(remaining, args, timeout, errors)
+                except OperationalError:
+                    break
+                remaining.remove(target)
+
+                self.__socket = s
+                try:
+                    s.settimeout(timeout)
+                    if self.__login(args, wanted):
+                        s.settimeout(None)
+                        self.__cancel_address = (s.family, s.getpeername())
+                        self.__cancel_timeout = timeout or _CANCEL_TIMEOUT
+                        return
+                    errors.append('%s: server is not %s' % (target[0], wanted))
+                    self.__send(_message(b'X'))
+                except (socket.error, DatabaseError) as e:
+                    if getattr(e, 'pgcode', None) and e.pgcode.startswith('28'):
+                        self.__socket = None
+                        s.close()
+                        raise
+                    errors.append('%s: %s' % (target[0], e))
+
+                # on to the next one, starting afresh
+                self.__socket = None
+                s.close()
+                Protocol.__init__(self, statement_cache_size)
+
+        raise OperationalError("Couldn't connect to server: %s" % '; '.join(errors))
+
+
+    def __login(self, args, wanted):
+        #
+        # Log in over the newly connected socket, and check
+        # whether the session is what target_session_attrs wants
+        #
+        self.startup(args['user'], args['password'], args['dbname'], args['options'])
+        self.__flush()
+        while not self._ready:
+            self.__read_response()
+
+        if wanted == 'any':
+            return True
+        state = self._session_state()
+        if state is None:
+            cur = self.cursor()
+            cur.execute(_SESSION_STATE_QUERY)
+            state = [(x == 'on') for x in cur.fetchone()]
+        return _session_matches(wanted, *state)
+
+
+    def __del__(self):
+        if self.__socket and (self.__pid != os.getpid()):
+            # inherited across a fork, leave the session to the parent
+            self._detach()
+        elif self.__socket:
+            try:
+                self.__send(_message(b'X'))
+            finally:
+                self.__socket.close()
+                self.__socket = None
+
+
+    def _detach(self):
+        #
+        # Close the socket without ending the session, for a connection
+        # inherited by a child process: the parent still has the socket
+        # open and carries on using it.
+        #
+        if self.__socket:
+            self.__socket.close()
+            self.__socket = None
+
+
+    def __initialize_type_map(self):
+        """
+        Query the backend to find out a mapping for type_oid -> type_name, and
+        then lookup the map of type_name -> conversion_function, to come up
+        with a map of type_oid -> conversion_function
+        """
+        cur = self.cursor()
+
+        # Normally already taken care of by the startup packet
+        if self.get_parameter_status('standard_conforming_strings') != 'on':
+            cur.execute("SET STANDARD_CONFORMING_STRINGS to 'ON'")
+
+        cur.execute('SELECT oid, typname FROM pg_type')
+
+        for oid, name in cur:
+            self._register_oid(int(oid), name)
+
+
+    def __lo_init(self):
+        #
+        # Make up a dictionary mapping function names beginning with "lo"
+        # to function oids (there may be some non-lobject functions
+        # in there, but that should be harmless)
+        #
+        result = self._execute("SELECT proname, oid FROM pg_proc WHERE proname like 'lo%'")
+        for proname, oid in result.rows:
+            self.__lo_funcs[proname] = oid
+            self.__lo_funcnames[oid] = proname
+
+
+    def __fill(self, nBytes):
+        #
+        # Receive at least some more data from the backend, making
+        # room for nBytes more in the input buffer.  When a receive
+        # fills the room made for it there's likely more data waiting,
+        # so make twice the room next time, up to MAX_RECV_SIZE, and
+        # shrink back when receives come up well short.
+        #
+        if self._output_buffer:
+            self.__flush()
+        if self.__deadline is not None:
+            self.__wait_deadline()
+        size = self.__recv_size
+        n = self._input_buffer.recv_into(self.__recv_into, max(nBytes, size))
+        if not n:
+            raise OperationalError('Connection to backend closed')
+        if n >= size:
+            self.__recv_size = min(2 * size, MAX_RECV_SIZE)
+        elif n < size // 8:
+            self.__recv_size = max(size // 2, RECV_SIZE)
+
+
+    def __wait_deadline(self):
+        #
+        # Wait for the backend until the deadline of a command with
+        # a timeout, and cancel the command if it passes.  The backend
+        # answers with an error, waited for as usual.  If the cancel
+        # request can't be sent there's no telling when the command will
+        # end, so the connection is closed.
+        #
+        if self.__canceled or _wait_readable(self.__socket, max(self.__deadline - _clock(), 0)):
+            return
+        self.__canceled = True
+        try:
+            self.cancel()
+        except Error as e:
+            self.__socket.close()
+            self.__socket = None
+            raise QueryTimeout('Command ran over its timeout, connection closed: %s' % e)
+
+
+    def __read_response(self):
+        #
+        # Read a single message from the backend and handle it,
+        # receiving more data until it's complete.  COPY data is sent
+        # or received in bulk when the backend switches to COPY mode.
+        #
+        pkt_type = self.read_message()
+        while pkt_type is None:
+            self.__fill(self.bytes_needed())
+            pkt_type = self.read_message()
+
+        if pkt_type == b'G':
+            self.__copy_in()
+        elif pkt_type == b'H':
+            while not self._copy_out_data():
+                self.__fill(0)
+
+
+    def __recv_into(self, view):
+        while True:
+            try:
+                return self.__socket.recv_into(view)
+            except socket.error as serr:
+                if serr.args[0] != errno.EINTR:
+                    raise
+
+
+    def __send(self, data):
+        #
+        # Send data to the backend, along with any messages
+        # waiting in the output buffer, make sure it's all sent
+        #
+        self._output_buffer.append(data)
+        self.__flush()
+
+
+    def __flush(self):
+        #
+        # Send everything in the output buffer
+        #
+        if self.__socket is None:
+            raise InterfaceError('Connection not open')
+        if self.__pid != os.getpid():
+            raise InterfaceError('Connection was opened by another process')
+
+        buf = self._output_buffer
+        while buf:
+            try:
+                buf.send(self.__socket)
+            except socket.error as serr:
+                if serr.args[0] != errno.EINTR:
+                    raise
+
+
+    def __wait_response(self, timeout):
+        #
+        # Wait for something to be in the input buffer, timeout
+        # is a floating-point number of seconds, zero means
+        # timeout immediately, < 0 means don't timeout (call blocks
+        # indefinitely)
+        #
+        if len(self._input_buffer):
+            return 1
+
+        if self._output_buffer:
+            self.__flush()
+        if timeout < 0:
+            timeout = None
+        if _wait_readable(self.__socket, timeout):
+            return 1
+        else:
+            return 0
+
+
+
+    def __copy_in(self):
+        #
+        # Send the data for a COPY FROM STDIN, a chunk at a time,
+        # telling the backend the COPY failed if reading it does.
+        #
+        try:
+            for data in self._copy_in_source():
+                if data:
+                    self._copy_data(data)
+                    self.__flush()
+        except Exception as e:
+            self._copy_fail(e)
+        else:
+            self._copy_done()
+        self.__flush()
+
+
+    def _receive_notifications(self):
+        #
+        # Handle whatever the backend has sent so far, waiting only for
+        # the rest of a message that's partly arrived, and return the
+        # Notifications received, for a Listener that's been told the
+        # socket is readable.
+        #
+        self.__finish_stream()
+        while self.read_message() is not None:
+            pass
+        while self.__wait_response(0):
+            self.__read_response()
+        return self._notifications()
+
+
+    #--------------------------------------
+    # Helper func for _LargeObject
+    #
+    def _lo_funcall(self, name, *args):
+        return self.funcall(*(self.__lo_funcs[name],) + args)
+
+
+    #--------------------------------------
+    # Helper functions for Cursor objects
+    #
+    def _execute(self, cmd, args=None, binary=None, stream=False, timeout=None):
+        if self._pipeline:
+            raise InterfaceError("Can't execute commands while a pipeline has commands queued")
+        self.__finish_stream()
+        request = self._request(cmd, args, binary)
+        if timeout is None:
+            self.__send(request.data)
+            return self._response(request, stream=stream)
+
+        #
+        # Cancel the command if the response (the first
+        # rows of a streaming one) doesn't come in time
+        #
+        self.__deadline = _clock() + timeout
+        self.__canceled = False
+        try:
+            self.__send(request.data)
+            result = self._response(request, stream=stream)
+        finally:
+            self.__deadline = None
+        if self.__canceled:
+            _query_timeout(result, timeout)
+        return result
+
+
+    def _response(self, request, retry=True, stream=False):
+        #
+        # Read the backend's response to a request that was sent, up
+        # to its ReadyForQuery message, and return the first result.
+        # If stream is true, stop at the first row of a result set
+        # instead, and leave the rest for _stream_rows() to read (or
+        # at the start of COPY data, for _copy_out()).
+        #
+        result = self._start_response(request)
+        if stream:
+            while not (self._ready or result.rows or result.copy_out
+                       or (result.completed is not None) or result.error):
+                self.__read_response()
+            if (result.rows or result.copy_out) and not self._ready:
+                result.query = request.query
+                if result.rows:
+                    result.rows = deque(result.rows)
+                result.streaming = True
+                self.__streaming = request
+                return result
+
+        while not self._ready:
+            self.__read_response()
+        result, request = self._response_done(request, retry)
+        if request is not None:
+            self.__send(request.data)
+            return self._response(request)
+        return result
+
+
+    def __finish_stream(self):
+        #
+        # Read the rest of a streaming result into memory, so
+        # the connection can be used for something else
+        #
+        if self.__streaming is not None:
+            while not self._ready:
+                self.__read_response()
+            self._response_done(self.__streaming, False)
+            self.__streaming = None
+
+
+    def _stream_rows(self, result, n=None):
+        #
+        # Return up to n of the rows of a streaming result (all of the
+        # rest if n is None), reading more from the backend if they
+        # haven't arrived yet.  The rows are removed from the result
+        # to save memory.
+        #
+        rows = result.rows
+        while result.streaming and ((n is None) or (len(rows) < n)):
+            self.__read_response()
+            if self._ready:
+                self.__finish_stream()
+
+        if result.error and ((n is None) or not rows):
+            raise result.error
+
+        if (n is None) or (n >= len(rows)):
+            batch = list(rows)
+            rows.clear()
+        else:
+            batch = [rows.popleft() for i in range(n)]
+        return batch
+
+
+    def _close_stream(self, result):
+        #
+        # Skip the rest of a streaming result nobody wants
+        #
+        while result.streaming:
+            self.__read_response()
+            result.rows.clear()
+            if self._ready:
+                self.__finish_stream()
+
+
+    def _copy(self, cmd, source=None, sink=None, size=COPY_SIZE):
+        #
+        # Execute a COPY command, sending the chunks of data generated
+        # by source for COPY FROM STDIN, or passing chunks of about size
+        # bytes to the sink callable for COPY TO STDOUT.
+        #
+        self._start_copy(source, sink, size)
+        complete = False
+        try:
+            result = self._execute(cmd, None, False)
+            complete = True
+        finally:
+            error = self._end_copy(complete)
+
+        if error is not None:
+            raise error
+        return result
+
+
+    def _copy_out(self, cmd, done):
+        #
+        # Generator executing a COPY TO STDOUT command, that yields the
+        # data in chunks as it's read from the backend, rather than
+        # reading it all at once.  The result is appended to the done
+        # list at the end.
+        #
+        if self._pipeline:
+            raise InterfaceError("Can't execute commands while a pipeline has commands queued")
+        self.__finish_stream()
+        request = self._request(cmd, None, False)
+        self.__send(request.data)
+        self._copy_pull = request
+        try:
+            result = self._response(request, stream=True)
+            buf = self._input_buffer
+            chunks = []
+            finished = not result.streaming
+            while not finished:
+                nbytes, other = buf.copy_data(chunks)
+                if chunks:
+                    data = b''.join(chunks)
+                    del chunks[:]
+                    yield data
+                if other:
+                    if self.__streaming is request:
+                        self.__finish_stream()
+                    finished = True
+                elif self.__streaming is not request:
+                    raise InterfaceError('COPY data was skipped because the connection was used for another command')
+                else:
+                    self.__fill(COPY_SIZE)
+            if result.error:
+                raise result.error
+            done.append(result)
+        finally:
+            if self.__streaming is request:
+                # given up on, skip the rest of the data
+                self.__finish_stream()
+            if self._copy_pull is request:
+                self._copy_pull = None
+
+
+    def _send_pipelined(self, data):
+        #
+        # Send a lot of data to the backend, reading responses
+        # into the input buffer as they come so neither side
+        # blocks with a full socket buffer.  Waiting for the backend
+        # is bounded by the socket's timeout and the deadline of a
+        # command with a timeout, and if either passes the connection
+        # is closed, since it's stuck part way through a message.
+        #
+        if self.__socket is None:
+            raise InterfaceError('Connection not open')
+        self.__finish_stream()
+        self.__flush()
+
+        sock = self.__socket
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            data = memoryview(data)
+            while data:
+                try:
+                    nSent = sock.send(data)
+                except socket.error as serr:
+                    if serr.args[0] not in (errno.EINTR, errno.EAGAIN, errno.EWOULDBLOCK):
+                        raise
+                    # socket buffer full, the backend may be waiting
+                    # for us to read what it sent before it reads more
+                    wait = timeout
+                    if self.__deadline is not None:
+                        wait = max(self.__deadline - _clock(), 0)
+                        if timeout is not None:
+                            wait = min(wait, timeout)
+                    readable, writable = _wait_socket(sock, wait)
+                    if readable:
+                        self.__fill(0)
+                    elif not writable:
+                        self.__socket = None
+                        sock.close()
+                        if self.__deadline is not None:
+                            raise QueryTimeout('Command ran over its timeout while sending, connection closed')
+                        raise OperationalError('Timed out sending to the backend, connection closed')
+                    continue
+                data = data[nSent:]
+        finally:
+            if self.__socket is sock:
+                sock.settimeout(timeout)
+
+
+    #--------------------------------------
+    # Public methods
+    #
+
+    def close(self):
+        """
+        Close the connection now (rather than whenever __del__ is
+        called).  The connection will be unusable from this point
+        forward; an Error (or subclass) exception will be raised
+        if any operation is attempted with the connection. The
+        same applies to all cursor objects trying to use the
+        connection.
+
+        """
+        if self.__socket is None:
+            raise InterfaceError("Can't close connection that's not open")
+        self.__del__()
+
+
+    def cancel(self):
+        """
+        Ask the server to cancel the command the connection is
+        executing, if any, which then fails with an OperationalError
+        (SQLSTATE 57014).  The request goes over a separate connection,
+        so this can be called from another thread.  Raises
+        OperationalError if the request can't be sent.
+
+        """
+        if (self.__socket is None) or (self.__cancel_address is None):
+            raise InterfaceError('Connection not open')
+        _send_cancel(self.__cancel_address, self._cancel_message(), self.__cancel_timeout)
+
+
+    def commit(self):
+        """
+        Commit any pending transaction to the database.
+
+        """
+        self._execute('COMMIT')
+
+
+    def fileno(self):
+        """
+        Return the file descriptor of the socket to the server,
+        for waiting on with select() or the selectors module.
+
+        """
+        if self.__socket is None:
+            raise InterfaceError('Connection not open')
+        return self.__socket.fileno()
+
+
+    def cursor(self, binary=None, stream=False, name=None, timeout=None):
+        """
+        Get a new cursor object using this connection.  If binary is
+        True or False, the cursor asks for results in binary or text
+        format regardless of the connection's .binary setting.  If
+        stream is True, the cursor reads rows from the server as
+        they're fetched instead of all at once.  If name is given,
+        the cursor executes queries by declaring a server-side cursor
+        of that name and fetches rows from it in batches.  timeout is
+        the default number of seconds the cursor's commands may run
+        before they're canceled.
+
+        """
+        return Cursor(self, binary, stream, name, timeout)
+
+
+    def funcall(self, oid, *args):
+        """
+        Low-level call to PostgreSQL function, you must supply
+        the oid of the function, and have the args supplied as
+        ints or strings.
+
+        """
+        self.__finish_stream()
+        self._function_call(oid, args)
+        self.__flush()
+        while not self._ready:
+            self.__read_response()
+        return self._function_result()
+
+
+    def lo_create(self, mode=INV_READ|INV_WRITE):
+        """
+        Return the oid of a new Large Object, created with the specified mode
+
+        """
+        if not self.__lo_funcs:
+            self.__lo_init()
+        r = self.funcall(self.__lo_funcs['lo_creat'], mode)
+        return _unpack('!i', r)[0]
+
+
+    def lo_open(self, oid, mode=INV_READ|INV_WRITE):
+        """
+        Open the Large Object with the specified oid, returns
+        a file-like object
+
+        """
+        if not self.__lo_funcs:
+            self.__lo_init()
+        r = self.funcall(self.__lo_funcs['lo_open'], oid, mode)
+        fd = _unpack('!i', r)[0]
+        lobj =  _LargeObject(self, fd)
+        lobj.seek(0, SEEK_SET)
+        return lobj
+
+
+    def lo_unlink(self, oid):
+        """
+        Delete the specified Large Object
+
+        """
+        if not self.__lo_funcs:
+            self.__lo_init()
+        self.funcall(self.__lo_funcs['lo_unlink'], oid)
+
+
+    def pipeline(self, binary=None):
+        """
+        Get a new Pipeline object for queueing up commands and sending
+        them all to the server at once, best used in a 'with' statement.
+        No other commands can be executed on the connection while
+        the pipeline has commands queued.  If binary is True or False, the
+        pipeline's cursors ask for results in binary or text format
+        regardless of the connection's .binary setting.
+
+        """
+        if self._pipeline:
+            raise InterfaceError('Connection already has a pipeline with commands queued')
+        self._pipeline = Pipeline(self, binary)
+        return self._pipeline
+
+
+    def rollback(self):
+        """
+        Cause the the database to roll back to the start of any
+        pending transaction.
+
+        """
+        self._execute('ROLLBACK')
+
+
+    def wait_for_notify(self, timeout=-1):
+        """
+        Wait for an async notification from the backend, which comes
+        when another client executes the SQL command:
+
+           NOTIFY name
+
+        where 'name' is an arbitrary string. timeout is specified in
+        floating- point seconds, -1 means no timeout, 0 means timeout
+        immediately if nothing is available.
+
+        In practice though the timeout is a timeout to wait for the
+        beginning of a message from the backend. Once a message has
+        begun, the client will wait for the entire message to finish no
+        matter how long it takes.
+
+        Return value is a tuple: (name, pid) where 'name' string
+        specified in the NOTIFY command, and 'pid' is the pid of the
+        backend process that processed the command.
+
+        Raises a PostgreSQL_Timeout exception on timeout
+
+        """
+        self.__finish_stream()
+        while True:
+            result = self._notification()
+            if result is not None:
+                return result
+            if self.__wait_response(timeout):
+                self.__read_response()
+            else:
+                raise PostgreSQL_Timeout()
+
+#
+# DB API 2.0 extension:
+#   All exception classes defined by the DB API standard should be
+#   exposed on the Connection objects as attributes (in addition
+#   to being available at module scope).
+#
+#   These attributes simplify error handling in multi-connection
+#   environments.
+
+Connection.Error = Error
+Connection.Warning = Warning
+Connection.InterfaceError = InterfaceError
+Connection.DatabaseError = DatabaseError
+Connection.InternalError = InternalError
+Connection.OperationalError = OperationalError
+Connection.ProgrammingError = ProgrammingError
+Connection.IntegrityError = IntegrityError
+Connection.DataError = DataError
+Connection.NotSupportedError = NotSupportedError
+
+
+class Cursor(object):
+    """
+    Cursor objects are created by calling a connection's cursor() method,
+    and are used to manage the context of a fetch operation.
+
+    Cursors created from the same connection are not isolated, i.e., any changes
+    done to the database by a cursor are immediately visible by the
+    other cursors.
+
+    Cursors created from different connections are isolated.
+
+    """
+    def __init__(self, conn, binary=None, stream=False, name=None, timeout=None):
+        """
+        Create a cursor from a given bpgsql Connection object.
+
+        """
+        self.arraysize = 1
+        self.binary = binary
+        self.stream = stream
+        self.name = name
+        self.timeout = timeout
+        self.itersize = 1
+        self.max_prefetch_bytes = _PREFETCH_BYTES
+        self.connection = conn
+        self.description = None
+        self.lastrowid = None
+        self.messages = []
+        self.rowcount = -1
+        self.rownumber = None
+        self.__rows = None
+        self.__stream = None
+        self.__declared = None
+        self.__buffer = None
+        self.__exhausted = False
+        self.__rtt = None
+        self.query = ''
+
+
+    def __iter__(self):
+        """
+        Return an iterator for the result set this cursor holds.
+
+        """
+        return self
+
+
+    def close(self):
+        """
+        Close the cursor now (rather than whenever __del__ is
+        called).  The cursor will be unusable from this point
+        forward; an Error (or subclass) exception will be raised
+        if any operation is attempted with the cursor.
+
+        """
+        self.__close_stream()
+        self.__close_declared()
+        self.__init__(None)
+
+
+    def __close_stream(self):
+        #
+        # Skip any rows of a streaming result that haven't been fetched
+        #
+        if self.__stream is not None:
+            self.connection._close_stream(self.__stream)
+            self.__stream = None
+
+
+    def __close_declared(self):
+        #
+        # Close the server-side cursor if it's still there, which
+        # isn't the case once the transaction it was declared
+        # in (without hold) is over.
+        #
+        if self.__declared is not None:
+            hold, serial = self.__declared
+            self.__declared = None
+            status, current = self.connection._transaction()
+            if (hold or (current == serial)) and (status != b'E'):
+                result = self.connection._execute('CLOSE ' + self.__quoted_name(), None, False)
+                if result.error:
+                    raise result.error
+
+
+    def __declare(self, cmd, args, timeout):
+        #
+        # Declare a server-side cursor for a query and fetch the first
+        # batch of rows.  Outside a transaction block the cursor has to
+        # be declared WITH HOLD to outlive the command's implicit
+        # transaction.
+        #
+        if isinstance(cmd, bytes) and bytes is not str:
+            cmd = cmd.decode('utf-8')
+
+        conn = self.connection
+        status, serial = conn._transaction()
+        hold = (status == b'I')
+        declare = 'DECLARE %s NO SCROLL CURSOR %sFOR ' % (self.__quoted_name(), hold and 'WITH HOLD ' or '')
+        if args is not None:
+            declare = declare.replace('%', '%%')
+
+        self._set_result(conn._execute(declare + cmd, args, False, timeout=timeout))
+
+        self.__rtt = None
+        self.__declared = (hold, serial)
+        self.__buffer = deque()
+        self.__exhausted = False
+        self.itersize = max(self.arraysize, 1)
+        self.rowcount = -1
+        self.rownumber = 0
+        self.__fetch_batch()
+
+
+    def __fetch_batch(self):
+        #
+        # Fetch the next batch of rows from the server-side cursor, and
+        # size the following batch from how long this one took
+        # and how wide the rows are.  The first FETCH, of a batch of
+        # arraysize rows, is taken as the round-trip time - not the
+        # DECLARE, which runs the whole query if it's WITH HOLD.
+        #
+        conn = self.connection
+        n = self.itersize
+        received = conn._bytes_received()
+        start = _clock()
+        result = conn._execute('FETCH FORWARD %d FROM %s' % (n, self.__quoted_name()), None, False, timeout=self.timeout)
+        elapsed = _clock() - start
+        if result.error:
+            raise result.error
+
+        self.description = result.description
+        self.messages = result.messages
+        rows = result.rows
+        self.__buffer.extend(rows)
+
+        if len(rows) < n:
+            self.__exhausted = True
+            self.rowcount = self.rownumber + len(self.__buffer)
+            self.__close_declared()
+            return
+
+        if self.__rtt is None:
+            self.__rtt = elapsed
+
+        width = max(conn._bytes_received() - received, 1) / float(n)
+        per_row = max(elapsed - self.__rtt, 0.0) / n
+        itersize = min(self.max_prefetch_bytes / width, n * _PREFETCH_GROWTH)
+        if per_row:
+            itersize = min(itersize, self.__rtt * _PREFETCH_RTT_RATIO / per_row)
+        self.itersize = max(int(itersize), self.arraysize, 1)
+
+
+    def __fetch_declared(self, size):
+        #
+        # Fetch rows from the server-side cursor, None meaning all
+        # that are left.
+        #
+        buf = self.__buffer
+        while ((size is None) or (len(buf) < size)) and not self.__exhausted:
+            self.__fetch_batch()
+
+        if (size is None) or (size >= len(buf)):
+            rows = list(buf)
+            buf.clear()
+        else:
+            rows = [buf.popleft() for i in range(size)]
+        self.rownumber += len(rows)
+        return rows
+
+
+    def __quoted_name(self):
+        return '"%s"' % self.name.replace('"', '""')
+
+
+    def __fetch_stream(self, size):
+        #
+        # Fetch rows from a streaming result, the rowcount
+        # is known once they've all been read.
+        #
+        result = self.__stream
+        rows = self.connection._stream_rows(result, size)
+        self.rownumber += len(rows)
+        if not result.streaming:
+            self.__set_rowcount(result)
+        return rows
+
+
+    def copy_from(self, source, table, columns=None, format='text', size=COPY_SIZE):
+        """
+        Copy data into a table with COPY FROM STDIN.  source is a
+        file-like object to read() from, or an iterable of strings,
+        holding data in the given format ('text', 'csv' or 'binary').
+        The data is sent in chunks of about size bytes.  columns is an
+        optional list of the table's columns the data is for.  The
+        number of rows copied is available in .rowcount afterwards.
+
+        """
+        cmd = 'COPY %s%s FROM STDIN%s' % (table, _copy_columns(columns), _copy_format(format))
+        self.__copy(cmd, _copy_chunks(source, size), None, size)
+
+
+    def copy_records(self, table, columns, records, size=COPY_SIZE):
+        """
+        Copy Python records (sequences of values, such as tuples) into
+        a table with a binary COPY FROM STDIN, encoding each value
+        according to the type of its column.  columns is a list of the
+        column names the values are for, or None for all of the table's
+        columns.  The data is sent in chunks of about size bytes.  The
+        number of rows copied is available in .rowcount afterwards.
+
+        """
+        self.__close_stream()
+        self.__close_declared()
+        self.__buffer = None
+
+        conn = self.connection
+        result = conn._execute('SELECT %s FROM %s LIMIT 0' % (columns and ', '.join(columns) or '*', table), None, False)
+        if result.error:
+            raise result.error
+
+        encoders = conn._record_encoders(result)
+        cmd = 'COPY %s%s FROM STDIN%s' % (table, _copy_columns(columns), _copy_format('binary'))
+        self.__copy(cmd, _copy_binary_chunks(records, encoders, size), None, size)
+
+
+    def copy_records_out(self, table, columns=None):
+        """
+        Return an iterator over the rows of a table (or a query in
+        parentheses) as tuples, read with a binary COPY TO STDOUT and
+        decoded according to the types of the columns.  Rows are read
+        from the server as the iterator is advanced.  columns is an
+        optional list of column names.  The number of rows copied is
+        available in .rowcount once the iterator is exhausted.
+
+        """
+        self.__close_stream()
+        self.__close_declared()
+        self.__buffer = None
+
+        conn = self.connection
+        result = conn._execute('SELECT %s FROM %s AS copy_records_out LIMIT 0' % (columns and ', '.join(columns) or '*', table), None, False)
+        if result.error:
+            raise result.error
+
+        decoders = conn._record_decoders(result)
+        cmd = 'COPY %s%s TO STDOUT%s' % (table, _copy_columns(columns), _copy_format('binary'))
+        return self.__copy_records_out(cmd, decoders)
+
+
+    def __copy_records_out(self, cmd, decoders):
+        done = []
+        for row in _copy_binary_records(self.connection._copy_out(cmd, done), decoders):
+            yield row
+        if done:
+            self._set_result(done[0])
+
+
+    def copy_to(self, dest, table, columns=None, format='text', size=COPY_SIZE):
+        """
+        Copy data out of a table with COPY TO STDOUT, in the given
+        format ('text', 'csv' or 'binary').  table can also be a query
+        in parentheses.  dest is a file-like object to write() to, or
+        a callable, which is given byte strings of about size bytes
+        (text files are given unicode strings).  The number of rows
+        copied is available in .rowcount afterwards.
+
+        """
+        sink = getattr(dest, 'write', dest)
+        if isinstance(dest, io.TextIOBase):
+            write = sink
+            sink = lambda data: write(data.decode('utf-8'))
+        cmd = 'COPY %s%s TO STDOUT%s' % (table, _copy_columns(columns), _copy_format(format))
+        self.__copy(cmd, None, sink, size)
+
+
+    def __copy(self, cmd, source, sink, size):
+        self.__close_stream()
+        self.__close_declared()
+        self.__buffer = None
+        self._set_result(self.connection._copy(cmd, source, sink, size))
+
+
+    def execute(self, cmd, args=None, timeout=None):
+        """
+        Execute a database operation (query or command).
+        Parameters may be provided as sequence or
+        mapping or singleton argument and will be bound to variables
+        in the operation. Variables are specified in format (...WHERE foo=%s...)
+        or pyformat (...WHERE foo=%(name)s...) paramstyles.
+
+        If the command runs longer than timeout seconds (the cursor's
+        .timeout if None), it's canceled and QueryTimeout raised.
+
+        """
+        if timeout is None:
+            timeout = self.timeout
+        self.__close_stream()
+        self.__close_declared()
+        self.__buffer = None
+        if self.name is not None:
+            self.__declare(cmd, args, timeout)
+        else:
+            self._set_result(self.connection._execute(cmd, args, self.binary, self.stream, timeout))
+
+
+    def _set_result(self, result):
+        #
+        # Take on the result of executing a command, raising the
+        # error if it failed.
+        #
+        self.rowcount = -1
+        self.rownumber = None
+        self.description = None
+        self.lastrowid = None
+        self.__rows = None
+        self.__stream = None
+        self.messages = []
+
+        if result.error:
+            raise result.error
+
+        self.description = result.description
+        self.messages = result.messages
+        self.query = result.query
+
+        if result.streaming:
+            # rowcount isn't known until all the rows are read
+            self.__stream = result
+            self.rownumber = 0
+            return
+
+        self.__rows = result.rows
+        self.__set_rowcount(result)
+
+
+    def __set_rowcount(self, result):
+        #
+        # Figure the rowcount and lastrowid from the command
+        # completion tag, or the rows of a result set
+        #
+        self.rowcount, self.lastrowid = result.counts()
+        if self.__rows is not None:
+            self.rowcount = len(self.__rows)
+            self.rownumber = 0
+
+
+    def executemany(self, cmd,  seq_of_parameters, page_size=EXECUTEMANY_PAGE_SIZE, method='values', timeout=None):
+        """
+        Execute a database operation (query or command) against
+        all parameter sequences or mappings found in the
+        sequence seq_of_parameters.
+
+        'INSERT ... VALUES (...)' commands are executed for up to
+        page_size parameter sets at a time, by repeating the row
+        of values, and .rowcount is the total number of rows
+        inserted.  Other commands are executed once for each
+        parameter set.
+
+        With method='copy', a plain 'INSERT INTO table (columns)
+        VALUES (%s, ...)' command is turned into a single COPY FROM
+        STDIN, with the parameter sets sent as rows of text.
+
+        timeout applies to each of the commands executed, as
+        for execute().
+
+        """
+        if method not in ('values', 'copy'):
+            raise ProgrammingError('Unknown executemany method: %r' % (method,))
+
+        params = iter(seq_of_parameters)
+        try:
+            first = next(params)
+        except StopIteration:
+            self.rowcount = -1
+            return
+        params = chain([first], params)
+
+        if isinstance(cmd, bytes) and bytes is not str:
+            cmd = cmd.decode('utf-8')
+        if method == 'copy':
+            self.__copy_many(cmd, params, isinstance(first, dict))
+            return
+
+        pages = _executemany_pages(cmd, params, isinstance(first, dict), page_size)
+        if pages is None:
+            for p in params:
+                self.execute(cmd, p, timeout)
+
+            # Don't want to leave the value of the last execute() call
+            self.rowcount = -1
+            return
+
+        total = 0
+        for page_cmd, args in pages:
+            self.execute(page_cmd, args, timeout)
+            total += self.rowcount
+        self.rowcount = total
+
+
+    def __copy_many(self, cmd, params, named):
+        copy_cmd, keys = _executemany_copy(cmd, named)
+        chunks = _copy_text_chunks(params, keys, self.connection._copy_text_value, COPY_SIZE)
+        self.__copy(copy_cmd, chunks, None, COPY_SIZE)
+
+
+    def fetchall(self):
+        """
+        Fetch all remaining rows of a query set, as a list of lists.
+        An empty list is returned if no more rows are available.
+        An Error is raised if no result set exists
+
+        """
+        if self.__stream is not None:
+            return self.__fetch_stream(None)
+
+        if self.__buffer is not None:
+            return self.__fetch_declared(None)
+
+        if self.__rows is None:
+            raise Error('No result set available')
+
+        return self.fetchmany(self.rowcount - self.rownumber)
+
+
+    def fetchone(self):
+        """
+        Fetch the next row of the result set as a list of fields, or None if
+        no more are available.  Will raise an Error if no
+        result set exists.
+
+        """
+        try:
+            return next(self)
+        except StopIteration:
+            return None
+
+
+    def fetchmany(self, size=None):
+        """
+        Fetch all the specified number of rows of a query set, as a list of lists.
+        If no size is specified, then the cursor's .arraysize property is used.
+        An empty list is returned if no more rows are available.
+        An Error is raised if no result set exists
+
+        """
+        if size is None:
+            size = self.arraysize
+
+        if self.__stream is not None:
+            return self.__fetch_stream(size)
+
+        if self.__buffer is not None:
+            return self.__fetch_declared(size)
+
+        if self.__rows is None:
+            raise Error('No result set available')
+
+        n = self.rownumber
+        self.rownumber += size
+        return self.__rows[n:self.rownumber]
+
+
+    def __next__(self):
+        """
+        Return the next row of a result set.  Raises StopIteration
+        if no more rows are available.  Raises an Error if no result set
+        exists.
+
+        """
+        if self.__stream is not None:
+            rows = self.__fetch_stream(1)
+        elif self.__buffer is not None:
+            rows = self.__fetch_declared(1)
+        else:
+            rows = None
+
+        if rows is not None:
+            if not rows:
+                raise StopIteration
+            return rows[0]
+
+        if self.__rows is None:
+            raise Error('No result set available')
+
+        n = self.rownumber
+        if n >= self.rowcount:
+            raise StopIteration
+
+        self.rownumber += 1
+        return self.__rows[n]
+    next = __next__
+
+
+    def scroll(self, n, mode='relative'):
+        """
+        Scroll the cursor in the result set to a new position according
+        to mode.
+
+        If mode is 'relative' (default), value is taken as offset to
+        the current position in the result set, if set to 'absolute',
+        value states an absolute target position.
+
+        An IndexError will be raised in case a scroll operation would
+        leave the result set. In this case, the cursor position unchanged.
+
+        Streaming and named cursors can't scroll.
+
+        """
+        if (self.__stream is not None) or (self.__buffer is not None):
+            raise NotSupportedError("Streaming and named cursors can't scroll")
+
+        if self.__rows is None:
+            raise Error('No result set available')
+
+        if mode == 'relative':
+            newpos = self.rownumber + n
+        elif mode == 'absolute':
+            newpos = n
+        else:
+            raise ProgrammingError('Unknown scroll mode [%s]' % mode)
+
+        if (newpos < 0) or (newpos >= self.rowcount):
+            raise IndexError('scroll(%d, "%s") target position: %d outsize of range: 0..%d' % (n, mode, newpos, self.rowcount-1))
+
+        self.rownumber = newpos
+
+
+    def setinputsizes(self, sizes):
+        """
+        Intented to be used before a call to execute() or executemany() to
+        predefine memory areas for the operation's parameters.
+
+        Doesn't actually do anything in this client.
+
+        """
+        pass
+
+
+    def setoutputsize(self, size, column=None):
+        """
+        Set a column buffer size for fetches of large columns
+        (e.g. LONGs, BLOBs, etc.).
+
+        Doesn't actually do anything in this client.
+
+        """
+        pass
+
+
+class Pipeline(object):
+    """
+    Pipeline objects are created by calling a connection's pipeline()
+    method.  Commands executed through a pipeline are queued up and
+    sent to the server together when the pipeline is synced, saving
+    a round-trip to the server for each one.
+
+    Each command is followed by its own Sync message, so an error in
+    one command doesn't stop the ones after it from running (unless
+    they're in the same transaction block, which the error aborts).
+
+    """
+    def __init__(self, conn, binary=None):
+        self.binary = binary
+        self.connection = conn
+        self.__queue = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.sync()
+        else:
+            self.discard()
+
+
+    def __len__(self):
+        return len(self.__queue)
+
+
+    def discard(self):
+        """
+        Throw away the queued commands without sending them.
+
+        """
+        queue, self.__queue = self.__queue, []
+        for cursor, request in reversed(queue):
+            self.connection._discard(request)
+
+
+    def execute(self, cmd, args=None):
+        """
+        Queue a database operation (query or command) with optional
+        parameters, as for a cursor's execute() method.  Returns a
+        new cursor that holds the command's results once the pipeline
+        has been synced.
+
+        """
+        cursor = self.connection.cursor(self.binary)
+        request = self.connection._request(cmd, args, self.binary)
+        self.__queue.append((cursor, request))
+        return cursor
+
+
+    def executemany(self, cmd, seq_of_parameters):
+        """
+        Queue a database operation once for each of the parameter
+        sequences or mappings in seq_of_parameters, returning
+        a list of cursors.
+
+        """
+        return [self.execute(cmd, p) for p in seq_of_parameters]
+
+
+    def sync(self):
+        """
+        Send all the queued commands to the server in one go and read
+        the responses into their cursors.  If any commands failed,
+        the first error is raised after all the responses are read,
+        and the cursors of the failed commands have no result set.
+
+        """
+        queue, self.__queue = self.__queue, []
+        if not queue:
+            return
+
+        conn = self.connection
+        conn._send_pipelined(b''.join([request.data for cursor, request in queue]))
+
+        error = None
+        for cursor, request in queue:
+            result = conn._response(request, False)
+            try:
+                cursor._set_result(result)
+            except Error as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
+
+def connect(dsn=None, username='', password='',
+            host=None, dbname='', port='', opt='', statement_cache_size=100, **extra):
+    """
+    Connect to a PostgreSQL database.
+
+    The dsn, if used, is in the format used by the PostgreSQL libpq C library, which is one
+    or more "keyword=value" pairs separated by spaces.  Values that are single-quoted may
+    contain spaces.  Spaces around the '=' chars are ignored.  Recognized keywords are:
+
+          host, port, dbname, user, password, options
+
+    and these for tuning the socket, which can also be passed as keyword
+    arguments (the dsn takes precedence):
+
+          tcp_nodelay, keepalives, keepalives_idle, keepalives_interval,
+          keepalives_count, rcvbuf, sndbuf
+
+    The host and port may be comma-separated lists (a single port goes with
+    every host), and the servers are tried in order until one takes the
+    connection and suits target_session_attrs.  These can also be passed as
+    keyword arguments:
+
+          connect_timeout       seconds to wait for each server to take the
+                                connection and log in (default: no limit)
+          target_session_attrs  any (the default), read-write, read-only,
+                                primary, standby or prefer-standby
+
+    For example:
+
+          cnx = bpgsql.connect("host=127.0.0.1 dbname=mydb user=jake")
+          cnx = bpgsql.connect("host=db1,db2 dbname=mydb connect_timeout=2 "
+                               "target_session_attrs=read-write")
+
+    Commands executed with parameters are prepared on the server and
+    reused, statement_cache_size sets how many are kept per connection
+    (0 disables this).
+
+    """
+    return Connection(dsn, username, password, host, dbname, port, opt,
+                      statement_cache_size, **extra)
+
+# ---- EOF ----
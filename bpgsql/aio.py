@@ -0,0 +1,1559 @@
+"""
+asyncio support for bpgsql, Python 3 only.
+
+AsyncConnection drives the same protocol handling as the blocking
+Connection, over an asyncio transport, so many connections can be
+serviced by a single event loop thread:
+
+    cnx = await bpgsql.aio.connect('host=127.0.0.1 dbname=mydb')
+    cur = cnx.cursor()
+    await cur.execute('SELECT * FROM foo WHERE bar = %s', (1,))
+    async for row in cur:
+        ...
+
+"""
+# Copyright (C) 2001-2008 Barry Pederson <bp@barryp.org>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+
+import asyncio
+import inspect
+import io
+import socket
+from collections import deque
+from contextlib import asynccontextmanager
+from itertools import chain
+
+import bpgsql
+from bpgsql import COPY_SIZE, EXECUTEMANY_PAGE_SIZE, MAX_RECV_SIZE, RECV_SIZE
+from bpgsql import DatabaseError, Error, InterfaceError, NotSupportedError, \
+    OperationalError, PostgreSQL_Timeout, ProgrammingError, Protocol, QueryTimeout
+from bpgsql import _BinaryRecordParser, _CANCEL_TIMEOUT, _CONNECT_STAGGER, \
+    _SESSION_STATE_QUERY, _configure_socket, _connect_args, _connect_targets, \
+    _connect_timeout, _copy_binary_chunks, _copy_chunks, _copy_columns, \
+    _copy_format, _copy_text_chunks, _dns_cache, _encode, _executemany_copy, \
+    _executemany_pages, _message, _query_timeout, _resolve, _session_matches, \
+    _session_passes
+from bpgsql.pool import PoolClosed, PoolTimeout, _DEALLOCATES, _PooledConnection, _clock
+
+
+class _StreamProtocol(asyncio.BufferedProtocol):
+    """
+    asyncio protocol receiving data from the backend straight into a
+    connection's input buffer, sizing the room made for each receive
+    the way Connection does.  Reading is paused while a good amount of
+    data is waiting and nobody is waiting for more.
+
+    """
+    def __init__(self, buf):
+        self.buffer = buf
+        self.transport = None
+        self.error = None                   # set once the connection is lost
+        self.__recv_size = RECV_SIZE
+        self.__paused = False
+        self.__waiters = []
+        self.__drain = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def get_buffer(self, sizehint):
+        return self.buffer.room(max(sizehint, self.__recv_size))
+
+    def buffer_updated(self, nbytes):
+        self.buffer.filled(nbytes)
+        size = self.__recv_size
+        if nbytes >= size:
+            self.__recv_size = min(2 * size, MAX_RECV_SIZE)
+        elif nbytes < size // 8:
+            self.__recv_size = max(size // 2, RECV_SIZE)
+
+        if self.__waiters:
+            self.__wake()
+        elif (len(self.buffer) >= MAX_RECV_SIZE) and not self.__paused:
+            self.__paused = True
+            self.transport.pause_reading()
+
+    def eof_received(self):
+        self.error = OperationalError('Connection to backend closed')
+        self.__wake()
+
+    def connection_lost(self, exc):
+        if self.error is None:
+            self.error = OperationalError('Connection to backend closed: %s' % exc
+                                          if exc else 'Connection to backend closed')
+        self.__wake()
+        drain, self.__drain = self.__drain, None
+        if (drain is not None) and not drain.done():
+            drain.set_result(None)
+
+    def pause_writing(self):
+        if self.__drain is None:
+            self.__drain = asyncio.get_event_loop().create_future()
+
+    def resume_writing(self):
+        drain, self.__drain = self.__drain, None
+        if (drain is not None) and not drain.done():
+            drain.set_result(None)
+
+    def __wake(self):
+        waiters, self.__waiters = self.__waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        #
+        # Wait for the transport to take more data to send
+        #
+        if self.__drain is not None:
+            await asyncio.shield(self.__drain)
+        if self.error is not None:
+            raise self.error
+
+    async def wait(self, timeout=None):
+        #
+        # Wait for more data to be received, timeout is a
+        # floating-point number of seconds, or None to wait
+        # indefinitely.  Returns False if it timed out.
+        #
+        if self.error is not None:
+            raise self.error
+        if self.__paused:
+            self.__paused = False
+            self.transport.resume_reading()
+        waiter = asyncio.get_event_loop().create_future()
+        self.__waiters.append(waiter)
+        try:
+            if timeout is None:
+                await waiter
+            else:
+                await asyncio.wait_for(waiter, max(timeout, 0))
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self.__waiters:
+                self.__waiters.remove(waiter)
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+async def _copy_chunks_async(source, size):
+    """
+    Generate the data for a COPY FROM STDIN in chunks of about size
+    bytes, from a file-like object whose read() may be a coroutine,
+    or an asynchronous iterable of strings.
+
+    """
+    read = getattr(source, 'read', None)
+    if read is not None:
+        while True:
+            data = read(size)
+            if inspect.isawaitable(data):
+                data = await data
+            if not data:
+                return
+            yield _encode(data)
+
+    pending = []
+    pending_size = 0
+    async for data in source:
+        data = _encode(data)
+        pending.append(data)
+        pending_size += len(data)
+        if pending_size >= size:
+            yield b''.join(pending)
+            pending = []
+            pending_size = 0
+    if pending:
+        yield b''.join(pending)
+
+
+async def _connect_attempt(family, address, args, timeout):
+    loop = asyncio.get_event_loop()
+    s = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        _configure_socket(s, args, family != getattr(socket, 'AF_UNIX', None))
+        s.setblocking(False)
+        await asyncio.wait_for(loop.sock_connect(s, address), timeout)
+    except:
+        s.close()
+        raise
+    return s
+
+
+async def _connect_socket(targets, args, timeout, errors):
+    """
+    Connect a socket to the first of the (host, port) targets that
+    answers, starting attempts _CONNECT_STAGGER seconds apart, the
+    same way as bpgsql._connect_socket().  Names not resolved lately
+    are looked up in the loop's default executor.
+
+    """
+    loop = asyncio.get_event_loop()
+    addresses = []
+    for host, port in targets:
+        cached = _dns_cache.get((host, port))
+        try:
+            if host.startswith('/') or (cached and (cached[0] > _clock())):
+                found = _resolve(host, port)
+            else:
+                found = await loop.run_in_executor(None, _resolve, host, port)
+        except OperationalError as e:
+            errors.append(str(e))
+            continue
+        addresses.extend([((host, port), family, address) for family, address in found])
+    addresses.reverse()
+
+    pending = {}    # task -> target
+    try:
+        while addresses or pending:
+            if addresses:
+                target, family, address = addresses.pop()
+                task = asyncio.ensure_future(_connect_attempt(family, address, args, timeout))
+                pending[task] = target
+
+            done, running = await asyncio.wait(list(pending),
+                timeout=(addresses and _CONNECT_STAGGER) or None,
+                return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            for task in done:
+                target = pending.pop(task)
+                try:
+                    s = task.result()
+                except asyncio.TimeoutError:
+                    errors.append('%s: timed out' % target[0])
+                except OSError as e:
+                    _dns_cache.pop(target, None)
+                    errors.append('%s: %s' % (target[0], e.strerror or e))
+                else:
+                    if winner is None:
+                        winner = s, target
+                    else:
+                        s.close()
+            if winner is not None:
+                return winner
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise OperationalError("Couldn't connect to server: %s" % '; '.join(errors))
+
+
+async def _send_cancel(address, message, timeout):
+    """
+    Send a CancelRequest message over a connection of its
+    own, as bpgsql._send_cancel() does.
+
+    """
+    loop = asyncio.get_event_loop()
+    family, address = address
+    s = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        s.setblocking(False)
+        await asyncio.wait_for(loop.sock_connect(s, address), timeout)
+        await loop.sock_sendall(s, message)
+        await asyncio.wait_for(loop.sock_recv(s, 1), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise OperationalError("Couldn't send cancel request: %s" % (str(e) or 'timed out'))
+    finally:
+        s.close()
+
+
+class AsyncConnection(Protocol):
+    """
+    AsyncConnection objects are created by awaiting this module's
+    connect function.  Commands are executed by awaiting the methods
+    of its cursors.  A connection executes one command at a time, so
+    tasks sharing one take turns.
+
+    """
+    def __init__(self, statement_cache_size=100):
+        Protocol.__init__(self, statement_cache_size)
+        self.__stream = None
+        self.__streaming = None
+        self.__lock = asyncio.Lock()
+        self.__cancel_address = None
+        self.__cancel_timeout = None
+        self.__deadline = None
+        self.__canceled = False
+
+
+    async def _open(self, args):
+        #
+        # Connect to the backend with the keywords worked out by
+        # _connect_args(), log in and set up the type map.
+        #
+        async with self.__lock:
+            await self.__connect(args)
+
+            #
+            # Normally already taken care of by the startup packet
+            #
+            if self.get_parameter_status('standard_conforming_strings') != 'on':
+                await self.__execute("SET STANDARD_CONFORMING_STRINGS to 'ON'")
+
+            result = await self.__execute('SELECT oid, typname FROM pg_type')
+            for oid, name in result.rows:
+                self._register_oid(int(oid), name)
+
+
+    async def __connect(self, args):
+        #
+        # Log in to the first server in the host list that takes the
+        # connection and has the session attributes asked for, as
+        # Connection does.
+        #
+        timeout = _connect_timeout(args)
+        targets = _connect_targets(args)
+        errors = []
+        for wanted in _session_passes(args['target_session_attrs']):
+            remaining = list(targets)
+            while remaining:
+                try:
+                    s, target = await _connect_socket(remaining, args, timeout, errors)
+                except OperationalError:
+                    break
+                remaining.remove(target)
+
+                try:
+                    if await asyncio.wait_for(self.__login(s, args, wanted), timeout):
+                        self.__cancel_address = (s.family, s.getpeername())
+                        self.__cancel_timeout = timeout or _CANCEL_TIMEOUT
+                        return
+                    errors.append('%s: server is not %s' % (target[0], wanted))
+                    self.__stream.transport.write(_message(b'X'))
+                except (OSError, asyncio.TimeoutError, DatabaseError) as e:
+                    if getattr(e, 'pgcode', None) and e.pgcode.startswith('28'):
+                        self.__disconnect(s)
+                        raise
+                    errors.append('%s: %s' % (target[0], str(e) or 'timed out'))
+                except:
+                    self.__disconnect(s)
+                    raise
+
+                # on to the next one, starting afresh
+                self.__disconnect(s)
+                Protocol.__init__(self, self.statement_cache.size)
+
+        raise OperationalError("Couldn't connect to server: %s" % '; '.join(errors))
+
+
+    async def __login(self, s, args, wanted):
+        #
+        # Log in over a newly connected socket, and check
+        # whether the session is what target_session_attrs wants
+        #
+        loop = asyncio.get_event_loop()
+        stream = _StreamProtocol(self._input_buffer)
+        if s.family == getattr(socket, 'AF_UNIX', None):
+            await loop.create_unix_connection(lambda: stream, sock=s)
+        else:
+            await loop.create_connection(lambda: stream, sock=s)
+        self.__stream = stream
+
+        self.startup(args['user'], args['password'], args['dbname'], args['options'])
+        await self.__flush()
+        while not self._ready:
+            await self.__read_response()
+
+        if wanted == 'any':
+            return True
+        state = self._session_state()
+        if state is None:
+            result = await self.__execute(_SESSION_STATE_QUERY)
+            state = [(x == 'on') for x in result.rows[0]]
+        return _session_matches(wanted, *state)
+
+
+    def __disconnect(self, s):
+        if self.__stream is not None:
+            self.__stream.transport.close()
+            self.__stream = None
+        s.close()
+
+
+    async def __fill(self):
+        #
+        # Send anything waiting to be sent, and wait for some more data
+        # from the backend.  If a command with a timeout runs past its
+        # deadline, it's canceled, and the backend's error waited for
+        # as usual; if the cancel request can't be sent, there's no
+        # telling when the command will end, so the connection is closed.
+        #
+        if self._output_buffer:
+            await self.__flush()
+        stream = self.__stream
+        if (self.__deadline is not None) and not self.__canceled:
+            loop = asyncio.get_event_loop()
+            if await stream.wait(max(self.__deadline - loop.time(), 0)):
+                return
+            self.__canceled = True
+            try:
+                await self.cancel()
+            except Error as e:
+                self.__abandon()
+                raise QueryTimeout('Command ran over its timeout, connection closed: %s' % e)
+            # something may have come in the meantime
+            return
+        await stream.wait()
+
+
+    def __abandon(self):
+        #
+        # Close the connection in the middle of a command, whose
+        # response can't be read any more
+        #
+        if self.__stream is not None:
+            self.__stream.transport.close()
+            self.__stream = None
+
+
+    async def __flush(self):
+        #
+        # Send everything in the output buffer
+        #
+        stream = self.__stream
+        if (stream is None) or stream.transport.is_closing():
+            raise InterfaceError('Connection not open')
+        data = self.data_to_send()
+        if data:
+            stream.transport.write(data)
+            await stream.drain()
+
+
+    async def __read_response(self):
+        #
+        # Read a single message from the backend and handle it, receiving
+        # more data until it's complete.  COPY data is sent or received
+        # in bulk when the backend switches to COPY mode.
+        #
+        pkt_type = self.read_message()
+        while pkt_type is None:
+            await self.__fill()
+            pkt_type = self.read_message()
+
+        if pkt_type == b'G':
+            await self.__copy_in()
+        elif pkt_type == b'H':
+            while not self._copy_out_data():
+                await self.__fill()
+
+
+    async def __copy_in(self):
+        #
+        # Send the data for a COPY FROM STDIN, a chunk at a time,
+        # telling the backend the COPY failed if reading it does.
+        #
+        try:
+            source = self._copy_in_source()
+            if hasattr(source, '__aiter__'):
+                async for data in source:
+                    if data:
+                        self._copy_data(data)
+                        await self.__flush()
+            else:
+                for data in source:
+                    if data:
+                        self._copy_data(data)
+                        await self.__flush()
+        except Exception as e:
+            self._copy_fail(e)
+        else:
+            self._copy_done()
+        await self.__flush()
+
+
+    #--------------------------------------
+    # Helper functions for AsyncCursor objects
+    #
+    async def _execute(self, cmd, args=None, binary=None, stream=False, timeout=None):
+        async with self.__lock:
+            try:
+                if timeout is None:
+                    return await self.__execute(cmd, args, binary, stream)
+
+                #
+                # Cancel the command if the response (the first
+                # rows of a streaming one) doesn't come in time
+                #
+                self.__deadline = asyncio.get_event_loop().time() + timeout
+                self.__canceled = False
+                try:
+                    result = await self.__execute(cmd, args, binary, stream)
+                finally:
+                    self.__deadline = None
+                if self.__canceled:
+                    _query_timeout(result, timeout)
+                return result
+            except asyncio.CancelledError:
+                # the task was canceled, leaving the response unread
+                self.__abandon()
+                raise
+
+
+    async def __execute(self, cmd, args=None, binary=None, stream=False):
+        await self.__finish_stream()
+        request = self._request(cmd, args, binary)
+        self._output_buffer.append(request.data)
+        return await self.__response(request, stream=stream)
+
+
+    async def __response(self, request, retry=True, stream=False):
+        #
+        # Read the backend's response to a request, up to its
+        # ReadyForQuery message, and return the first result.  If
+        # stream is true, stop at the first row of a result set
+        # instead, and leave the rest for _stream_rows() to read (or
+        # at the start of COPY data, for _copy_out()).
+        #
+        result = self._start_response(request)
+        if stream:
+            while not (self._ready or result.rows or result.copy_out
+                       or (result.completed is not None) or result.error):
+                await self.__read_response()
+            if (result.rows or result.copy_out) and not self._ready:
+                result.query = request.query
+                if result.rows:
+                    result.rows = deque(result.rows)
+                result.streaming = True
+                self.__streaming = request
+                return result
+
+        while not self._ready:
+            await self.__read_response()
+        result, request = self._response_done(request, retry)
+        if request is not None:
+            self._output_buffer.append(request.data)
+            return await self.__response(request)
+        return result
+
+
+    async def __finish_stream(self):
+        #
+        # Read the rest of a streaming result into memory, so
+        # the connection can be used for something else
+        #
+        if self.__streaming is not None:
+            while not self._ready:
+                await self.__read_response()
+            self._response_done(self.__streaming, False)
+            self.__streaming = None
+
+
+    async def _stream_rows(self, result, n=None):
+        #
+        # Return up to n of the rows of a streaming result (all of the
+        # rest if n is None), reading more from the backend if they
+        # haven't arrived yet.
+        #
+        rows = result.rows
+        if result.streaming and ((n is None) or (len(rows) < n)):
+            async with self.__lock:
+                while result.streaming and ((n is None) or (len(rows) < n)):
+                    await self.__read_response()
+                    if self._ready:
+                        await self.__finish_stream()
+
+        if result.error and ((n is None) or not rows):
+            raise result.error
+
+        if (n is None) or (n >= len(rows)):
+            batch = list(rows)
+            rows.clear()
+        else:
+            batch = [rows.popleft() for i in range(n)]
+        return batch
+
+
+    async def _close_stream(self, result):
+        #
+        # Skip the rest of a streaming result nobody wants
+        #
+        async with self.__lock:
+            while result.streaming:
+                await self.__read_response()
+                result.rows.clear()
+                if self._ready:
+                    await self.__finish_stream()
+
+
+    async def _copy(self, cmd, source=None, size=COPY_SIZE):
+        #
+        # Execute a COPY FROM STDIN command, sending the chunks of
+        # data generated by source, which may be asynchronous.
+        #
+        async with self.__lock:
+            self._start_copy(source, None, size)
+            complete = False
+            try:
+                result = await self.__execute(cmd, None, False)
+                complete = True
+            except asyncio.CancelledError:
+                self.__abandon()
+                raise
+            finally:
+                error = self._end_copy(complete)
+
+        if error is not None:
+            raise error
+        return result
+
+
+    async def _copy_out(self, cmd, done):
+        #
+        # Asynchronous generator executing a COPY TO STDOUT command,
+        # that yields the data in chunks as it's read from the backend.
+        # The result is appended to the done list at the end.  Other
+        # tasks can use the connection in between, which skips the
+        # rest of the data.
+        #
+        async with self.__lock:
+            await self.__finish_stream()
+            request = self._request(cmd, None, False)
+            self._output_buffer.append(request.data)
+            self._copy_pull = request
+            try:
+                result = await self.__response(request, stream=True)
+            except:
+                self._copy_pull = None
+                raise
+
+        try:
+            buf = self._input_buffer
+            chunks = []
+            finished = not result.streaming
+            while not finished:
+                if self.__streaming is not request:
+                    raise InterfaceError('COPY data was skipped because the connection was used for another command')
+                nbytes, other = buf.copy_data(chunks)
+                if chunks:
+                    data = b''.join(chunks)
+                    del chunks[:]
+                    yield data
+                    continue
+                async with self.__lock:
+                    if other:
+                        if self.__streaming is request:
+                            await self.__finish_stream()
+                        finished = True
+                    elif self.__streaming is request:
+                        await self.__fill()
+            if result.error:
+                raise result.error
+            done.append(result)
+        finally:
+            async with self.__lock:
+                if self.__streaming is request:
+                    # given up on, skip the rest of the data
+                    await self.__finish_stream()
+                if self._copy_pull is request:
+                    self._copy_pull = None
+
+
+    #--------------------------------------
+    # Public methods
+    #
+
+    async def close(self):
+        """
+        Close the connection now.  The connection will be unusable
+        from this point forward; an Error (or subclass) exception will
+        be raised if any operation is attempted with the connection.
+        The same applies to all cursor objects trying to use the
+        connection.
+
+        """
+        stream = self.__stream
+        if (stream is None) or stream.transport.is_closing():
+            raise InterfaceError("Can't close connection that's not open")
+        try:
+            stream.transport.write(_message(b'X'))
+        finally:
+            stream.transport.close()
+            self.__stream = None
+
+
+    async def cancel(self):
+        """
+        Ask the server to cancel the command the connection is
+        executing, if any, which then fails with an OperationalError
+        (SQLSTATE 57014).  Raises OperationalError if the request
+        can't be sent.
+
+        """
+        stream = self.__stream
+        if (stream is None) or stream.transport.is_closing() or (self.__cancel_address is None):
+            raise InterfaceError('Connection not open')
+        await _send_cancel(self.__cancel_address, self._cancel_message(), self.__cancel_timeout)
+
+
+    async def commit(self):
+        """
+        Commit any pending transaction to the database.
+
+        """
+        result = await self._execute('COMMIT')
+        if result.error:
+            raise result.error
+
+
+    def cursor(self, binary=None, stream=False, timeout=None):
+        """
+        Get a new cursor object using this connection.  If binary is
+        True or False, the cursor asks for results in binary or text
+        format regardless of the connection's .binary setting.  If
+        stream is True, the cursor reads rows from the server as
+        they're fetched instead of all at once.  timeout is the default
+        number of seconds the cursor's commands may run before they're
+        canceled.
+
+        """
+        return AsyncCursor(self, binary, stream, timeout)
+
+
+    async def funcall(self, oid, *args):
+        """
+        Low-level call to PostgreSQL function, you must supply
+        the oid of the function, and have the args supplied as
+        ints or strings.
+
+        """
+        async with self.__lock:
+            await self.__finish_stream()
+            self._function_call(oid, args)
+            while not self._ready:
+                await self.__read_response()
+            return self._function_result()
+
+
+    async def rollback(self):
+        """
+        Cause the the database to roll back to the start of any
+        pending transaction.
+
+        """
+        result = await self._execute('ROLLBACK')
+        if result.error:
+            raise result.error
+
+
+    async def wait_for_notify(self, timeout=-1):
+        """
+        Wait for an async notification from the backend, which comes
+        when another client executes the SQL command:
+
+           NOTIFY name
+
+        timeout is specified in floating-point seconds, -1 means no
+        timeout, 0 means timeout immediately if nothing is available.
+        Other tasks can execute commands on the connection while
+        this waits.
+
+        Return value is a tuple: (name, pid) where 'name' string
+        specified in the NOTIFY command, and 'pid' is the pid of the
+        backend process that processed the command.
+
+        Raises a PostgreSQL_Timeout exception on timeout
+
+        """
+        loop = asyncio.get_event_loop()
+        deadline = None
+        if timeout >= 0:
+            deadline = loop.time() + timeout
+        while True:
+            async with self.__lock:
+                await self.__finish_stream()
+                while self.read_message() is not None:
+                    pass
+                result = self._notification()
+                if result is not None:
+                    return result
+                if self._output_buffer:
+                    await self.__flush()
+                stream = self.__stream
+                if stream is None:
+                    raise InterfaceError('Connection not open')
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+            if not await stream.wait(remaining):
+                raise PostgreSQL_Timeout()
+
+#
+# The exception classes are available as attributes
+# of AsyncConnection objects too, as for Connection.
+#
+for _name in ['Error', 'Warning', 'InterfaceError', 'DatabaseError',
+              'InternalError', 'OperationalError', 'ProgrammingError',
+              'IntegrityError', 'DataError', 'NotSupportedError']:
+    setattr(AsyncConnection, _name, getattr(bpgsql, _name))
+del _name
+
+
+class AsyncCursor(object):
+    """
+    AsyncCursor objects are created by calling an AsyncConnection's
+    cursor() method.  They work like Cursor objects, except that the
+    methods that execute commands or fetch rows are coroutines, and
+    rows are iterated over with 'async for'.
+
+    """
+    def __init__(self, conn, binary=None, stream=False, timeout=None):
+        self.arraysize = 1
+        self.binary = binary
+        self.stream = stream
+        self.timeout = timeout
+        self.connection = conn
+        self.description = None
+        self.lastrowid = None
+        self.messages = []
+        self.rowcount = -1
+        self.rownumber = None
+        self.__rows = None
+        self.__stream = None
+        self.query = ''
+
+
+    def __aiter__(self):
+        return self
+
+
+    async def __anext__(self):
+        """
+        Return the next row of a result set.  Raises StopAsyncIteration
+        if no more rows are available.  Raises an Error if no result set
+        exists.
+
+        """
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+
+    async def close(self):
+        """
+        Close the cursor now, skipping the rest of a streaming
+        result.  The cursor will be unusable from this point forward.
+
+        """
+        await self.__close_stream()
+        self.__init__(None)
+
+
+    async def __close_stream(self):
+        if self.__stream is not None:
+            await self.connection._close_stream(self.__stream)
+            self.__stream = None
+
+
+    async def __fetch_stream(self, size):
+        result = self.__stream
+        rows = await self.connection._stream_rows(result, size)
+        self.rownumber += len(rows)
+        if not result.streaming:
+            self.__set_rowcount(result)
+        return rows
+
+
+    async def copy_from(self, source, table, columns=None, format='text', size=COPY_SIZE):
+        """
+        Copy data into a table with COPY FROM STDIN.  source is a
+        file-like object to read() from (read() may be a coroutine),
+        or an iterable or asynchronous iterable of strings, holding
+        data in the given format ('text', 'csv' or 'binary').  The data
+        is sent in chunks of about size bytes.  columns is an optional
+        list of the table's columns the data is for.  The number of rows
+        copied is available in .rowcount afterwards.
+
+        """
+        cmd = 'COPY %s%s FROM STDIN%s' % (table, _copy_columns(columns), _copy_format(format))
+        read = getattr(source, 'read', None)
+        if hasattr(source, '__aiter__') or ((read is not None) and inspect.iscoroutinefunction(read)):
+            chunks = _copy_chunks_async(source, size)
+        else:
+            chunks = _copy_chunks(source, size)
+        await self.__copy(cmd, chunks, size)
+
+
+    async def copy_records(self, table, columns, records, size=COPY_SIZE):
+        """
+        Copy Python records (sequences of values, such as tuples) into
+        a table with a binary COPY FROM STDIN, encoding each value
+        according to the type of its column.  columns is a list of the
+        column names the values are for, or None for all of the table's
+        columns.  The number of rows copied is available in .rowcount
+        afterwards.
+
+        """
+        await self.__close_stream()
+        conn = self.connection
+        result = await conn._execute('SELECT %s FROM %s LIMIT 0' % (columns and ', '.join(columns) or '*', table), None, False)
+        if result.error:
+            raise result.error
+
+        encoders = conn._record_encoders(result)
+        cmd = 'COPY %s%s FROM STDIN%s' % (table, _copy_columns(columns), _copy_format('binary'))
+        await self.__copy(cmd, _copy_binary_chunks(records, encoders, size), size)
+
+
+    async def copy_records_out(self, table, columns=None):
+        """
+        Asynchronous generator over the rows of a table (or a query in
+        parentheses) as tuples, read with a binary COPY TO STDOUT and
+        decoded according to the types of the columns.  columns is an
+        optional list of column names.  The number of rows copied is
+        available in .rowcount once the rows are exhausted.
+
+        """
+        await self.__close_stream()
+        conn = self.connection
+        result = await conn._execute('SELECT %s FROM %s AS copy_records_out LIMIT 0' % (columns and ', '.join(columns) or '*', table), None, False)
+        if result.error:
+            raise result.error
+
+        decoders = conn._record_decoders(result)
+        cmd = 'COPY %s%s TO STDOUT%s' % (table, _copy_columns(columns), _copy_format('binary'))
+        done = []
+        parser = _BinaryRecordParser(decoders)
+        out = conn._copy_out(cmd, done)
+        try:
+            async for data in out:
+                if not parser.finished:
+                    for row in parser.feed(data):
+                        yield row
+        finally:
+            await out.aclose()
+        if done:
+            self._set_result(done[0])
+
+
+    async def copy_to(self, dest, table, columns=None, format='text', size=COPY_SIZE):
+        """
+        Copy data out of a table with COPY TO STDOUT, in the given
+        format ('text', 'csv' or 'binary').  table can also be a query
+        in parentheses.  dest is a file-like object to write() to, or
+        a callable, which is given byte strings of about size bytes
+        (text files are given unicode strings), and may return an
+        awaitable.  The number of rows copied is available in .rowcount
+        afterwards.
+
+        """
+        sink = getattr(dest, 'write', dest)
+        text = isinstance(dest, io.TextIOBase)
+        await self.__close_stream()
+        cmd = 'COPY %s%s TO STDOUT%s' % (table, _copy_columns(columns), _copy_format(format))
+
+        done = []
+        pending = []
+        pending_size = 0
+        async for data in self.connection._copy_out(cmd, done):
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= size:
+                await self.__write(sink, b''.join(pending), text)
+                pending = []
+                pending_size = 0
+        if pending:
+            await self.__write(sink, b''.join(pending), text)
+        self._set_result(done[0])
+
+
+    async def __write(self, sink, data, text):
+        if text:
+            data = data.decode('utf-8')
+        r = sink(data)
+        if inspect.isawaitable(r):
+            await r
+
+
+    async def __copy(self, cmd, source, size):
+        await self.__close_stream()
+        self._set_result(await self.connection._copy(cmd, source, size))
+
+
+    async def execute(self, cmd, args=None, timeout=None):
+        """
+        Execute a database operation (query or command).
+        Parameters may be provided as sequence or
+        mapping or singleton argument and will be bound to variables
+        in the operation. Variables are specified in format (...WHERE foo=%s...)
+        or pyformat (...WHERE foo=%(name)s...) paramstyles.
+
+        If the command runs longer than timeout seconds (the cursor's
+        .timeout if None), it's canceled and QueryTimeout raised.
+        Canceling the task executing a command closes the connection.
+
+        """
+        if timeout is None:
+            timeout = self.timeout
+        await self.__close_stream()
+        self._set_result(await self.connection._execute(cmd, args, self.binary, self.stream, timeout))
+
+
+    def _set_result(self, result):
+        #
+        # Take on the result of executing a command, raising the
+        # error if it failed.
+        #
+        self.rowcount = -1
+        self.rownumber = None
+        self.description = None
+        self.lastrowid = None
+        self.__rows = None
+        self.__stream = None
+        self.messages = []
+
+        if result.error:
+            raise result.error
+
+        self.description = result.description
+        self.messages = result.messages
+        self.query = result.query
+
+        if result.streaming:
+            # rowcount isn't known until all the rows are read
+            self.__stream = result
+            self.rownumber = 0
+            return
+
+        self.__rows = result.rows
+        self.__set_rowcount(result)
+
+
+    def __set_rowcount(self, result):
+        self.rowcount, self.lastrowid = result.counts()
+        if self.__rows is not None:
+            self.rowcount = len(self.__rows)
+            self.rownumber = 0
+
+
+    async def executemany(self, cmd, seq_of_parameters, page_size=EXECUTEMANY_PAGE_SIZE, method='values', timeout=None):
+        """
+        Execute a database operation (query or command) against
+        all parameter sequences or mappings found in the
+        sequence seq_of_parameters, batching 'INSERT ... VALUES (...)'
+        commands like Cursor.executemany() does.  With method='copy',
+        a plain 'INSERT INTO table (columns) VALUES (%s, ...)' command
+        is turned into a single COPY FROM STDIN.  timeout applies to
+        each of the commands executed, as for execute().
+
+        """
+        if method not in ('values', 'copy'):
+            raise ProgrammingError('Unknown executemany method: %r' % (method,))
+
+        params = iter(seq_of_parameters)
+        try:
+            first = next(params)
+        except StopIteration:
+            self.rowcount = -1
+            return
+        params = chain([first], params)
+
+        if isinstance(cmd, bytes):
+            cmd = cmd.decode('utf-8')
+        if method == 'copy':
+            copy_cmd, keys = _executemany_copy(cmd, isinstance(first, dict))
+            chunks = _copy_text_chunks(params, keys, self.connection._copy_text_value, COPY_SIZE)
+            await self.__copy(copy_cmd, chunks, COPY_SIZE)
+            return
+
+        pages = _executemany_pages(cmd, params, isinstance(first, dict), page_size)
+        if pages is None:
+            for p in params:
+                await self.execute(cmd, p, timeout)
+
+            # Don't want to leave the value of the last execute() call
+            self.rowcount = -1
+            return
+
+        total = 0
+        for page_cmd, args in pages:
+            await self.execute(page_cmd, args, timeout)
+            total += self.rowcount
+        self.rowcount = total
+
+
+    async def fetchall(self):
+        """
+        Fetch all remaining rows of a query set, as a list of lists.
+        An empty list is returned if no more rows are available.
+        An Error is raised if no result set exists
+
+        """
+        if self.__stream is not None:
+            return await self.__fetch_stream(None)
+
+        if self.__rows is None:
+            raise Error('No result set available')
+
+        return await self.fetchmany(self.rowcount - self.rownumber)
+
+
+    async def fetchone(self):
+        """
+        Fetch the next row of the result set as a list of fields, or None if
+        no more are available.  Will raise an Error if no
+        result set exists.
+
+        """
+        rows = await self.fetchmany(1)
+        if rows:
+            return rows[0]
+        return None
+
+
+    async def fetchmany(self, size=None):
+        """
+        Fetch all the specified number of rows of a query set, as a list of lists.
+        If no size is specified, then the cursor's .arraysize property is used.
+        An empty list is returned if no more rows are available.
+        An Error is raised if no result set exists
+
+        """
+        if size is None:
+            size = self.arraysize
+
+        if self.__stream is not None:
+            return await self.__fetch_stream(size)
+
+        if self.__rows is None:
+            raise Error('No result set available')
+
+        n = self.rownumber
+        self.rownumber += size
+        return self.__rows[n:self.rownumber]
+
+
+    def scroll(self, n, mode='relative'):
+        """
+        Scroll the cursor in the result set to a new position according
+        to mode, 'relative' (default) or 'absolute'.  Raises IndexError
+        if it would leave the result set.  Streaming cursors can't scroll.
+
+        """
+        if self.__stream is not None:
+            raise NotSupportedError("Streaming cursors can't scroll")
+
+        if self.__rows is None:
+            raise Error('No result set available')
+
+        if mode == 'relative':
+            newpos = self.rownumber + n
+        elif mode == 'absolute':
+            newpos = n
+        else:
+            raise ProgrammingError('Unknown scroll mode [%s]' % mode)
+
+        if (newpos < 0) or (newpos >= self.rowcount):
+            raise IndexError('scroll(%d, "%s") target position: %d outsize of range: 0..%d' % (n, mode, newpos, self.rowcount-1))
+
+        self.rownumber = newpos
+
+
+    def setinputsizes(self, sizes):
+        pass
+
+
+    def setoutputsize(self, size, column=None):
+        pass
+
+
+class AsyncConnectionPool(object):
+    """
+    Pool of AsyncConnections shared by the tasks of an event loop,
+    taking the same arguments as bpgsql.pool.ConnectionPool.  It's
+    opened with 'await pool.open()', or by using it in an 'async with'
+    statement.  Tasks waiting for a connection get one in the order they
+    asked for it.  A background task keeps minconn connections open
+    (replacing ones that are closed), closes idle and expired ones, and
+    checks ones that have been idle for check_interval seconds.
+
+    """
+    def __init__(self, dsn=None, minconn=1, maxconn=10, timeout=30.0,
+                 max_idle=600.0, max_lifetime=3600.0, check_interval=30.0,
+                 reset=None, **kwargs):
+        if (minconn < 0) or (maxconn < 1) or (minconn > maxconn):
+            raise ProgrammingError('Bad pool size: minconn=%r maxconn=%r' % (minconn, maxconn))
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.reset = reset
+        self.__kwargs = kwargs
+        self.__idle = []                    # most recently returned last
+        self.__used = {}                    # id(cnx) -> _PooledConnection
+        self.__size = 0                     # open connections, and ones being opened
+        self.__waiters = deque()            # futures of tasks waiting in acquire()
+        self.__wakeup = None
+        self.__task = None
+        self.__closed = False
+        self.__started = _clock()
+        self.__stats = {
+            'requests': 0,
+            'wait_time': 0.0,
+            'wait_max': 0.0,
+            'timeouts': 0,
+            'usage_time': 0.0,
+            'opened': 0,
+            'closed': 0,
+            'errors': 0,
+            }
+
+
+    async def open(self):
+        """
+        Open minconn connections, and start the background task.
+
+        """
+        if self.__task is not None:
+            return
+        self.__wakeup = asyncio.Event()
+        for i in range(self.minconn - self.__size):
+            self.__size += 1
+            self.__hand_over(await self.__open())
+        self.__task = asyncio.ensure_future(self.__maintain())
+
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+    async def __open(self):
+        #
+        # Open a new connection, for which room has already been made
+        # in .__size, giving the room back if it fails
+        #
+        try:
+            cnx = await connect(self.dsn, **self.__kwargs)
+        except:
+            self.__size -= 1
+            self.__stats['errors'] += 1
+            raise
+        self.__stats['opened'] += 1
+        return _PooledConnection(cnx, _clock())
+
+
+    async def __discard(self, entry):
+        #
+        # Close a connection, making room for a new one
+        #
+        self.__size -= 1
+        self.__stats['closed'] += 1
+        if self.__wakeup is not None:
+            self.__wakeup.set()
+        try:
+            await entry.cnx.close()
+        except Exception:
+            pass
+
+
+    def __expired(self, entry, now):
+        return (self.max_lifetime is not None) and (now - entry.created >= self.max_lifetime)
+
+
+    def __hand_over(self, entry):
+        #
+        # Give an available connection to the task that has been
+        # waiting longest, or keep it idle if none are
+        #
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(entry)
+                return
+        self.__idle.append(entry)
+
+
+    def __time_out(self, waiter, timeout):
+        if not waiter.done():
+            self.__stats['timeouts'] += 1
+            waiter.set_exception(PoolTimeout('No connection available within %s seconds' % timeout))
+
+
+    async def __wait(self, remaining, timeout):
+        #
+        # Wait in line for a connection to be handed over
+        #
+        loop = asyncio.get_event_loop()
+        waiter = loop.create_future()
+        self.__waiters.append(waiter)
+        self.__wakeup.set()
+        handle = None
+        if remaining is not None:
+            handle = loop.call_later(remaining, self.__time_out, waiter, timeout)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and (waiter.exception() is None):
+                # handed a connection just as it was cancelled
+                self.__hand_over(waiter.result())
+            raise
+        finally:
+            if handle is not None:
+                handle.cancel()
+            if waiter in self.__waiters:
+                self.__waiters.remove(waiter)
+
+
+    async def acquire(self, timeout=None):
+        """
+        Check out a connection, waiting up to timeout seconds (the
+        pool's .timeout if None, -1 to wait indefinitely) for one to
+        become available.  Raises PoolTimeout if none does.
+
+        """
+        if timeout is None:
+            timeout = self.timeout
+        start = _clock()
+        deadline = None
+        if (timeout is not None) and (timeout >= 0):
+            deadline = start + timeout
+
+        while True:
+            if self.__closed or (self.__task is None):
+                raise PoolClosed('Connection pool is not open')
+            if self.__idle:
+                entry = self.__idle.pop()
+            elif self.__size < self.maxconn:
+                self.__size += 1
+                entry = await self.__open()
+            else:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(deadline - _clock(), 0)
+                entry = await self.__wait(remaining, timeout)
+
+            now = _clock()
+            if self.__expired(entry, now):
+                await self.__discard(entry)
+                continue
+
+            wait = now - start
+            stats = self.__stats
+            stats['requests'] += 1
+            stats['wait_time'] += wait
+            stats['wait_max'] = max(stats['wait_max'], wait)
+            entry.checked_out = now
+            self.__used[id(entry.cnx)] = entry
+            return entry.cnx
+
+
+    async def release(self, cnx, close=False):
+        """
+        Give back a connection checked out with acquire().  Any
+        transaction it's in is rolled back, and the pool's reset command
+        executed.  If close is True, or that fails, the connection
+        is closed instead of being kept for reuse.
+
+        """
+        entry = self.__used.pop(id(cnx), None)
+        if entry is None:
+            raise ProgrammingError("Connection wasn't checked out of this pool")
+        self.__stats['usage_time'] += _clock() - entry.checked_out
+        entry.checked_out = None
+
+        try:
+            if not close:
+                try:
+                    await self.__reset(cnx)
+                except Exception:
+                    close = True
+        except BaseException:
+            # cancelled, the connection can't be trusted
+            asyncio.ensure_future(self.__discard(entry))
+            raise
+
+        now = _clock()
+        if close or self.__closed or self.__expired(entry, now):
+            await self.__discard(entry)
+        else:
+            entry.returned = entry.checked = now
+            self.__hand_over(entry)
+
+
+    async def __reset(self, cnx):
+        #
+        # Get a connection that's been given back ready for reuse
+        #
+        status, serial = cnx._transaction()
+        if status != b'I':
+            await cnx.rollback()
+        if self.reset:
+            result = await cnx._execute(self.reset, None, False)
+            if _DEALLOCATES.search(self.reset):
+                cnx.statement_cache.clear()
+            if result.error:
+                raise result.error
+
+
+    @asynccontextmanager
+    async def connection(self, timeout=None):
+        """
+        Asynchronous context manager checking out a connection for the
+        'async with' block.  A transaction block left open is committed
+        at the end of the block, or rolled back if it raises an
+        exception, and the connection given back.
+
+        """
+        cnx = await self.acquire(timeout)
+        try:
+            yield cnx
+            if cnx._transaction()[0] != b'I':
+                await cnx.commit()
+        except:
+            await self.release(cnx)
+            raise
+        await self.release(cnx)
+
+
+    def __interval(self):
+        #
+        # How often the background task looks over the connections
+        #
+        limits = [x for x in (self.max_idle, self.max_lifetime, self.check_interval) if x is not None]
+        return min(max(min(limits + [60.0]) / 2.0, 0.1), 60.0)
+
+
+    async def __maintain(self):
+        #
+        # Background task calling maintain() every so often, or when
+        # a connection has been closed or a task has to wait
+        #
+        while not self.__closed:
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), self.__interval())
+            except asyncio.TimeoutError:
+                pass
+            self.__wakeup.clear()
+            try:
+                await self.maintain()
+            except Exception:
+                # couldn't connect, try again next time round
+                pass
+
+
+    async def maintain(self):
+        """
+        Close idle connections beyond minconn that have been idle longer
+        than max_idle, and ones older than max_lifetime, check the ones
+        that haven't been used for check_interval seconds, and open
+        connections to make up minconn, or for tasks waiting for one.
+        The pool's background task does this now and then.
+
+        """
+        now = _clock()
+        reaped = []
+        keep = []
+        extra = self.__size - self.minconn
+        for entry in self.__idle:
+            if self.__expired(entry, now) or ((extra > 0) and (self.max_idle is not None)
+                                              and (now - entry.returned >= self.max_idle)):
+                reaped.append(entry)
+                extra -= 1
+            else:
+                keep.append(entry)
+        self.__idle[:] = keep
+        for entry in reaped:
+            await self.__discard(entry)
+
+        if self.check_interval is not None:
+            for entry in [e for e in self.__idle if now - e.checked >= self.check_interval]:
+                if entry not in self.__idle:
+                    # checked out in the meantime
+                    continue
+                self.__idle.remove(entry)
+                try:
+                    result = await entry.cnx._execute('SELECT 1', None, False)
+                    healthy = not result.error
+                except Exception:
+                    healthy = False
+                if healthy:
+                    entry.checked = _clock()
+                    self.__hand_over(entry)
+                else:
+                    await self.__discard(entry)
+
+        while (not self.__closed) and ((self.__size < self.minconn)
+                                       or (self.__waiters and (self.__size < self.maxconn))):
+            self.__size += 1
+            self.__hand_over(await self.__open())
+
+
+    async def close(self):
+        """
+        Close the idle connections, and the ones that are checked out as
+        they're given back.  Tasks waiting for a connection, and further
+        acquire() calls, raise PoolClosed.
+
+        """
+        self.__closed = True
+        task, self.__task = self.__task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(PoolClosed('Connection pool is closed'))
+        idle, self.__idle = self.__idle, []
+        for entry in idle:
+            await self.__discard(entry)
+
+
+    def stats(self):
+        """
+        Return a dictionary of counters, the same as
+        bpgsql.pool.ConnectionPool.stats() (with 'waiting' being
+        the number of tasks waiting in acquire()).
+
+        """
+        result = dict(self.__stats)
+        result['size'] = self.__size
+        result['idle'] = len(self.__idle)
+        result['in_use'] = len(self.__used)
+        result['waiting'] = len([w for w in self.__waiters if not w.done()])
+        result['utilisation'] = len(self.__used) / float(self.maxconn)
+        result['age'] = _clock() - self.__started
+        return result
+
+
+async def connect(dsn=None, username='', password='',
+                  host=None, dbname='', port='', opt='', statement_cache_size=100, **extra):
+    """
+    Connect to a PostgreSQL database, returning an AsyncConnection.
+    Takes the same arguments as bpgsql.connect().
+
+    """
+    args = _connect_args(dsn, username, password, host, dbname, port, opt, extra)
+    cnx = AsyncConnection(statement_cache_size)
+    await cnx._open(args)
+    return cnx
+
+# ---- EOF ----
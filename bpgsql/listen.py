@@ -0,0 +1,348 @@
+"""
+LISTEN/NOTIFY for many subscribers over one connection.
+
+    listener = bpgsql.listen.Listener('host=127.0.0.1 dbname=mydb')
+    listener.subscribe('jobs', handle_jobs)
+    listener.start()
+
+"""
+# Copyright (C) 2001-2008 Barry Pederson <bp@barryp.org>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+
+import selectors
+import socket
+import threading
+import traceback
+
+import bpgsql
+from bpgsql import Error, InterfaceError, ProgrammingError, _clock
+
+
+def _quote_channel(channel):
+    return '"%s"' % channel.replace('"', '""')
+
+
+class Listener(object):
+    """
+    Listens for notifications on a connection of its own, and hands
+    them out to the callables subscribed to their channels.  Channels
+    are LISTENed to while they have subscribers.
+
+    A burst of notifications is delivered together: each subscriber
+    is called once with a list of the Notifications for its channels
+    that arrived, oldest first.  If batch_delay is given, the listener
+    waits that many seconds after the first notification of a burst
+    for more to arrive before delivering them.
+
+    The listener is driven by calling poll(), or run() which polls until
+    the listener is closed, or start() which runs it in a background
+    thread.  Exceptions raised by subscribers are passed to on_error
+    along with the notifications, or printed if it's None, and don't
+    stop the others being called.  Other arguments are passed to
+    bpgsql.connect().
+
+    If the connection fails, the listener is closed and the error is
+    raised by poll(), or passed by run() to on_error with an empty list
+    of notifications, and if it's None raised by close() instead.
+
+    """
+    def __init__(self, dsn=None, batch_delay=0.0, on_error=None, connect=None, **kwargs):
+        self.batch_delay = batch_delay
+        self.on_error = on_error
+        self.__cnx = (connect or bpgsql.connect)(dsn, **kwargs)
+        self.__lock = threading.RLock()     # for using the connection
+        self.__subscribers = {}             # channel -> [callable, ...]
+        self.__thread = None
+        self.__closed = False
+        self.__error = None                 # why the connection failed
+        self.__reported = False             # whether the error's been raised
+
+        #
+        # The selector waits for the connection's socket, and a socket
+        # pair that's written to to wake up a waiting poll()
+        #
+        self.__wakeup, self.__waker = socket.socketpair()
+        self.__wakeup.setblocking(False)
+        self.__waker.setblocking(False)
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__cnx.fileno(), selectors.EVENT_READ)
+        self.__selector.register(self.__wakeup, selectors.EVENT_READ)
+
+
+    def __execute(self, cmd):
+        #
+        # Execute a command on the connection, waking up a poll() that's
+        # waiting in case notifications came in along with the response
+        #
+        result = self.__cnx._execute(cmd, None, False)
+        self.__wake()
+        if result.error:
+            raise result.error
+
+
+    def __fail(self, error):
+        #
+        # Give up on a connection that's failed, keeping the
+        # error for poll() and close() to raise
+        #
+        with self.__lock:
+            if self.__error is None:
+                self.__error = error
+            self.__closed = True
+            self.__wake()
+
+
+    def __wake(self):
+        try:
+            self.__waker.send(b'x')
+        except socket.error:
+            # full of wake-ups already
+            pass
+
+
+    def subscribe(self, channel, callback):
+        """
+        Have callback called with lists of the Notifications sent
+        on a channel, LISTENing to the channel if it's the first
+        subscriber.
+
+        """
+        with self.__lock:
+            if self.__closed:
+                raise InterfaceError('Listener is closed')
+            callbacks = self.__subscribers.get(channel)
+            if callbacks is None:
+                self.__execute('LISTEN ' + _quote_channel(channel))
+                callbacks = self.__subscribers[channel] = []
+            callbacks.append(callback)
+
+
+    def unsubscribe(self, channel, callback):
+        """
+        Stop calling callback for a channel, UNLISTENing to the
+        channel if it was the last subscriber.
+
+        """
+        with self.__lock:
+            callbacks = self.__subscribers.get(channel)
+            if (callbacks is None) or (callback not in callbacks):
+                raise ProgrammingError('%r is not subscribed to %r' % (callback, channel))
+            callbacks.remove(callback)
+            if not callbacks:
+                del self.__subscribers[channel]
+                if not self.__closed:
+                    self.__execute('UNLISTEN ' + _quote_channel(channel))
+
+
+    def channels(self):
+        """
+        Return a list of the channels with subscribers.
+
+        """
+        with self.__lock:
+            return list(self.__subscribers)
+
+
+    def notify(self, channel, payload=None):
+        """
+        Send a notification on a channel, with an optional payload
+        string, over the listener's connection.
+
+        """
+        with self.__lock:
+            cur = self.__cnx.cursor()
+            cur.execute('SELECT pg_notify(%s, %s)', (channel, payload or ''))
+            self.__wake()
+
+
+    def __receive(self, timeout):
+        #
+        # Wait up to timeout seconds (None for no limit) for the
+        # connection's socket to become readable, and return the
+        # notifications received.  Returns early, with whatever
+        # has come, if close() is called.
+        #
+        with self.__lock:
+            notifications = self.__cnx._notifications()
+            if notifications or (timeout == 0):
+                if not notifications:
+                    notifications = self.__cnx._receive_notifications()
+                return notifications
+
+        if self.__closed:
+            return []
+        ready = self.__selector.select(timeout)
+        with self.__lock:
+            if self.__closed:
+                return []
+            for key, events in ready:
+                if key.fileobj is self.__wakeup:
+                    try:
+                        self.__wakeup.recv(4096)
+                    except socket.error:
+                        pass
+            return self.__cnx._receive_notifications()
+
+
+    def poll(self, timeout=None):
+        """
+        Wait up to timeout seconds (None for no limit, 0 to not wait)
+        for notifications, and deliver them to their subscribers.
+        Returns the number of notifications received.
+
+        """
+        if self.__error is not None:
+            raise self.__error
+        try:
+            notifications = self.__wait(timeout)
+        except Error as e:
+            self.__fail(e)
+            self.__reported = True
+            raise
+
+        self.__deliver(notifications)
+        return len(notifications)
+
+
+    def __wait(self, timeout):
+        #
+        # Wait for notifications and return them, along
+        # with the rest of their burst
+        #
+        deadline = None
+        if timeout is not None:
+            deadline = _clock() + timeout
+        notifications = self.__receive(timeout)
+        while not notifications:
+            if self.__closed or ((deadline is not None) and (_clock() >= deadline)):
+                return []
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - _clock(), 0)
+            notifications = self.__receive(remaining)
+
+        if self.batch_delay:
+            #
+            # Wait a little for the rest of a burst
+            #
+            end = _clock() + self.batch_delay
+            while not self.__closed:
+                remaining = end - _clock()
+                if remaining <= 0:
+                    break
+                notifications.extend(self.__receive(remaining))
+
+        return notifications
+
+
+    def __deliver(self, notifications):
+        #
+        # Call each subscriber once, with the notifications
+        # for its channels
+        #
+        with self.__lock:
+            subscribers = dict([(channel, list(callbacks)) for channel, callbacks in self.__subscribers.items()])
+
+        batches = []                        # [(callback, [notification, ...]), ...]
+        index = {}                          # callback -> position in batches
+        for n in notifications:
+            for callback in subscribers.get(n.channel, ()):
+                i = index.get(callback)
+                if i is None:
+                    i = index[callback] = len(batches)
+                    batches.append((callback, []))
+                batches[i][1].append(n)
+
+        for callback, batch in batches:
+            try:
+                callback(batch)
+            except Exception as e:
+                if self.on_error is None:
+                    traceback.print_exc()
+                else:
+                    self.on_error(e, batch)
+
+
+    def run(self):
+        """
+        Deliver notifications as they come, until the
+        listener is closed or its connection fails.
+
+        """
+        while not self.__closed:
+            try:
+                self.poll()
+            except Error as e:
+                if self.on_error is None:
+                    # leave it for close()
+                    self.__reported = False
+                else:
+                    self.on_error(e, [])
+                return
+
+
+    def start(self):
+        """
+        Start delivering notifications in a daemon thread, until
+        the listener is closed or its connection fails.
+
+        """
+        with self.__lock:
+            if self.__closed:
+                raise InterfaceError('Listener is closed')
+            if self.__thread is not None:
+                raise ProgrammingError('Listener already started')
+            self.__thread = threading.Thread(target=self.run, name='bpgsql listener')
+            self.__thread.daemon = True
+            self.__thread.start()
+
+
+    def close(self):
+        """
+        Stop listening, waiting for the background thread if there is
+        one to finish delivering notifications, and close the connection.
+        Raises the error the connection failed with, if it did and the
+        error hasn't been raised by poll() or passed to on_error.
+
+        """
+        with self.__lock:
+            self.__closed = True
+            if self.__selector is not None:
+                self.__wake()
+
+        thread = self.__thread
+        if (thread is not None) and (thread is not threading.current_thread()):
+            thread.join()
+
+        with self.__lock:
+            error = None
+            if not self.__reported:
+                error = self.__error
+                self.__reported = True
+            if self.__selector is not None:
+                self.__selector.close()
+                self.__wakeup.close()
+                self.__waker.close()
+                self.__selector = None
+                try:
+                    self.__cnx.close()
+                except (Error, socket.error):
+                    # already lost
+                    pass
+        if error is not None:
+            raise error
+
+# ---- EOF ----
@@ -0,0 +1,481 @@
+"""
+Thread-safe pool of bpgsql connections.
+
+    pool = bpgsql.pool.ConnectionPool('host=127.0.0.1 dbname=mydb', maxconn=20)
+    with pool.connection() as cnx:
+        cur = cnx.cursor()
+        cur.execute('SELECT * FROM foo')
+        ...
+
+"""
+# Copyright (C) 2001-2008 Barry Pederson <bp@barryp.org>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+
+import os
+import re
+import threading
+import weakref
+from contextlib import contextmanager
+
+import bpgsql
+from bpgsql import InterfaceError, ProgrammingError, _clock
+
+#
+# Reset commands that deallocate prepared statements, after which
+# the connection's statement cache has to be forgotten
+#
+_DEALLOCATES = re.compile(r'\b(DISCARD\s+ALL|DEALLOCATE)\b', re.I)
+
+
+class PoolTimeout(InterfaceError):
+    """
+    Raised when no connection becomes available in time.
+
+    """
+    pass
+
+
+class PoolClosed(InterfaceError):
+    """
+    Raised when trying to use a pool that has been closed.
+
+    """
+    pass
+
+
+def _after_fork(ref):
+    pool = ref()
+    if pool is not None:
+        pool._after_fork()
+
+
+class _PooledConnection(object):
+    """
+    What a pool knows about one of its connections.
+
+    """
+    def __init__(self, cnx, now):
+        self.cnx = cnx
+        self.created = now
+        self.returned = now                 # last time it went idle
+        self.checked = now                  # last time it was known to work
+        self.checked_out = None
+
+
+class ConnectionPool(object):
+    """
+    Pool of connections shared by threads.  Connections are checked out
+    with getconn() and given back with putconn(), or used in a 'with'
+    statement through connection().
+
+    minconn connections are opened up front, and the pool never has
+    more than maxconn.  getconn() waits up to timeout seconds (None
+    for no limit) for a connection when they're all in use.  Idle connections beyond
+    minconn are closed after max_idle seconds, and every connection
+    is closed once it's max_lifetime seconds old (None disables either).
+    A connection that's been idle for check_interval seconds is checked
+    with a round-trip before it's handed out.  Connections given back
+    in a transaction are rolled back, and the reset command, if any, is
+    executed on them.  Other arguments are passed to bpgsql.connect().
+
+    A process forked from the one that created the pool starts out
+    with an empty pool, dropping the connections it inherited without
+    disturbing the parent's use of them, and opens warmup connections
+    (minconn if None) at once in background threads.
+
+    """
+    def __init__(self, dsn=None, minconn=1, maxconn=10, timeout=30.0,
+                 max_idle=600.0, max_lifetime=3600.0, check_interval=30.0,
+                 reset=None, connect=None, warmup=None, **kwargs):
+        if (minconn < 0) or (maxconn < 1) or (minconn > maxconn):
+            raise ProgrammingError('Bad pool size: minconn=%r maxconn=%r' % (minconn, maxconn))
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.reset = reset
+        self.warmup = warmup
+        self.__connect = connect or bpgsql.connect
+        self.__kwargs = kwargs
+        self.__closed = False
+        self.__start()
+
+        if hasattr(os, 'register_at_fork'):
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: _after_fork(ref))
+
+        for i in range(minconn):
+            with self.__cond:
+                self.__size += 1
+            entry = self.__open()
+            with self.__cond:
+                self.__idle.append(entry)
+
+
+    def __start(self):
+        #
+        # Start out with no connections, in this process
+        #
+        self.__pid = os.getpid()
+        self.__cond = threading.Condition(threading.Lock())
+        self.__idle = []                    # most recently returned last
+        self.__used = {}                    # id(cnx) -> _PooledConnection
+        self.__size = 0                     # open connections, and ones being opened
+        self.__waiting = 0
+        self.__warming = 0                  # connections being opened by __warm_up()
+        self.__started = _clock()
+        self.__stats = {
+            'requests': 0,
+            'wait_time': 0.0,
+            'wait_max': 0.0,
+            'timeouts': 0,
+            'usage_time': 0.0,
+            'opened': 0,
+            'closed': 0,
+            'errors': 0,
+            }
+
+
+    def _after_fork(self):
+        #
+        # Called in a child process after a fork (or when the pool is
+        # first used in one, if os.register_at_fork() isn't available):
+        # drop the connections inherited from the parent without ending
+        # their sessions, and warm up with new ones of our own.  The
+        # lock is replaced too, since another thread of the parent may
+        # have been holding it.
+        #
+        if self.__pid == os.getpid():
+            return
+        inherited = self.__idle + list(self.__used.values())
+        self.__start()
+        for entry in inherited:
+            try:
+                entry.cnx._detach()
+            except Exception:
+                pass
+
+        if not self.__closed:
+            n = self.warmup
+            if n is None:
+                n = self.minconn
+            n = min(n, self.maxconn)
+            self.__size = self.__warming = n
+            for i in range(n):
+                t = threading.Thread(target=self.__warm_up)
+                t.daemon = True
+                t.start()
+
+
+    def __check_pid(self):
+        if self.__pid != os.getpid():
+            self._after_fork()
+
+
+    def __warm_up(self):
+        #
+        # Open a connection in a background thread, room for
+        # it has been made already
+        #
+        try:
+            entry = self.__open()
+        except Exception:
+            entry = None
+        with self.__cond:
+            self.__warming -= 1
+            if entry is not None:
+                self.__idle.append(entry)
+            self.__cond.notify()
+
+
+    def __open(self):
+        #
+        # Open a new connection, for which room has already been made
+        # in .__size, giving the room back if it fails
+        #
+        try:
+            cnx = self.__connect(self.dsn, **self.__kwargs)
+        except:
+            with self.__cond:
+                self.__size -= 1
+                self.__stats['errors'] += 1
+                self.__cond.notify()
+            raise
+        with self.__cond:
+            self.__stats['opened'] += 1
+        return _PooledConnection(cnx, _clock())
+
+
+    def __discard(self, entry):
+        #
+        # Close a connection that has already been taken out of
+        # the pool's count of open connections
+        #
+        with self.__cond:
+            self.__stats['closed'] += 1
+        try:
+            entry.cnx.close()
+        except Exception:
+            pass
+
+
+    def __expired(self, entry, now):
+        return (self.max_lifetime is not None) and (now - entry.created >= self.max_lifetime)
+
+
+    def __reap(self, now):
+        #
+        # Take out the idle connections that have been idle too long
+        # (beyond minconn) or lived too long, for closing once the
+        # lock is released.  Called with the lock held.
+        #
+        reaped = []
+        keep = []
+        idle = self.__idle
+        extra = self.__size - self.minconn
+        for entry in idle:
+            if self.__expired(entry, now) or ((extra > 0) and (self.max_idle is not None)
+                                              and (now - entry.returned >= self.max_idle)):
+                reaped.append(entry)
+                extra -= 1
+            else:
+                keep.append(entry)
+        if reaped:
+            idle[:] = keep
+            self.__size -= len(reaped)
+            self.__cond.notify(len(reaped))
+        return reaped
+
+
+    def __healthy(self, entry, now):
+        #
+        # Check a connection that's about to be handed out, if it's
+        # been a while since it was known to work, with a round-trip
+        # to the server
+        #
+        if (self.check_interval is None) or (now - entry.checked < self.check_interval):
+            return True
+        try:
+            result = entry.cnx._execute('SELECT 1', None, False)
+        except Exception:
+            return False
+        if result.error:
+            return False
+        entry.checked = now
+        return True
+
+
+    def getconn(self, timeout=None):
+        """
+        Check out a connection, waiting up to timeout seconds (the
+        pool's .timeout if None, -1 to wait indefinitely) for one to
+        become available.  Raises PoolTimeout if none does.
+
+        """
+        self.__check_pid()
+        if timeout is None:
+            timeout = self.timeout
+        start = _clock()
+        deadline = None
+        if (timeout is not None) and (timeout >= 0):
+            deadline = start + timeout
+
+        while True:
+            entry = None
+            reaped = []
+            with self.__cond:
+                while True:
+                    if self.__closed:
+                        raise PoolClosed('Connection pool is closed')
+                    now = _clock()
+                    reaped.extend(self.__reap(now))
+                    if self.__idle:
+                        entry = self.__idle.pop()
+                        break
+                    if (self.__size < self.maxconn) and (self.__warming <= self.__waiting):
+                        self.__size += 1
+                        break
+                    if (deadline is not None) and (now >= deadline):
+                        self.__stats['timeouts'] += 1
+                        raise PoolTimeout('No connection available within %s seconds' % timeout)
+                    self.__waiting += 1
+                    try:
+                        if deadline is None:
+                            self.__cond.wait()
+                        else:
+                            self.__cond.wait(deadline - now)
+                    finally:
+                        self.__waiting -= 1
+
+            for r in reaped:
+                self.__discard(r)
+
+            if entry is None:
+                entry = self.__open()
+            elif self.__expired(entry, _clock()) or not self.__healthy(entry, _clock()):
+                with self.__cond:
+                    self.__size -= 1
+                    self.__cond.notify()
+                self.__discard(entry)
+                continue
+
+            now = _clock()
+            wait = now - start
+            with self.__cond:
+                stats = self.__stats
+                stats['requests'] += 1
+                stats['wait_time'] += wait
+                stats['wait_max'] = max(stats['wait_max'], wait)
+                entry.checked_out = now
+                self.__used[id(entry.cnx)] = entry
+            return entry.cnx
+
+
+    def putconn(self, cnx, close=False):
+        """
+        Give back a connection checked out with getconn().  Any
+        transaction it's in is rolled back, and the pool's reset command
+        executed.  If close is True, or that fails, the connection
+        is closed instead of being kept for reuse.
+
+        """
+        self.__check_pid()
+        with self.__cond:
+            entry = self.__used.pop(id(cnx), None)
+        if entry is None:
+            raise ProgrammingError("Connection wasn't checked out of this pool")
+
+        if not close:
+            try:
+                self.__reset(cnx)
+            except Exception:
+                close = True
+
+        now = _clock()
+        close = close or self.__expired(entry, now)
+        with self.__cond:
+            self.__stats['usage_time'] += now - entry.checked_out
+            entry.checked_out = None
+            if close or self.__closed:
+                self.__size -= 1
+                close = True
+            else:
+                entry.returned = entry.checked = now
+                self.__idle.append(entry)
+            reaped = self.__reap(now)
+            self.__cond.notify()
+
+        if close:
+            self.__discard(entry)
+        for r in reaped:
+            self.__discard(r)
+
+
+    def __reset(self, cnx):
+        #
+        # Get a connection that's been given back ready for reuse
+        #
+        if cnx._pipeline:
+            cnx._pipeline.discard()
+        status, serial = cnx._transaction()
+        if status != b'I':
+            cnx.rollback()
+        if self.reset:
+            result = cnx._execute(self.reset, None, False)
+            if _DEALLOCATES.search(self.reset):
+                cnx.statement_cache.clear()
+            if result.error:
+                raise result.error
+
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager checking out a connection for the 'with'
+        block.  A transaction block left open is committed at the end
+        of the block, or rolled back if it raises an exception, and
+        the connection given back.
+
+        """
+        cnx = self.getconn(timeout)
+        try:
+            yield cnx
+            if cnx._transaction()[0] != b'I':
+                cnx.commit()
+        except:
+            self.putconn(cnx)
+            raise
+        self.putconn(cnx)
+
+
+    def reap(self):
+        """
+        Close the idle connections that have been idle longer than
+        max_idle, or lived longer than max_lifetime.  This is done
+        whenever connections are checked out or given back, calling it
+        now and then keeps the pool trimmed while it's not in use.
+
+        """
+        self.__check_pid()
+        with self.__cond:
+            reaped = self.__reap(_clock())
+        for r in reaped:
+            self.__discard(r)
+
+
+    def close(self):
+        """
+        Close the idle connections, and the ones that are checked out
+        as they're given back.  Further getconn() calls raise PoolClosed.
+
+        """
+        self.__check_pid()
+        with self.__cond:
+            self.__closed = True
+            idle, self.__idle = self.__idle, []
+            self.__size -= len(idle)
+            self.__cond.notify_all()
+        for entry in idle:
+            self.__discard(entry)
+
+
+    def stats(self):
+        """
+        Return a dictionary of counters: the current 'size' (open
+        connections), 'idle', 'in_use' and 'waiting' (threads waiting
+        in getconn()), 'utilisation' (the fraction of maxconn in use),
+        and the totals since the pool was created: 'requests' (connections
+        checked out), 'wait_time' and 'wait_max' (seconds spent waiting in
+        getconn()), 'timeouts', 'usage_time' (seconds connections were
+        checked out for), 'opened', 'closed' and 'errors' (failed
+        attempts to connect), and the pool's 'age' in seconds.
+
+        """
+        self.__check_pid()
+        with self.__cond:
+            result = dict(self.__stats)
+            result['size'] = self.__size
+            result['idle'] = len(self.__idle)
+            result['in_use'] = len(self.__used)
+            result['waiting'] = self.__waiting
+            result['utilisation'] = len(self.__used) / float(self.maxconn)
+            result['age'] = _clock() - self.__started
+        return result
+
+# ---- EOF ----
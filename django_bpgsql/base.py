@@ -103,13 +103,13 @@ class DatabaseWrapper(BaseDatabaseWrapper):
                 "settings.DATABASES is improperly configured. "
                 "Please supply the NAME value.")
         conn_params = {
-            'database': settings_dict['NAME'] or 'postgres',
+            'dbname': settings_dict['NAME'] or 'postgres',
         }
         conn_params.update(settings_dict['OPTIONS'])
         if 'autocommit' in conn_params:
             del conn_params['autocommit']
         if settings_dict['USER']:
-            conn_params['user'] = settings_dict['USER']
+            conn_params['username'] = settings_dict['USER']
         if settings_dict['PASSWORD']:
             conn_params['password'] = force_str(settings_dict['PASSWORD'])
         if settings_dict['HOST']:
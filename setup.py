@@ -18,6 +18,5 @@ setup(name = "bpgsql",
       author = "Barry Pederson",
       author_email = "bp@barryp.org",
       url = "http://barryp.org/software/bpgsql/",
-      py_modules = ['bpgsql'],
-      packages = ['django_bpgsql'],
+      packages = ['bpgsql', 'django_bpgsql'],
      )
@@ -5,7 +5,11 @@ BPgSQL unittests
 2004-03-29 Barry Pederson <bp@barryp.org>
 
 """
+import socket
+import threading
 import unittest
+import uuid
+from io import BytesIO, StringIO
 from datetime import date, datetime, time
 try:
     from decimal import Decimal
@@ -20,6 +24,19 @@ import os
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 import bpgsql
+import bpgsql.pool
+try:
+    import asyncio
+    import bpgsql.aio
+except (ImportError, SyntaxError):
+    # Python 2
+    asyncio = None
+try:
+    import bpgsql.listen
+    listen = bpgsql.listen
+except ImportError:
+    # Python 2, no selectors module
+    listen = None
 
 DEFAULT_DSN = 'host=10.66.0.1 user=barryp dbname=test'
 
@@ -123,16 +140,466 @@ class InternalDSNParserTests(unittest.TestCase):
         self.assertEqual(d['j'], '21 32 abc')
 
 
+class InternalConnectArgsTests(unittest.TestCase):
+    """
+    Test working out which servers to try connecting to.
+
+    """
+    def targets(self, host, port):
+        return bpgsql._connect_targets({'host': host, 'port': port})
+
+    def test_single(self):
+        self.assertEqual(self.targets('db1', 5432), [('db1', 5432)])
+        self.assertEqual(self.targets('/tmp/.s.PGSQL.5432', ''), [('/tmp/.s.PGSQL.5432', 5432)])
+
+    def test_multiple(self):
+        self.assertEqual(self.targets('db1, db2', '5433'), [('db1', 5433), ('db2', 5433)])
+        self.assertEqual(self.targets('db1,db2', '5433,5434'), [('db1', 5433), ('db2', 5434)])
+        self.assertRaises(bpgsql.InterfaceError, self.targets, 'db1,db2', '1,2,3')
+        self.assertRaises(bpgsql.InterfaceError, self.targets, 'db1', 'abc')
+
+    def test_options(self):
+        args = bpgsql._connect_args('host=db1 connect_timeout=2.5', '', '', None, '', '', '', {})
+        self.assertEqual(bpgsql._connect_timeout(args), 2.5)
+        self.assertEqual(args['target_session_attrs'], 'any')
+        args = bpgsql._connect_args(None, '', '', None, '', '', '', {'connect_timeout': '0'})
+        self.assertEqual(bpgsql._connect_timeout(args), None)
+        self.assertRaises(bpgsql.InterfaceError, bpgsql._connect_args,
+            'target_session_attrs=bogus', '', '', None, '', '', '', {})
+        # a misspelled keyword argument isn't silently ignored
+        self.assertRaises(bpgsql.InterfaceError, bpgsql._connect_args,
+            None, '', '', None, '', '', '', {'conect_timeout': 5})
+
+    def test_session_attrs(self):
+        m = bpgsql._session_matches
+        self.assert_(m('any', True, True))
+        self.assert_(m('read-write', False, False))
+        self.assert_(not m('read-write', True, False))
+        self.assert_(m('read-only', True, False))
+        self.assert_(m('primary', True, False))
+        self.assert_(not m('primary', True, True))
+        self.assert_(m('standby', True, True))
+        self.assertEqual(bpgsql._session_passes('prefer-standby'), ['standby', 'any'])
+
+    def test_resolve(self):
+        self.assertEqual(bpgsql._resolve('/tmp/.s.PGSQL.5432', 5432), [(socket.AF_UNIX, '/tmp/.s.PGSQL.5432')])
+        addresses = bpgsql._resolve('127.0.0.1', 5432)
+        self.assertEqual(addresses, [(socket.AF_INET, ('127.0.0.1', 5432))])
+        self.assert_(bpgsql._resolve('127.0.0.1', 5432) is addresses)
+
+
+class InternalProtocolTests(unittest.TestCase):
+    """
+    Test internal helpers for the version 3 protocol.
+
+    """
+    def test_server_version(self):
+        self.assertEqual(bpgsql._parse_server_version('9.3.5'), 90305)
+        self.assertEqual(bpgsql._parse_server_version('8.4beta1'), 80400)
+        self.assertEqual(bpgsql._parse_server_version('10.4 (Debian 10.4-2)'), 100004)
+        self.assertEqual(bpgsql._parse_server_version('16.2'), 160002)
+        self.assertEqual(bpgsql._parse_server_version('devel'), None)
+
+    def test_error_fields(self):
+        fields = bpgsql._parse_message_fields(b'SERROR\0C23505\0Mduplicate key\0\0')
+        self.assertEqual(fields, {'S': 'ERROR', 'C': '23505', 'M': 'duplicate key'})
+        exc = bpgsql._error_from_fields(fields)
+        self.assertTrue(isinstance(exc, bpgsql.IntegrityError))
+        self.assertEqual(exc.pgcode, '23505')
+        self.assertEqual(str(exc), 'ERROR:  duplicate key')
+
+        exc = bpgsql._error_from_fields({'S': 'FATAL', 'C': 'P0001', 'M': 'oops'})
+        self.assertEqual(type(exc), bpgsql.DatabaseError)
+
+    def test_configure_socket(self):
+        class Socket(object):
+            def __init__(self):
+                self.options = {}
+            def setsockopt(self, level, name, value):
+                self.options[(level, name)] = value
+        args = dict(bpgsql._SOCKET_OPTIONS)
+        args.update({'keepalives_count': '3', 'rcvbuf': '65536'})
+
+        s = Socket()
+        bpgsql._configure_socket(s, args, True)
+        self.assertEqual(s.options[(socket.IPPROTO_TCP, socket.TCP_NODELAY)], 1)
+        self.assertEqual(s.options[(socket.SOL_SOCKET, socket.SO_KEEPALIVE)], 1)
+        self.assertEqual(s.options[(socket.SOL_SOCKET, socket.SO_RCVBUF)], 65536)
+        if hasattr(socket, 'TCP_KEEPCNT'):
+            self.assertEqual(s.options[(socket.IPPROTO_TCP, socket.TCP_KEEPCNT)], 3)
+
+        # only the buffer sizes apply to Unix sockets
+        s = Socket()
+        bpgsql._configure_socket(s, args, False)
+        self.assertEqual(list(s.options.keys()), [(socket.SOL_SOCKET, socket.SO_RCVBUF)])
+
+        args['sndbuf'] = 'big'
+        self.assertRaises(bpgsql.InterfaceError, bpgsql._configure_socket, Socket(), args, True)
+
+    def test_packet_handlers(self):
+        class SubConnection(bpgsql.Connection):
+            def _pkt_N(self, msg):
+                pass
+        handlers = bpgsql._packet_handlers(SubConnection)
+        self.assertEqual(handlers[b'N'], SubConnection._pkt_N)
+        self.assertEqual(handlers[b'D'], bpgsql.Connection._pkt_D)
+        self.assertNotEqual(bpgsql._packet_handlers(bpgsql.Connection)[b'N'], SubConnection._pkt_N)
+
+
+class InternalStatementTests(unittest.TestCase):
+    """
+    Test the helpers used for preparing statements.
+
+    """
+    def test_format_placeholders(self):
+        self.assertEqual(bpgsql._convert_placeholders('SELECT %s, %d', False), ('SELECT $1, $2', 2))
+        self.assertEqual(bpgsql._convert_placeholders("SELECT 'a%%', %s", False), ("SELECT 'a%', $1", 1))
+        self.assertEqual(bpgsql._convert_placeholders('SELECT 1', False), ('SELECT 1', 0))
+        self.assertEqual(bpgsql._convert_placeholders('SELECT %f', False), None)
+        self.assertEqual(bpgsql._convert_placeholders('SELECT %(a)s', False), None)
+
+    def test_pyformat_placeholders(self):
+        self.assertEqual(bpgsql._convert_placeholders('SELECT %(a)s, %(b)s, %(a)s', True),
+            ('SELECT $1, $2, $1', ['a', 'b']))
+        self.assertEqual(bpgsql._convert_placeholders('SELECT %s', True), None)
+
+    def test_statement_cache(self):
+        cache = bpgsql._StatementCache(2)
+        names = []
+        for key in ['a', 'b', 'c']:
+            self.assertEqual(cache.get(key), None)
+            stmt = bpgsql._PreparedStatement(cache.new_name(), key, 0, [])
+            names.append(stmt.name)
+            evicted = cache.put(key, stmt)
+        self.assertEqual(len(set(names)), 3)
+        self.assertEqual([x.sql for x in evicted], ['a'])
+        self.assertEqual(len(cache), 2)
+
+        # using 'b' makes 'c' the least recently used
+        self.assertEqual(cache.get('b').sql, 'b')
+        evicted = cache.put('d', bpgsql._PreparedStatement(cache.new_name(), 'd', 0, []))
+        self.assertEqual([x.sql for x in evicted], ['c'])
+        self.assertEqual(cache.evictions, 2)
+
+    def test_disabled_cache(self):
+        cache = bpgsql._StatementCache(0)
+        self.assertEqual(cache.new_name(), '')
+        self.assertEqual(cache.put('a', bpgsql._PreparedStatement('', 'a', 0, [])), [])
+        self.assertEqual(cache.get('a'), None)
+
+    def test_split_insert_values(self):
+        self.assertEqual(bpgsql._split_insert_values("INSERT INTO t (a, b) VALUES (%s, lower(%s)) ON CONFLICT DO NOTHING"),
+            ('INSERT INTO t (a, b) VALUES ', '(%s, lower(%s))', ' ON CONFLICT DO NOTHING'))
+        self.assertEqual(bpgsql._split_insert_values("""INSERT INTO "values" VALUES ('VALUES (', %s)"""),
+            ('INSERT INTO "values" VALUES ', "('VALUES (', %s)", ''))
+        self.assertEqual(bpgsql._split_insert_values('INSERT INTO t VALUES (1), (%s)'), None)
+        self.assertEqual(bpgsql._split_insert_values('INSERT INTO t VALUES (%s) RETURNING a'), None)
+        self.assertEqual(bpgsql._split_insert_values('INSERT INTO t VALUES (%s, %s) ON CONFLICT (a)\n DO  UPDATE SET b = EXCLUDED.b'), None)
+        self.assertEqual(bpgsql._split_insert_values('INSERT INTO t SELECT %s'), None)
+        self.assertEqual(bpgsql._split_insert_values('UPDATE t SET a = %s'), None)
+
+    def test_batch_placeholders(self):
+        self.assertEqual(bpgsql._batch_placeholders("(%s, %d, '%%')", False), ("(%s, %s, '%%')", [0, 1]))
+        self.assertEqual(bpgsql._batch_placeholders('(%(a)s, %(b)s, %(a)s)', True), ('(%s, %s, %s)', ['a', 'b', 'a']))
+        self.assertEqual(bpgsql._batch_placeholders('(%s, %(a)s)', False), None)
+        self.assertEqual(bpgsql._batch_placeholders('(%f)', False), None)
+
+    def test_copy_insert_target(self):
+        def target(cmd):
+            prefix, row, suffix = bpgsql._split_insert_values(cmd)
+            return bpgsql._copy_insert_target(prefix, bpgsql._batch_placeholders(row, False)[0], suffix)
+        self.assertEqual(target('INSERT INTO t (a, b) VALUES (%s, %s);'), 't (a, b)')
+        self.assertEqual(target('insert into "my table" values(%s)'), '"my table"')
+        self.assertEqual(target('INSERT INTO t VALUES (%s, lower(%s))'), None)
+        self.assertEqual(target('INSERT INTO t VALUES (%s) ON CONFLICT DO NOTHING'), None)
+
+    def test_accepts(self):
+        stmt = bpgsql._PreparedStatement('x', 'SELECT $1', 1, [bpgsql._INT8_OID])
+        self.assert_(stmt.accepts([bpgsql._INT8_OID], [2**40]))
+        self.assert_(stmt.accepts([bpgsql._INT4_OID], [1]))
+        self.assert_(stmt.accepts([bpgsql._UNKNOWN_OID], [None]))
+        self.assert_(not stmt.accepts([bpgsql._UNKNOWN_OID], ['abc']))
+        self.assert_(not stmt.accepts([bpgsql._NUMERIC_OID], [2**70]))
+
+
+class InternalBinaryConversionTests(unittest.TestCase):
+    """
+    Test the functions that convert binary values sent by the server.
+
+    """
+    def test_numeric(self):
+        conv = bpgsql._binary_numeric_to_python
+        # ndigits, weight, sign, dscale, base-10000 digits
+        self.assertEqual(conv(b'\x00\x00\x00\x00\x00\x00\x00\x00'), Decimal('0'))
+        self.assertEqual(conv(b'\x00\x02\x00\x00\x40\x00\x00\x01\x00\x01\x13\x88'), Decimal('-1.5'))
+        self.assertEqual(conv(b'\x00\x01\x00\x02\x00\x00\x00\x00\x00\x01'), Decimal('100000000'))
+        self.assertEqual(conv(b'\x00\x01\xff\xfe\x00\x00\x00\x05\x03\xe8'), Decimal('0.00001'))
+        self.assertEqual(conv(b'\x00\x02\x00\x00\x00\x00\x00\x06\x00\x03\x00\x01'), Decimal('3.000100'))
+        self.assert_(conv(b'\x00\x00\x00\x00\xc0\x00\x00\x00').is_nan())
+
+    def test_date(self):
+        conv = bpgsql._binary_date_to_python
+        self.assertEqual(conv(b'\x00\x00\x00\x00'), date(2000, 1, 1))
+        self.assertEqual(conv(b'\xff\xff\xff\xff'), date(1999, 12, 31))
+        self.assertRaises(bpgsql.DataError, conv, b'\x7f\xff\xff\xff')
+
+    def test_timestamp(self):
+        conv = bpgsql._binary_timestamp_to_python
+        self.assertEqual(conv(b'\x00\x00\x00\x00\x00\x00\x00\x01'), datetime(2000, 1, 1, 0, 0, 0, 1))
+        self.assertRaises(bpgsql.DataError, conv, b'\x7f\xff\xff\xff\xff\xff\xff\xff')
+        dt = bpgsql._binary_timestamptz_to_python(b'\xff\xff\xff\xff\xff\xff\xff\xff')
+        self.assertEqual(dt.utcoffset().seconds, 0)
+        self.assertEqual(dt.replace(tzinfo=None), datetime(1999, 12, 31, 23, 59, 59, 999999))
+
+    def test_timetz(self):
+        # 01:00:00 at 2 hours east of UTC
+        t = bpgsql._binary_timetz_to_python(b'\x00\x00\x00\x00\xd6\x93\xa4\x00\xff\xff\xe3\xe0')
+        self.assertEqual(t.replace(tzinfo=None), time(1, 0, 0))
+        self.assertEqual(t.utcoffset().seconds, 7200)
+
+    def test_numeric_param(self):
+        for s in ['0', '-1.5', '100000000', '0.00001', '3.000100', '1E+30',
+                  '-12345678901234567890.1234567890123']:
+            d = Decimal(s)
+            self.assertEqual(bpgsql._binary_numeric_to_python(bpgsql._numeric_param(d)), d)
+        self.assert_(bpgsql._binary_numeric_to_python(bpgsql._numeric_param(Decimal('NaN'))).is_nan())
+        # Python ints too big for int8
+        self.assertEqual(bpgsql._binary_numeric_to_python(bpgsql._numeric_param(2 ** 70)), 2 ** 70)
+
+    def test_copy_binary(self):
+        enc = bpgsql._COPY_ENCODERS
+        data = b''.join(bpgsql._copy_binary_chunks([(1, u'\xe9'), (None, 'x')], [enc['int2'], enc['text']], 1000))
+        self.assertEqual(data, b'PGCOPY\n\xff\r\n\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+            b'\x00\x02\x00\x00\x00\x02\x00\x01\x00\x00\x00\x02\xc3\xa9'
+            b'\x00\x02\xff\xff\xff\xff\x00\x00\x00\x01x'
+            b'\xff\xff')
+        chunks = list(bpgsql._copy_binary_chunks([(i,) for i in range(1000)], [enc['int8']], 100))
+        self.assert_(len(chunks) > 10)
+        self.assertEqual(len(b''.join(chunks)), 19 + 1000 * 14 + 2)
+
+    def test_copy_binary_records(self):
+        data = b''.join(bpgsql._copy_binary_chunks([(1, b'ab'), (None, b'')], [bpgsql._COPY_ENCODERS['int4'], bpgsql._COPY_ENCODERS['bytea']], 1000))
+        decoders = [bpgsql._binary_int4_to_python, bpgsql._binary_bytea_to_python]
+        # split up every which way
+        for size in (1, 7, 20, len(data)):
+            chunks = [data[i:i+size] for i in range(0, len(data), size)]
+            self.assertEqual(list(bpgsql._copy_binary_records(chunks, decoders)), [(1, b'ab'), (None, b'')])
+
+    def test_timestamp_param(self):
+        dt = datetime(1999, 12, 31, 23, 59, 59, 999999)
+        self.assertEqual(bpgsql._timestamp_param(dt), b'\xff\xff\xff\xff\xff\xff\xff\xff')
+        self.assertEqual(bpgsql._binary_timestamp_to_python(bpgsql._timestamp_param(dt)), dt)
+
+
+    def test_row_decoder(self):
+        decode_row = bpgsql._row_decoder([bpgsql._binary_int4_to_python, bpgsql._char_to_python, int])
+        msg = b'\x00\x03\x00\x00\x00\x04\x00\x00\x01\x00\xff\xff\xff\xff\x00\x00\x00\x0212'
+        self.assertEqual(decode_row(msg, 2), [256, None, 12])
+        self.assertEqual(bpgsql._row_decoder([])(b'\x00\x00', 2), [])
+
+        # the same types share the generated code
+        self.assert_(bpgsql._row_decoder([bpgsql._char_to_python, float]).__code__
+            is bpgsql._row_decoder([bpgsql._char_to_python, int]).__code__)
+
+    def test_copy_text_chunks(self):
+        encode = lambda x: bpgsql._COPY_TEXT_ENCODERS[type(x)](x)
+        records = [(1, 'a\tb\\'), (None, bpgsql.Binary(b'\x01')), (True, date(2020, 1, 2))]
+        self.assertEqual(b''.join(bpgsql._copy_text_chunks(records, [0, 1], encode, 10)),
+            b'1\ta\\tb\\\\\n\\N\t\\\\x01\nt\t2020-01-02\n')
+        self.assertEqual(b''.join(bpgsql._copy_text_chunks([{'a': 1, 'b': 'x'}], ['b', 'a'], encode, 10)), b'x\t1\n')
+        self.assertRaises(bpgsql.ProgrammingError, list, bpgsql._copy_text_chunks([(1,)], [0, 1], encode, 10))
+
+
+class ReceiveBufferTests(unittest.TestCase):
+    """
+    Test the internal buffer that holds data received from the backend.
+
+    """
+    def fill(self, buf, chunks, nbytes=4096):
+        def recv_into(view):
+            chunk = chunks.pop(0)
+            view[:len(chunk)] = chunk
+            return len(chunk)
+        return buf.recv_into(recv_into, nbytes)
+
+    def test_read(self):
+        buf = bpgsql._ReceiveBuffer(16)
+        self.fill(buf, [b'hello\0world'], 8)
+        self.assertEqual(len(buf), 11)
+        self.assertEqual(buf.find(b'\0'), 5)
+        self.assertEqual(buf.read(5), b'hello')
+        buf.skip(1)
+        self.assertEqual(buf.find(b'\0'), -1)
+        self.assertEqual(buf.read(5), b'world')
+        self.assertEqual(len(buf), 0)
+
+    def test_unpack(self):
+        buf = bpgsql._ReceiveBuffer(16)
+        self.fill(buf, [b'\x00\x00\x01\x00xyz'])
+        self.assertEqual(buf.unpack(bpgsql._INT32), (256,))
+        self.assertEqual(buf.read(3), b'xyz')
+
+    def test_compact_and_grow(self):
+        buf = bpgsql._ReceiveBuffer(8)
+        self.fill(buf, [b'abcdefgh'], 8)
+        self.assertEqual(buf.read(6), b'abcdef')
+
+        # room for 4 more after moving 'gh' back to the front
+        self.fill(buf, [b'ijkl'], 4)
+        self.assertEqual(len(buf.data), 8)
+        self.assertEqual(buf.start, 0)
+
+        # needs more room than the buffer has
+        self.fill(buf, [b'0123456789'], 10)
+        self.assertTrue(len(buf.data) >= 16)
+        self.assertEqual(buf.read(16), b'ghijkl0123456789')
+
+    def test_copy_data(self):
+        buf = bpgsql._ReceiveBuffer(64)
+        self.fill(buf, [b'd\x00\x00\x00\x06abd\x00\x00\x00\x05cd\x00\x00\x00\x08xy'])
+        chunks = []
+        # stops at the incomplete message
+        self.assertEqual(buf.copy_data(chunks), (3, False))
+        self.assertEqual(chunks, [b'ab', b'c'])
+        self.fill(buf, [b'zwc\x00\x00\x00\x04'])
+        self.assertEqual(buf.copy_data(chunks), (4, True))
+        self.assertEqual(chunks, [b'ab', b'c', b'xyzw'])
+        self.assertEqual(buf.read(1), b'c')
+
+    def test_data_rows(self):
+        buf = bpgsql._ReceiveBuffer(64)
+        row1 = b'D\x00\x00\x00\x10\x00\x02\x00\x00\x00\x0212\xff\xff\xff\xff'
+        row2 = b'D\x00\x00\x00\x10\x00\x02\x00\x00\x00\x013'
+        self.fill(buf, [row1 + row2])
+        rows = []
+        # stops at the incomplete message
+        buf.data_rows(rows, bpgsql._row_decoder([int, bpgsql._char_to_python]))
+        self.assertEqual(rows, [[12, None]])
+        self.fill(buf, [b'\x00\x00\x00\x01xC'])
+        buf.data_rows(rows, bpgsql._row_decoder([int, bpgsql._char_to_python]))
+        self.assertEqual(rows, [[12, None], [3, 'x']])
+        self.assertEqual(buf.read(1), b'C')
+
+
+class SendBufferTests(unittest.TestCase):
+    """
+    Test the buffer of data waiting to be sent to the backend.
+
+    """
+    class Socket(object):
+        # takes at most 7 bytes per call
+        def __init__(self):
+            self.sent = []
+        def send(self, data):
+            self.sent.append(bytes(data[:7]))
+            return len(self.sent[-1])
+
+    class ScatterSocket(Socket):
+        def sendmsg(self, buffers):
+            return self.send(b''.join([bytes(x) for x in buffers]))
+
+    def check_send(self, sock):
+        buf = bpgsql._SendBuffer()
+        buf.message(b'S')
+        buf.message(b'd', b'x' * 10000)
+        buf.append(b'abc')
+        self.assertEqual(len(buf), 5 + 10005 + 3)
+        expected = b'S\x00\x00\x00\x04d\x00\x00\x27\x14' + b'x' * 10000 + b'abc'
+        while buf:
+            buf.send(sock)
+        self.assertEqual(b''.join(sock.sent), expected)
+        self.assertEqual(buf.pieces, [])
+
+    def test_send(self):
+        self.check_send(self.Socket())
+
+    def test_sendmsg(self):
+        self.check_send(self.ScatterSocket())
+
+    def test_large_payload(self):
+        # large payloads aren't copied into the message
+        buf = bpgsql._SendBuffer()
+        payload = b'x' * 100000
+        buf.message(b'd', payload)
+        self.assert_(buf.pieces[-1] is payload)
+
+
+class ProtocolTests(unittest.TestCase):
+    """
+    Test the protocol state machine on its own, with
+    messages from the backend fed in by hand.
+
+    """
+    def message(self, msg_type, payload=b''):
+        return bpgsql._message(msg_type, payload)
+
+    def feed(self, protocol, data):
+        # feed the data a few bytes at a time
+        types = []
+        for i in range(0, len(data), 3):
+            protocol.receive_data(data[i:i+3])
+            while True:
+                msg_type = protocol.read_message()
+                if msg_type is None:
+                    break
+                types.append(msg_type)
+        self.assertEqual(protocol.bytes_needed(), 5)
+        return types
+
+    def test_startup(self):
+        protocol = bpgsql.Protocol()
+        protocol.startup('bob', dbname='test')
+        data = protocol.data_to_send()
+        self.assertEqual(data[4:8], b'\x00\x03\x00\x00')
+        self.assert_(b'user\0bob\0database\0test\0' in data)
+        self.assertEqual(protocol.data_to_send(), b'')
+
+        types = self.feed(protocol, self.message(b'R', b'\0\0\0\0')
+            + self.message(b'S', b'server_version\x0016.2\0')
+            + self.message(b'K', b'\0\0\0\x01\0\0\0\x02')
+            + self.message(b'Z', b'I'))
+        self.assertEqual(types, [b'R', b'S', b'K', b'Z'])
+        self.assert_(protocol._ready)
+        self.assertEqual(protocol.server_version, 160002)
+
+    def test_query(self):
+        protocol = bpgsql.Protocol()
+        protocol._register_oid(23, 'int4')
+        protocol._register_oid(25, 'text')
+        request = protocol._request('SELECT n, s FROM t')
+        self.assertEqual(request.data, self.message(b'Q', b'SELECT n, s FROM t\0'))
+        protocol._start_response(request)
+
+        description = b'\x00\x02' \
+            + b'n\0' + bpgsql._FIELD_DESCRIPTION.pack(0, 0, 23, 4, -1, 0) \
+            + b's\0' + bpgsql._FIELD_DESCRIPTION.pack(0, 0, 25, -1, -1, 0)
+        self.feed(protocol, self.message(b'T', description)
+            + self.message(b'D', b'\x00\x02\x00\x00\x00\x011\x00\x00\x00\x01a')
+            + self.message(b'D', b'\x00\x02\x00\x00\x00\x012\xff\xff\xff\xff')
+            + self.message(b'C', b'SELECT 2\0')
+            + self.message(b'Z', b'I'))
+        result, retry = protocol._response_done(request, True)
+        self.assertEqual(retry, None)
+        self.assertEqual(result.rows, [[1, 'a'], [2, None]])
+        self.assertEqual([d[0] for d in result.description], ['n', 's'])
+        self.assertEqual(result.completed, 'SELECT 2')
+
+    def test_unknown_message(self):
+        protocol = bpgsql.Protocol()
+        protocol.receive_data(self.message(b'#', b'x'))
+        self.assertRaises(bpgsql.InterfaceError, protocol.read_message)
+
+
 class TypeTests(ConnectedTests):
 
     def test_binary(self):
-        b = bpgsql.Binary(''.join([chr(x) for x in range(256)]))
+        b = bpgsql.Binary(bytes(bytearray(range(256))))
         self.cur.execute(r"SELECT %s, 'foo'::bytea", (b,))
         self.assertEqual(self.cur.rowcount, 1)
         row = self.cur.fetchone()
         self.assertEqual(len(row), 2)
         self.assertEqual(row[0], b)
-        self.assertEqual(row[1], 'foo')
+        self.assertEqual(row[1], b'foo')
         self.assertEqual(isinstance(row[1], bpgsql.Binary), True)
 
     def test_boolean(self):
@@ -288,6 +755,549 @@ class TypeTests(ConnectedTests):
         self.assertEqual(row[0], u'Hello\u1234World!')
 
 
+class ConnectionTests(ConnectedTests):
+    def test_parameter_status(self):
+        self.assertEqual(self.cnx.get_parameter_status('client_encoding'), 'UTF8')
+        self.assertEqual(self.cnx.get_parameter_status('standard_conforming_strings'), 'on')
+        self.assertEqual(self.cnx.get_parameter_status('no_such_parameter'), None)
+        self.assert_(self.cnx.server_version >= 70400)
+
+    def test_parameter_change(self):
+        self.cur.execute("SET TIME ZONE 'America/Chicago'")
+        self.assertEqual(self.cnx.get_parameter_status('TimeZone'), 'America/Chicago')
+
+    def test_error_recovery(self):
+        self.assertRaises(bpgsql.ProgrammingError, self.cur.execute, 'SELECT * FROM no_such_table')
+        self.cur.execute('SELECT 1')
+        self.assertEqual(self.cur.fetchone(), [1])
+
+    def test_wait_for_notify(self):
+        self.cur.execute('LISTEN test_notify')
+        self.assertRaises(bpgsql.PostgreSQL_Timeout, self.cnx.wait_for_notify, 0)
+        self.cur.execute("NOTIFY test_notify, 'some payload'")
+        self.cur.execute('NOTIFY test_notify')
+        pid = self.cnx.get_backend_pid()
+        self.assertEqual(self.cnx.wait_for_notify(5), ('test_notify', pid))
+        self.assertEqual(self.cnx._notifications(), [bpgsql.Notification('test_notify', '', pid)])
+
+    def test_backend_pid(self):
+        self.cur.execute('SELECT pg_backend_pid()')
+        self.assertEqual(self.cur.fetchone(), [self.cnx.get_backend_pid()])
+
+    def test_cancel(self):
+        t = threading.Timer(0.1, self.cnx.cancel)
+        t.start()
+        try:
+            self.cur.execute('SELECT pg_sleep(10)')
+        except bpgsql.OperationalError as e:
+            self.assertEqual(e.pgcode, '57014')
+            self.assert_(not isinstance(e, bpgsql.QueryTimeout))
+        else:
+            self.fail('command not canceled')
+        t.join()
+        self.cur.execute('SELECT 1')
+        self.assertEqual(self.cur.fetchone(), [1])
+
+    def test_timeout(self):
+        start = bpgsql._clock()
+        self.assertRaises(bpgsql.QueryTimeout, self.cur.execute, 'SELECT pg_sleep(10)', None, 0.1)
+        self.assert_(bpgsql._clock() - start < 5)
+        self.cur.execute('SELECT 1', timeout=5)
+        self.assertEqual(self.cur.fetchone(), [1])
+
+        cur = self.cnx.cursor(timeout=0.1)
+        self.assertRaises(bpgsql.QueryTimeout, cur.execute, 'SELECT pg_sleep(10)')
+        # a round trip, so a late cancel signal can't hit the next command
+        self.cur.execute('SELECT 1')
+        cur = self.cnx.cursor(name='timeout_test', timeout=0.1)
+        self.assertRaises(bpgsql.QueryTimeout, cur.execute, 'SELECT pg_sleep(10)')
+        self.cur.execute('SELECT 2')
+        self.assertEqual(self.cur.fetchone(), [2])
+
+
+class MultiHostTests(unittest.TestCase):
+    """
+    Test connecting with a list of hosts, some of which
+    don't answer.
+
+    """
+    def setUp(self):
+        self.args = bpgsql._connect_args(ConnectedTests.TEST_DSN, '', '', None, '', '', '', {})
+        #
+        # A listening socket that never gets around to accepting
+        # connections: the first one's taken by the kernel, then its
+        # backlog is full and attempts to connect just hang
+        #
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(0)
+        self.port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def connect(self, host, port, **kwargs):
+        a = self.args
+        return bpgsql.connect(None, a['user'], a['password'], host, a['dbname'], port, **kwargs)
+
+    def test_failover(self):
+        start = bpgsql._clock()
+        cnx = self.connect('/no/such/socket,%s' % self.args['host'], '5432,%s' % self.args['port'])
+        self.assert_(bpgsql._clock() - start < 1.0)
+        cur = cnx.cursor()
+        cur.execute('SELECT 1')
+        self.assertEqual(cur.fetchone(), [1])
+        cnx.close()
+
+    def test_connect_timeout(self):
+        start = bpgsql._clock()
+        self.assertRaises(bpgsql.OperationalError, self.connect,
+            '127.0.0.1', self.port, connect_timeout='0.2')
+        self.assert_(bpgsql._clock() - start < 1.0)
+
+    def test_happy_eyeballs(self):
+        blocked = []
+        try:
+            for i in range(3):
+                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                s.setblocking(False)
+                s.connect_ex(('127.0.0.1', self.port))
+                blocked.append(s)
+            start = bpgsql._clock()
+            cnx = self.connect('127.0.0.1,%s' % self.args['host'], '%d,%s' % (self.port, self.args['port']),
+                               connect_timeout='10')
+            self.assert_(bpgsql._clock() - start < 1.0)
+            cnx.close()
+        finally:
+            for s in blocked:
+                s.close()
+
+    def test_target_session_attrs(self):
+        cnx = self.connect(self.args['host'], self.args['port'], target_session_attrs='read-write')
+        cnx.close()
+        cnx = self.connect(self.args['host'], self.args['port'], target_session_attrs='prefer-standby')
+        cnx.close()
+        self.assertRaises(bpgsql.OperationalError, self.connect,
+            self.args['host'], self.args['port'], target_session_attrs='standby')
+
+
+class PreparedStatementTests(ConnectedTests):
+    def test_reuse(self):
+        cache = self.cnx.statement_cache
+        hits, misses = cache.hits, cache.misses
+        for i in range(5):
+            self.cur.execute('SELECT %s + 1, %s', (i, 'foo'))
+            self.assertEqual(self.cur.fetchone(), [i + 1, 'foo'])
+        self.assertEqual(cache.misses, misses + 1)
+        self.assertEqual(cache.hits, hits + 4)
+        self.assertEqual(self.cur.query, 'SELECT $1 + 1, $2')
+
+    def test_utility_commands(self):
+        # parameters can't be prepared for these, they're plugged in
+        misses = self.cnx.statement_cache.misses
+        self.cur.execute('SET TIME ZONE %s', ('UTC',))
+        self.assertEqual(self.cnx.get_parameter_status('TimeZone'), 'UTC')
+        self.cur.execute('LISTEN chan')
+        self.cur.execute('NOTIFY chan, %s', ("it's",))
+        self.assertEqual(self.cnx._notifications()[0].payload, "it's")
+        self.assertEqual(self.cnx.statement_cache.misses, misses)
+
+        # but commands that can take them still get prepared
+        self.cur.execute('  -- comment\n (SELECT %s)', (1,))
+        self.assertEqual(self.cur.fetchone(), [1])
+        self.assertEqual(self.cnx.statement_cache.misses, misses + 1)
+
+    def test_null_and_wider_types(self):
+        cache = self.cnx.statement_cache
+        self.cur.execute('SELECT %s', (2**40,))
+        misses = cache.misses
+        self.cur.execute('SELECT %s', (None,))
+        self.assertEqual(self.cur.fetchone(), [None])
+        self.cur.execute('SELECT %s', (12,))
+        self.assertEqual(self.cur.fetchone(), [12])
+        self.assertEqual(cache.misses, misses)
+
+        # a different type needs a new statement
+        self.cur.execute('SELECT %s', ('abc',))
+        self.assertEqual(self.cur.fetchone(), ['abc'])
+        self.assertEqual(cache.misses, misses + 1)
+
+    def test_eviction(self):
+        cnx = bpgsql.connect(self.TEST_DSN, statement_cache_size=2)
+        cur = cnx.cursor()
+        for i in range(4):
+            cur.execute('SELECT %s' + ', 1' * i, (i,))
+        self.assertEqual(len(cnx.statement_cache), 2)
+        self.assertEqual(cnx.statement_cache.evictions, 2)
+        cur.execute("SELECT count(*) FROM pg_prepared_statements")
+        self.assertEqual(cur.fetchone(), [2])
+        cnx.close()
+
+    def test_pyformat(self):
+        self.cur.execute('SELECT %(a)s, %(b)s, %(a)s', {'a': 1, 'b': 'x', 'c': None})
+        self.assertEqual(self.cur.fetchone(), [1, 'x', 1])
+        self.assertRaises(bpgsql.ProgrammingError, self.cur.execute, 'SELECT %(a)s', {})
+        self.assertRaises(bpgsql.ProgrammingError, self.cur.execute, 'SELECT %s, %s', (1,))
+
+    def test_discard(self):
+        self.cur.execute('SELECT %s', (1,))
+        self.cur.execute('DISCARD ALL')
+        self.assertEqual(len(self.cnx.statement_cache), 0)
+        self.cur.execute('SELECT %s', (1,))
+        self.assertEqual(self.cur.fetchone(), [1])
+
+    def test_changed_table(self):
+        self.cur.execute('CREATE TEMP TABLE test_changed (a integer)')
+        self.cur.execute('INSERT INTO test_changed VALUES (%s)', (1,))
+        self.cur.execute('SELECT * FROM test_changed WHERE a = %s', (1,))
+        self.cur.execute('ALTER TABLE test_changed ADD b text')
+        self.cur.execute('SELECT * FROM test_changed WHERE a = %s', (1,))
+        self.assertEqual(self.cur.fetchone(), [1, None])
+        self.assertEqual(len(self.cur.description), 2)
+
+
+class BinaryResultTests(ConnectedTests):
+    QUERY = """SELECT 1::int2, -2::int4, 1099511627776::int8, 1.5::float4,
+        1.25::float8, true, false, '\\\\x00ff'::bytea, '2008-06-11'::date,
+        '13:14:15.123456'::time, '13:14:15.5+05:30'::timetz,
+        '2008-12-31 15:21:17.25'::timestamp, '2008-12-31 15:21:17.25+02'::timestamptz,
+        -123456789.000100::numeric, 'c2d29867-3d0b-d497-9191-18a9d8ee7830'::uuid,
+        NULL::int4, 'text'::text, 12::oid, %s"""
+
+    def test_same_as_text(self):
+        self.cur.execute(self.QUERY, (3,))
+        text_row = self.cur.fetchone()
+
+        cur = self.cnx.cursor(binary=True)
+        for i in range(2):
+            # the first execution describes the statement, the second is binary
+            cur.execute(self.QUERY, (3,))
+            self.assertEqual(cur.fetchone(), text_row)
+
+    def test_connection_setting(self):
+        self.cnx.register_pgsql('int4', int, bpgsql.NUMBER, lambda s: ('binary', s))
+        self.cnx.binary = True
+        cur = self.cnx.cursor()
+        for i in range(2):
+            cur.execute('SELECT 7')
+        self.assertEqual(cur.fetchone(), [('binary', b'\x00\x00\x00\x07')])
+
+        cur = self.cnx.cursor(binary=False)
+        cur.execute('SELECT 7')
+        self.assertEqual(cur.fetchone(), [7])
+
+    def test_multiple_statements(self):
+        # can't be prepared, so they fall back to text
+        self.cur.execute('SELECT 1; SELECT 2')
+        text_rows = self.cur.fetchall()
+        cur = self.cnx.cursor(binary=True)
+        cur.execute('SELECT 1; SELECT 2')
+        self.assertEqual(cur.fetchall(), text_rows)
+        cur.execute("SELECT ';', $$;$$ -- ; SELECT\n;")
+        self.assertEqual(cur.fetchone(), [';', ';'])
+        self.assert_(bpgsql._multiple_statements('SET a = 1;SET b = 2'))
+        self.assert_(not bpgsql._multiple_statements("SELECT ';', E'\\';', \"a;b\", $x$;$x$ /* ; */ ;\n"))
+
+    def test_binary_parameters(self):
+        data = bpgsql.Binary(bytes(bytearray(range(256))) * 1000)
+        self.cur.execute('SELECT %s, length(%s)', (data, data))
+        self.assertEqual(self.cur.fetchone(), [data, 256000])
+
+        tz = bpgsql._SimpleTzInfo('+05:30')
+        for value in [datetime(2008, 12, 31, 15, 21, 17, 250000),
+                      datetime(2008, 12, 31, 15, 21, 17, 250000, tz),
+                      time(1, 2, 3, 4), time(1, 2, 3, 4, tz), date(1, 1, 1),
+                      Decimal('-123456789.000100'), 2 ** 40, 2 ** 70, 1.5, True]:
+            self.cur.execute('SELECT %s', (value,))
+            self.assertEqual(self.cur.fetchone(), [value])
+
+    def test_no_binary_converter(self):
+        self.cnx.register_pgsql('int4', int, bpgsql.NUMBER)
+        cur = self.cnx.cursor(binary=True)
+        for i in range(2):
+            cur.execute('SELECT 7, %s::int8', (8,))
+            self.assertEqual(cur.fetchone(), [7, 8])
+
+
+class StreamingCursorTests(ConnectedTests):
+    def test_fetch(self):
+        cur = self.cnx.cursor(stream=True)
+        cur.execute('SELECT g FROM generate_series(1, %s) g', (10,))
+        self.assertEqual(cur.description[0][0], 'g')
+        self.assertEqual(cur.rowcount, -1)
+        self.assertEqual(cur.fetchone(), [1])
+        self.assertEqual(cur.fetchmany(3), [[2], [3], [4]])
+        self.assertEqual([row for row in cur], [[5], [6], [7], [8], [9], [10]])
+        self.assertEqual(cur.rowcount, 10)
+        self.assertEqual(cur.fetchone(), None)
+        self.assertRaises(bpgsql.NotSupportedError, cur.scroll, 0)
+
+    def test_other_query(self):
+        cur = self.cnx.cursor(stream=True)
+        cur.execute('SELECT g FROM generate_series(1, 5) g')
+        self.assertEqual(cur.fetchone(), [1])
+        # the rest of the stream is read into memory
+        self.cur.execute('SELECT 42')
+        self.assertEqual(self.cur.fetchall(), [[42]])
+        self.assertEqual(cur.fetchall(), [[2], [3], [4], [5]])
+        self.assertEqual(cur.rowcount, 5)
+
+    def test_reexecute(self):
+        cur = self.cnx.cursor(stream=True)
+        cur.execute('SELECT g FROM generate_series(1, 100000) g')
+        cur.fetchone()
+        cur.execute('SELECT 2')
+        self.assertEqual(cur.fetchall(), [[2]])
+        self.assertEqual(cur.rowcount, 1)
+
+    def test_error(self):
+        cur = self.cnx.cursor(stream=True)
+        cur.execute('SELECT 10 / (5 - g) FROM generate_series(1, 10) g')
+        self.assertEqual(cur.fetchmany(4), [[2], [3], [5], [10]])
+        self.assertRaises(bpgsql.DataError, cur.fetchall)
+        self.cur.execute('SELECT 1')
+        self.assertEqual(self.cur.fetchall(), [[1]])
+
+    def test_no_rows(self):
+        cur = self.cnx.cursor(stream=True)
+        cur.execute('SELECT 1 WHERE false')
+        self.assertEqual(cur.fetchall(), [])
+        self.assertEqual(cur.rowcount, 0)
+
+
+class NamedCursorTests(ConnectedTests):
+    def open_cursors(self):
+        self.cur.execute('SELECT count(*) FROM pg_cursors')
+        return self.cur.fetchone()[0]
+
+    def test_fetch(self):
+        cur = self.cnx.cursor(name='test_cursor')
+        cur.execute('SELECT g, %s FROM generate_series(1, 5000) g', ('x',))
+        self.assertEqual(cur.description[0][0], 'g')
+        self.assertEqual(cur.rowcount, -1)
+        self.assertEqual(cur.fetchone(), [1, 'x'])
+        self.assertEqual(cur.fetchmany(2), [[2, 'x'], [3, 'x']])
+        self.assertEqual(self.open_cursors(), 1)
+        self.assertEqual(len([row for row in cur]), 4997)
+        self.assertEqual(cur.rowcount, 5000)
+        self.assert_(cur.itersize > 1)
+        # closed on the server once all the rows were fetched
+        self.assertEqual(self.open_cursors(), 0)
+        self.assertRaises(bpgsql.NotSupportedError, cur.scroll, 0)
+
+    def test_prefetch_limit(self):
+        cur = self.cnx.cursor(name='test_cursor')
+        cur.max_prefetch_bytes = 1000
+        cur.execute("SELECT repeat('x', 100) FROM generate_series(1, 1000)")
+        sizes = set([cur.itersize for row in cur])
+        self.assert_(max(sizes) <= 10)
+
+    def test_round_trip(self):
+        # a WITH HOLD cursor's DECLARE runs the whole query, which
+        # isn't mistaken for the round-trip time
+        cur = self.cnx.cursor(name='test_cursor')
+        cur.execute('SELECT g, pg_sleep(0.005) FROM generate_series(1, 100) g')
+        self.assert_(cur._Cursor__rtt < 0.25)
+        self.assertEqual(len(cur.fetchall()), 100)
+
+    def test_close(self):
+        cur = self.cnx.cursor(name='test "cursor"')
+        cur.execute('SELECT g FROM generate_series(1, 100) g')
+        cur.fetchone()
+        cur.close()
+        self.assertEqual(self.open_cursors(), 0)
+
+    def test_transaction(self):
+        self.cur.execute('BEGIN')
+        cur = self.cnx.cursor(name='test_cursor')
+        cur.execute('SELECT g FROM generate_series(1, 100) g')
+        self.assertEqual(cur.fetchmany(3), [[1], [2], [3]])
+        self.cnx.commit()
+        # the cursor went away with the transaction
+        cur.close()
+        self.assertEqual(self.open_cursors(), 0)
+
+
+class CopyTests(TableTests):
+    def setUp(self):
+        TableTests.setUp(self)
+        self.cur.execute('CREATE TABLE test_copy (id integer, name text)')
+
+    def test_copy_from_file(self):
+        data = ''.join(['%d\tname %d\n' % (i, i) for i in range(1000)])
+        self.cur.copy_from(BytesIO(data.encode('utf-8')), 'test_copy', size=100)
+        self.assertEqual(self.cur.rowcount, 1000)
+        self.cur.execute('SELECT count(*), max(name) FROM test_copy')
+        self.assertEqual(self.cur.fetchall(), [[1000, 'name 999']])
+
+    def test_copy_from_iterable(self):
+        rows = ['%d,"a, b"\n' % i for i in range(10)]
+        self.cur.copy_from(rows, 'test_copy', ['id', 'name'], 'csv')
+        self.assertEqual(self.cur.rowcount, 10)
+        self.cur.execute('SELECT name FROM test_copy LIMIT 1')
+        self.assertEqual(self.cur.fetchall(), [['a, b']])
+
+    def test_copy_from_failure(self):
+        def rows():
+            yield '1\tx\n'
+            raise ValueError('no more')
+        self.assertRaises(ValueError, self.cur.copy_from, rows(), 'test_copy')
+        self.assertRaises(bpgsql.DataError, self.cur.copy_from, ['x\ty\n'], 'test_copy')
+        self.assertRaises(bpgsql.ProgrammingError, self.cur.copy_from, [], 'test_copy', format='xml')
+        self.cur.execute('SELECT count(*) FROM test_copy')
+        self.assertEqual(self.cur.fetchall(), [[0]])
+
+    def test_copy_to(self):
+        self.cur.execute("INSERT INTO test_copy SELECT g, 'name ' || g FROM generate_series(1, 1000) g")
+        chunks = []
+        self.cur.copy_to(chunks.append, 'test_copy', size=1000)
+        self.assertEqual(self.cur.rowcount, 1000)
+        self.assert_(len(chunks) > 1)
+        data = b''.join(chunks)
+        self.assert_(data.startswith(b'1\tname 1\n2\tname 2\n'))
+
+        out = StringIO()
+        self.cur.copy_to(out, '(SELECT name FROM test_copy WHERE id < 3 ORDER BY id)', format='csv')
+        self.assertEqual(out.getvalue(), u'name 1\nname 2\n')
+
+    def test_copy_records(self):
+        self.cur.execute("""CREATE TABLE test_copy_records (i int2, b bigint, f real,
+            d double precision, n numeric, t varchar(10), by bytea, ts timestamp,
+            tstz timestamptz, dt date, tm time, bo boolean, u uuid)""")
+        record = (-2, 2 ** 40, 1.5, 0.25, Decimal('-12.3400'), u'h\xe9llo', bpgsql.Binary(b'\x00\xff'),
+            datetime(2008, 12, 31, 15, 21, 17, 250000), datetime(2008, 1, 2, 3, 4, 5, tzinfo=bpgsql._UTC),
+            date(1999, 1, 2), time(1, 2, 3, 4), True, uuid.UUID('c2d29867-3d0b-d497-9191-18a9d8ee7830'))
+        self.cur.copy_records('test_copy_records', None, [record, (None,) * 13])
+        self.assertEqual(self.cur.rowcount, 2)
+        self.cur.execute('SELECT * FROM test_copy_records')
+        rows = self.cur.fetchall()
+        self.assertEqual(rows[0][:8], list(record[:8]))
+        self.assertEqual(rows[0][8].replace(tzinfo=None), datetime(2008, 1, 2, 3, 4, 5) + rows[0][8].utcoffset())
+        self.assertEqual(rows[0][9:], list(record[9:]))
+        self.assertEqual(rows[1], [None] * 13)
+
+        self.cur.copy_records('test_copy', ['name', 'id'], [('a', 1), ('b', 2)])
+        self.cur.execute('SELECT * FROM test_copy ORDER BY id')
+        self.assertEqual(self.cur.fetchall(), [[1, 'a'], [2, 'b']])
+
+    def test_copy_records_json(self):
+        self.cur.execute('CREATE TABLE test_copy_json (a json, b jsonb)')
+        self.cur.copy_records('test_copy_json', ['a', 'b'],
+            [({'x': 1}, {'y': [1, None]}), ('[1, 2]', u'"h\xe9"'), (True, 1.5)])
+        self.cur.execute('SELECT a::text, b::text FROM test_copy_json')
+        self.assertEqual(self.cur.fetchall(),
+            [['{"x": 1}', '{"y": [1, null]}'], ['[1, 2]', u'"h\xe9"'], ['true', '1.5']])
+        self.assertRaises(bpgsql.DataError, self.cur.copy_records, 'test_copy_json', ['a', 'b'], [(None, object())])
+
+    def test_copy_records_errors(self):
+        self.assertRaises(bpgsql.ProgrammingError, self.cur.copy_records, 'test_copy', None, [(1,)])
+        self.cur.execute('CREATE TABLE test_copy_point (p point)')
+        self.assertRaises(bpgsql.NotSupportedError, self.cur.copy_records, 'test_copy_point', None, [(None,)])
+        self.cur.execute('SELECT count(*) FROM test_copy')
+        self.assertEqual(self.cur.fetchall(), [[0]])
+
+    def test_copy_records_out(self):
+        self.cur.copy_records('test_copy', None, [(i, 'name %d' % i) for i in range(1000)] + [(None, None)])
+        rows = self.cur.copy_records_out('test_copy')
+        self.assertEqual(next(rows), (0, 'name 0'))
+        self.assertEqual(len(list(rows)), 1000)
+        self.assertEqual(self.cur.rowcount, 1001)
+
+        self.assertEqual(list(self.cur.copy_records_out('(SELECT id * 2 FROM test_copy WHERE id < 3 ORDER BY id)')),
+            [(0,), (2,), (4,)])
+        self.assertEqual(list(self.cur.copy_records_out('test_copy', ['name']))[-1], (None,))
+
+    def test_copy_records_out_rowcount(self):
+        self.cur.execute('SELECT generate_series(1, 5)')
+        self.assertEqual(self.cur.rowcount, 5)
+        rows = list(self.cur.copy_records_out('(SELECT generate_series(1, 3) AS x)'))
+        self.assertEqual(rows, [(1,), (2,), (3,)])
+        self.assertEqual(self.cur.rowcount, 3)
+
+    def test_copy_records_out_interrupted(self):
+        self.cur.execute("INSERT INTO test_copy SELECT g, 'x' FROM generate_series(1, 10000) g")
+        # given up on
+        rows = self.cur.copy_records_out('test_copy')
+        next(rows)
+        rows.close()
+        self.cur.execute('SELECT 1')
+        self.assertEqual(self.cur.fetchall(), [[1]])
+
+        # connection used for something else
+        rows = self.cur.copy_records_out('test_copy')
+        next(rows)
+        self.cnx.cursor().execute('SELECT 1')
+        self.assertRaises(bpgsql.InterfaceError, list, rows)
+
+        rows = self.cur.copy_records_out('(SELECT 1 / (id - 5000) FROM test_copy)')
+        self.assertRaises(bpgsql.DataError, list, rows)
+        self.cur.execute('SELECT 1')
+        self.assertEqual(self.cur.fetchall(), [[1]])
+
+    def test_binary_round_trip(self):
+        self.cur.execute("INSERT INTO test_copy SELECT g, NULL FROM generate_series(1, 100) g")
+        out = BytesIO()
+        self.cur.copy_to(out, 'test_copy', format='binary')
+        out.seek(0)
+        self.cur.copy_from(out, 'test_copy', format='binary')
+        self.assertEqual(self.cur.rowcount, 100)
+
+
+class PipelineTests(TableTests):
+    def test_pipeline(self):
+        self.cur.execute("CREATE TABLE test_pipe (id integer PRIMARY KEY, name text)")
+        with self.cnx.pipeline() as p:
+            inserts = p.executemany('INSERT INTO test_pipe VALUES (%s, %s)',
+                [(i, 'name %d' % i) for i in range(100)])
+            select = p.execute('SELECT count(*), max(name) FROM test_pipe')
+            self.assertEqual(len(p), 101)
+            self.assertRaises(bpgsql.InterfaceError, self.cur.execute, 'SELECT 1')
+        self.assertEqual([c.rowcount for c in inserts], [1] * 100)
+        self.assertEqual(select.fetchall(), [[100, 'name 99']])
+
+    def test_error_isolation(self):
+        self.cur.execute("CREATE TABLE test_pipe (id integer PRIMARY KEY)")
+        p = self.cnx.pipeline()
+        first = p.execute('INSERT INTO test_pipe VALUES (%s)', (1,))
+        dup = p.execute('INSERT INTO test_pipe VALUES (%s)', (1,))
+        bad = p.execute('SELECT 1/0')
+        last = p.execute('SELECT count(*) FROM test_pipe')
+        self.assertRaises(bpgsql.IntegrityError, p.sync)
+        self.assertEqual(first.rowcount, 1)
+        self.assertRaises(bpgsql.Error, dup.fetchall)
+        self.assertRaises(bpgsql.Error, bad.fetchall)
+        self.assertEqual(last.fetchall(), [[1]])
+
+    def test_discard(self):
+        try:
+            with self.cnx.pipeline() as p:
+                p.execute('SELECT %s::int8 * 2', (21,))
+                raise ValueError
+        except ValueError:
+            pass
+        # the connection is usable and the statement wasn't left half-cached
+        self.cur.execute('SELECT %s::int8 * 2', (21,))
+        self.assertEqual(self.cur.fetchall(), [[42]])
+
+    def test_large(self):
+        # more than fits in the socket buffers both ways
+        with self.cnx.pipeline(binary=True) as p:
+            cursors = p.executemany('SELECT %s, repeat(%s, 1000)', [(i, 'x') for i in range(5000)])
+        self.assertEqual(cursors[-1].fetchall(), [[4999, 'x' * 1000]])
+
+    def test_send_timeout(self):
+        # a backend that stops reading can't block sync() past the socket's timeout
+        cnx = bpgsql.connect(self.TEST_DSN)
+        cnx._Connection__socket.settimeout(0.5)
+        p = cnx.pipeline()
+        p.execute('SELECT pg_sleep(5)')
+        p.executemany('SELECT %s', [('x' * 100000,)] * 500)
+        start = bpgsql._clock()
+        self.assertRaises(bpgsql.OperationalError, p.sync)
+        self.assert_(bpgsql._clock() - start < 4)
+        self.assertRaises(bpgsql.InterfaceError, cnx.cursor().execute, 'SELECT 1')
+
+
 class SelectTests(ConnectedTests):
     def test_description(self):
         self.cur.execute("SELECT oid, typname, typlen, typtype  from pg_type")
@@ -407,32 +1417,85 @@ class BasicTableTests(TableTests):
             self.assertEqual(row[1], 'bar-99')
 
 
+class ExecuteManyTests(TableTests):
+        def setUp(self):
+            TableTests.setUp(self)
+            self.cur.execute("CREATE TABLE test_many (id integer PRIMARY KEY, name text)")
+
+        def test_batched_insert(self):
+            misses = self.cnx.statement_cache.misses
+            self.cur.executemany("INSERT INTO test_many VALUES (%s, %s || '%%')",
+                (('%d' % i, 'n%d' % i) for i in range(250)))
+            self.assertEqual(self.cur.rowcount, 250)
+            # two full pages share a statement, the last one needs another
+            self.assertEqual(self.cnx.statement_cache.misses - misses, 2)
+            self.cur.execute("SELECT count(*), max(name) FROM test_many")
+            self.assertEqual(self.cur.fetchone(), [250, 'n99%'])
+
+        def test_pyformat(self):
+            self.cur.executemany("INSERT INTO test_many VALUES (%(id)s, %(name)s) ON CONFLICT DO NOTHING",
+                [{'id': 1, 'name': 'a'}, {'id': 1, 'name': 'b'}, {'id': 2, 'name': 'c'}], page_size=2)
+            self.assertEqual(self.cur.rowcount, 2)
+            self.cur.execute("SELECT * FROM test_many ORDER BY id")
+            self.assertEqual(self.cur.fetchall(), [[1, 'a'], [2, 'c']])
+
+        def test_upsert(self):
+            # a duplicate key in one page updates the row it inserted
+            self.cur.executemany("INSERT INTO test_many VALUES (%s, %s) ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name",
+                [(1, 'a'), (1, 'b'), (2, 'c')])
+            self.cur.execute("SELECT * FROM test_many ORDER BY id")
+            self.assertEqual(self.cur.fetchall(), [[1, 'b'], [2, 'c']])
+
+        def test_unbatched(self):
+            self.cur.executemany("INSERT INTO test_many VALUES (%s, %s) RETURNING id", [(1, 'a'), (2, 'b')])
+            self.assertEqual(self.cur.rowcount, -1)
+            self.cur.executemany("UPDATE test_many SET name = %s WHERE id = %s", [('c', 1), ('d', 2)])
+            self.assertEqual(self.cur.rowcount, -1)
+            self.cur.execute("SELECT * FROM test_many ORDER BY id")
+            self.assertEqual(self.cur.fetchall(), [[1, 'c'], [2, 'd']])
+
+        def test_copy(self):
+            self.cur.executemany("INSERT INTO test_many (name, id) VALUES (%(name)s, %(id)s)",
+                ({'id': i, 'name': 'n\t%d' % i} for i in range(250)), method='copy')
+            self.assertEqual(self.cur.rowcount, 250)
+            self.cur.execute("SELECT count(*), max(name) FROM test_many")
+            self.assertEqual(self.cur.fetchone(), [250, 'n\t99'])
+            self.assertRaises(bpgsql.NotSupportedError, self.cur.executemany,
+                "INSERT INTO test_many VALUES (%s, lower(%s))", [(1, 'a')], method='copy')
+
+        def test_bad_parameters(self):
+            self.assertRaises(bpgsql.ProgrammingError, self.cur.executemany,
+                "INSERT INTO test_many VALUES (%s, %s)", [(1, 'a'), (2,)])
+            self.assertRaises(bpgsql.ProgrammingError, self.cur.executemany,
+                "INSERT INTO test_many VALUES (%(id)s, %(name)s)", [{'id': 1}])
+
+
 class LargeObjectTests(ConnectedTests):
         def test_lobj(self):
             self.cur.execute("BEGIN")
             loid = self.cnx.lo_create()
 
             o = self.cnx.lo_open(loid, bpgsql.INV_WRITE)
-            o.write('hello')
-            o.write('world')
+            o.write(b'hello')
+            o.write(b'world')
             o.close()
 
             o = self.cnx.lo_open(loid, bpgsql.INV_READ)
             s = o.read(4096)
-            self.assertEqual(s, 'helloworld')
+            self.assertEqual(s, b'helloworld')
 
             o.seek(5, bpgsql.SEEK_SET)
             s = o.read(4096)
-            self.assertEqual(s, 'world')
+            self.assertEqual(s, b'world')
 
             o.seek(-2, bpgsql.SEEK_END)
             s = o.read(4096)
-            self.assertEqual(s, 'ld')
+            self.assertEqual(s, b'ld')
 
             o.seek(5, bpgsql.SEEK_SET)
             o.seek(-2, bpgsql.SEEK_CUR)
             s = o.read(2)
-            self.assertEqual(s, 'lo')
+            self.assertEqual(s, b'lo')
 
             self.assertEquals(o.tell(), 5)
 
@@ -442,6 +1505,506 @@ class LargeObjectTests(ConnectedTests):
             self.cnx.commit()
 
 
+class ListenerTests(unittest.TestCase):
+    """
+    Test bpgsql.listen, sending notifications from
+    a separate connection.
+
+    """
+    def setUp(self):
+        self.listener = listen.Listener(ConnectedTests.TEST_DSN)
+        self.cnx = bpgsql.connect(ConnectedTests.TEST_DSN)
+        self.cur = self.cnx.cursor()
+
+    def tearDown(self):
+        self.listener.close()
+        self.cnx.close()
+
+    def notify(self, *notifications):
+        # sent together, when the transaction commits
+        self.cur.execute('BEGIN')
+        for channel, payload in notifications:
+            self.cur.execute('SELECT pg_notify(%s, %s)', (channel, payload))
+        self.cur.execute('COMMIT')
+
+    def test_batches(self):
+        a1, a2, b = [], [], []
+        self.listener.subscribe('test_a', a1.append)
+        self.listener.subscribe('test_a', a2.append)
+        self.listener.subscribe('test_b', b.append)
+        self.listener.subscribe('test_b', a1.append)
+        self.assertEqual(sorted(self.listener.channels()), ['test_a', 'test_b'])
+
+        self.notify(('test_a', '1'), ('test_b', '2'), ('test_a', '3'))
+        self.assertEqual(self.listener.poll(5), 3)
+        self.assertEqual([[n.payload for n in batch] for batch in a1], [['1', '2', '3']])
+        self.assertEqual([[n.payload for n in batch] for batch in a2], [['1', '3']])
+        self.assertEqual([[n.payload for n in batch] for batch in b], [['2']])
+        self.assertEqual(a1[0][0], bpgsql.Notification('test_a', '1', self.cnx.get_backend_pid()))
+        self.assertEqual(self.listener.poll(0), 0)
+
+    def test_unsubscribe(self):
+        got = []
+        self.listener.subscribe('test_a', got.append)
+        self.listener.unsubscribe('test_a', got.append)
+        self.assertEqual(self.listener.channels(), [])
+        self.assertRaises(bpgsql.ProgrammingError, self.listener.unsubscribe, 'test_a', got.append)
+        self.notify(('test_a', 'x'))
+        self.assertEqual(self.listener.poll(0.2), 0)
+        self.assertEqual(got, [])
+
+    def test_thread(self):
+        got = []
+        done = threading.Event()
+        def callback(batch):
+            got.extend(batch)
+            if len(got) >= 100:
+                done.set()
+        self.listener.subscribe('test_a', callback)
+        self.listener.start()
+        self.notify(*[('test_a', str(i)) for i in range(50)])
+        self.listener.notify('test_a', 'more')
+        self.notify(*[('test_a', str(i)) for i in range(49)])
+        self.assert_(done.wait(5))
+        self.assertEqual(len(got), 100)
+
+        # subscribing while the thread is waiting
+        other = []
+        self.listener.subscribe('test_b', other.append)
+        self.notify(('test_b', 'x'))
+        for i in range(50):
+            if other:
+                break
+            threading.Event().wait(0.1)
+        self.assertEqual(len(other), 1)
+
+    def test_errors(self):
+        errors = []
+        got = []
+        def broken(batch):
+            raise ValueError('oops')
+        self.listener.on_error = lambda e, batch: errors.append((e, batch))
+        self.listener.subscribe('test_a', broken)
+        self.listener.subscribe('test_a', got.append)
+        self.notify(('test_a', 'x'))
+        self.assertEqual(self.listener.poll(5), 1)
+        self.assertEqual(len(got), 1)
+        self.assertEqual(len(errors), 1)
+        self.assert_(isinstance(errors[0][0], ValueError))
+
+    def listener_pid(self):
+        # the listener's backend, from a notification it sent
+        got = []
+        self.listener.subscribe('test_pid', got.append)
+        self.listener.notify('test_pid')
+        self.assertEqual(self.listener.poll(5), 1)
+        return got[0][0].pid
+
+    def terminate(self, pid):
+        self.cur.execute('SELECT pg_terminate_backend(%s)', (pid,))
+
+    def test_connection_lost(self):
+        errors = []
+        done = threading.Event()
+        def on_error(e, batch):
+            errors.append((e, batch))
+            done.set()
+        self.listener.on_error = on_error
+        pid = self.listener_pid()
+        self.listener.start()
+        self.terminate(pid)
+        self.assert_(done.wait(5))
+        self.assert_(isinstance(errors[0][0], bpgsql.OperationalError))
+        self.assertEqual(errors[0][1], [])
+        self.assertRaises(bpgsql.InterfaceError, self.listener.subscribe, 'test_a', len)
+        # the error was reported, so closing doesn't raise it again
+        self.listener.close()
+
+    def test_connection_lost_close(self):
+        # without on_error, run() returns and leaves the error for close()
+        self.terminate(self.listener_pid())
+        self.listener.run()
+        self.assertRaises(bpgsql.OperationalError, self.listener.close)
+        self.listener.close()
+
+    def test_connection_lost_poll(self):
+        self.terminate(self.listener_pid())
+        self.assertRaises(bpgsql.OperationalError, self.listener.poll, 5)
+        self.assertRaises(bpgsql.OperationalError, self.listener.poll, 0)
+        self.listener.close()
+
+
+class PoolTests(unittest.TestCase):
+    """
+    Test bpgsql.pool
+
+    """
+    def setUp(self):
+        self.pool = bpgsql.pool.ConnectionPool(ConnectedTests.TEST_DSN, minconn=1, maxconn=2, timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_reuse(self):
+        self.assertEqual(self.pool.stats()['idle'], 1)
+        cnx = self.pool.getconn()
+        self.pool.putconn(cnx)
+        self.assert_(self.pool.getconn() is cnx)
+        self.assertRaises(bpgsql.ProgrammingError, self.pool.putconn, bpgsql.connect(ConnectedTests.TEST_DSN))
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['utilisation'], 0.5)
+        self.assertEqual(stats['opened'], 1)
+
+    def test_connection(self):
+        with self.pool.connection() as cnx:
+            cur = cnx.cursor()
+            cur.execute('CREATE TEMP TABLE test_pool (a integer)')
+            cur.execute('BEGIN')
+            cur.execute('INSERT INTO test_pool VALUES (1)')
+        self.assertEqual(cnx._transaction()[0], b'I')
+
+        # rolled back if the block raises
+        try:
+            with self.pool.connection() as cnx:
+                cur = cnx.cursor()
+                cur.execute('BEGIN')
+                cur.execute('INSERT INTO test_pool VALUES (2)')
+                raise ValueError
+        except ValueError:
+            pass
+        cur = self.pool.getconn().cursor()
+        cur.execute('SELECT a FROM test_pool')
+        self.assertEqual(cur.fetchall(), [[1]])
+
+    def test_rollback_on_return(self):
+        cnx = self.pool.getconn()
+        cur = cnx.cursor()
+        cur.execute('BEGIN')
+        self.assertRaises(bpgsql.ProgrammingError, cur.execute, 'SELECT nosuch')
+        self.assertEqual(cnx._transaction()[0], b'E')
+        self.pool.putconn(cnx)
+        self.assertEqual(cnx._transaction()[0], b'I')
+
+    def test_timeout(self):
+        a = self.pool.getconn()
+        self.pool.getconn()
+        self.assertRaises(bpgsql.pool.PoolTimeout, self.pool.getconn, 0.05)
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+        self.pool.putconn(a)
+        self.assert_(self.pool.getconn(0) is a)
+
+        # a pool timeout of None waits as long as it takes
+        self.pool.timeout = None
+        t = threading.Timer(0.1, self.pool.putconn, (a,))
+        t.start()
+        self.assert_(self.pool.getconn() is a)
+        t.join()
+
+    def test_reap(self):
+        cnxs = [self.pool.getconn(), self.pool.getconn()]
+        for cnx in cnxs:
+            self.pool.putconn(cnx)
+        self.assertEqual(self.pool.stats()['idle'], 2)
+
+        # idle ones beyond minconn are closed
+        self.pool.max_idle = 0
+        self.pool.reap()
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+        # expired ones are closed when they're given back
+        self.pool.max_lifetime = 0
+        self.pool.putconn(self.pool.getconn())
+        stats = self.pool.stats()
+        self.assertEqual((stats['size'], stats['closed']), (0, 3))
+
+    def test_health_check(self):
+        cnx = self.pool.getconn()
+        cur = cnx.cursor()
+        cur.execute('SELECT pg_backend_pid()')
+        pid = cur.fetchone()[0]
+        self.pool.putconn(cnx)
+
+        other = bpgsql.connect(ConnectedTests.TEST_DSN)
+        other.cursor().execute('SELECT pg_terminate_backend(%s)', (pid,))
+        other.close()
+
+        self.pool.check_interval = 0
+        cnx = self.pool.getconn()
+        cur = cnx.cursor()
+        cur.execute('SELECT pg_backend_pid()')
+        self.assertNotEqual(cur.fetchone()[0], pid)
+
+    def test_reset(self):
+        self.pool.reset = 'DISCARD ALL'
+        cnx = self.pool.getconn()
+        cur = cnx.cursor()
+        cur.execute("SET application_name = 'test_pool'")
+        cur.execute('SELECT %s', (1,))
+        self.assertEqual(len(cnx.statement_cache), 1)
+        self.pool.putconn(cnx)
+        self.assertEqual(len(cnx.statement_cache), 0)
+
+        cur = self.pool.getconn().cursor()
+        cur.execute("SELECT current_setting('application_name'), %s", (1,))
+        self.assertEqual(cur.fetchone(), ['', 1])
+
+
+    def test_fork(self):
+        if not hasattr(os, 'fork'):
+            return
+        cnx = self.pool.getconn()
+        cur = cnx.cursor()
+        cur.execute('SELECT pg_backend_pid()')
+        pid = cur.fetchone()[0]
+        self.pool.putconn(cnx)
+
+        child = os.fork()
+        if child == 0:
+            # the child's own connections, the inherited one can't be used
+            status = 1
+            try:
+                self.assertRaises(bpgsql.InterfaceError, cur.execute, 'SELECT 1')
+                child_cnx = self.pool.getconn()
+                self.assert_(child_cnx is not cnx)
+                self.assertEqual(self.pool.stats()['opened'], 1)
+                child_cur = child_cnx.cursor()
+                child_cur.execute('SELECT pg_backend_pid()')
+                self.assertNotEqual(child_cur.fetchone()[0], pid)
+                self.pool.close()
+                status = 0
+            finally:
+                os._exit(status)
+        self.assertEqual(os.waitpid(child, 0)[1], 0)
+
+        # the parent's connection is still there
+        cur.execute('SELECT pg_backend_pid()')
+        self.assertEqual(cur.fetchone()[0], pid)
+
+
+class AsyncConnectionTests(unittest.TestCase):
+    """
+    Test bpgsql.aio, driving the coroutines from
+    a new event loop for each test.
+
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.cnx = self.run_async(bpgsql.aio.connect(ConnectedTests.TEST_DSN))
+        self.cur = self.cnx.cursor()
+
+    def tearDown(self):
+        self.run_async(self.cnx.close())
+        self.loop.close()
+        self.cnx = self.cur = None
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def collect(self, iterator):
+        #
+        # Run an asynchronous iterator to the end, returning a list
+        #
+        result = []
+        while True:
+            try:
+                result.append(self.run_async(iterator.__anext__()))
+            except StopAsyncIteration:
+                return result
+
+    def test_execute(self):
+        self.run_async(self.cur.execute('SELECT %s, %s', (1, 'foo')))
+        self.assertEqual(self.cur.rowcount, 1)
+        self.assertEqual([d[0] for d in self.cur.description], ['?column?', '?column?'])
+        self.assertEqual(self.run_async(self.cur.fetchall()), [[1, 'foo']])
+        self.assertEqual(self.run_async(self.cur.fetchone()), None)
+
+    def test_error_recovery(self):
+        self.assertRaises(bpgsql.ProgrammingError, self.run_async, self.cur.execute('SELECT nosuch'))
+        self.run_async(self.cur.execute('SELECT 1'))
+        self.assertEqual(self.run_async(self.cur.fetchone()), [1])
+
+    def test_types(self):
+        self.run_async(self.cur.execute("SELECT '2004-03-29'::date, 1.5::numeric, 'foo'::bytea"))
+        self.assertEqual(self.run_async(self.cur.fetchone()), [date(2004, 3, 29), Decimal('1.5'), b'foo'])
+
+    def test_iteration(self):
+        self.run_async(self.cur.execute('SELECT generate_series(1, 5)'))
+        self.assertEqual(self.collect(self.cur), [[1], [2], [3], [4], [5]])
+
+    def test_streaming(self):
+        cur = self.cnx.cursor(stream=True)
+        self.run_async(cur.execute('SELECT generate_series(1, 10000)'))
+        self.assertEqual(cur.rowcount, -1)
+        self.assertEqual(self.run_async(cur.fetchmany(3)), [[1], [2], [3]])
+
+        # another command reads the rest of the rows first
+        self.run_async(self.cur.execute('SELECT 1'))
+        rows = self.collect(cur)
+        self.assertEqual(len(rows), 9997)
+        self.assertEqual(rows[-1], [10000])
+        self.assertEqual(cur.rowcount, 10000)
+
+    def test_concurrent(self):
+        # commands from tasks sharing the connection take turns
+        cursors = [self.cnx.cursor() for i in range(50)]
+        tasks = [asyncio.ensure_future(cur.execute('SELECT %s', (i,)), loop=self.loop) for i, cur in enumerate(cursors)]
+        self.run_async(asyncio.gather(*tasks))
+        self.assertEqual([self.run_async(cur.fetchone())[0] for cur in cursors], list(range(50)))
+
+    def test_timeout(self):
+        self.assertRaises(bpgsql.QueryTimeout, self.run_async,
+                          self.cur.execute('SELECT pg_sleep(10)', None, 0.1))
+        self.run_async(self.cur.execute('SELECT 1'))
+        self.assertEqual(self.run_async(self.cur.fetchone()), [1])
+
+        # canceled from another task, which is waited for along with
+        # a round trip, so a late cancel signal can't hit what's next
+        cancels = []
+        self.loop.call_later(0.1, lambda: cancels.append(asyncio.ensure_future(self.cnx.cancel(), loop=self.loop)))
+        self.assertRaises(bpgsql.OperationalError, self.run_async, self.cur.execute('SELECT pg_sleep(10)'))
+        self.run_async(cancels[0])
+        self.run_async(self.cur.execute('SELECT 1'))
+        self.assertEqual(self.run_async(self.cur.fetchone()), [1])
+
+        # a canceled task leaves the connection closed
+        self.assertRaises(asyncio.TimeoutError, self.run_async,
+                          asyncio.wait_for(self.cur.execute('SELECT pg_sleep(10)'), 0.1))
+        self.assertRaises(bpgsql.InterfaceError, self.run_async, self.cur.execute('SELECT 1'))
+        self.cnx = self.run_async(bpgsql.aio.connect(ConnectedTests.TEST_DSN))
+
+    def test_failover(self):
+        a = bpgsql._connect_args(ConnectedTests.TEST_DSN, '', '', None, '', '', '', {})
+        cnx = self.run_async(bpgsql.aio.connect(None, a['user'], a['password'],
+            '/no/such/socket,%s' % a['host'], a['dbname'], '5432,%s' % a['port'],
+            connect_timeout='5', target_session_attrs='read-write'))
+        cur = cnx.cursor()
+        self.run_async(cur.execute('SELECT 1'))
+        self.assertEqual(self.run_async(cur.fetchone()), [1])
+        self.run_async(cnx.close())
+
+    def test_wait_for_notify(self):
+        self.run_async(self.cur.execute('LISTEN test_aio'))
+        self.assertRaises(bpgsql.PostgreSQL_Timeout, self.run_async, self.cnx.wait_for_notify(0))
+
+        cnx = bpgsql.connect(ConnectedTests.TEST_DSN)
+        cnx.cursor().execute('NOTIFY test_aio')
+        cnx.close()
+        name, pid = self.run_async(self.cnx.wait_for_notify(5))
+        self.assertEqual(name, 'test_aio')
+
+    def test_copy(self):
+        self.run_async(self.cur.execute('CREATE TEMP TABLE test_aio (a integer, b text)'))
+        self.run_async(self.cur.copy_from(StringIO(u'1\tfoo\n2\tbar\n'), 'test_aio'))
+        self.assertEqual(self.cur.rowcount, 2)
+        self.run_async(self.cur.copy_records('test_aio', ['a'], [(3,)]))
+        self.run_async(self.cur.executemany('INSERT INTO test_aio (a, b) VALUES (%s, %s)', [(4, 'x')], method='copy'))
+
+        out = BytesIO()
+        self.run_async(self.cur.copy_to(out, '(SELECT * FROM test_aio ORDER BY a)'))
+        self.assertEqual(out.getvalue(), b'1\tfoo\n2\tbar\n3\t\\N\n4\tx\n')
+        self.assertEqual(self.cur.rowcount, 4)
+
+        rows = self.collect(self.cur.copy_records_out('test_aio', ['a', 'b']))
+        self.assertEqual(sorted(rows), [(1, 'foo'), (2, 'bar'), (3, None), (4, 'x')])
+        self.assertEqual(self.cur.rowcount, 4)
+
+
+class AsyncPoolTests(unittest.TestCase):
+    """
+    Test bpgsql.aio.AsyncConnectionPool
+
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.pool = bpgsql.aio.AsyncConnectionPool(ConnectedTests.TEST_DSN, minconn=1, maxconn=2, timeout=5)
+        self.run_async(self.pool.open())
+
+    def tearDown(self):
+        self.run_async(self.pool.close())
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def backend_pid(self, cnx):
+        cur = cnx.cursor()
+        self.run_async(cur.execute('SELECT pg_backend_pid()'))
+        return self.run_async(cur.fetchone())[0]
+
+    def test_reuse(self):
+        cnx = self.run_async(self.pool.acquire())
+        self.run_async(self.pool.release(cnx))
+        self.assert_(self.run_async(self.pool.acquire()) is cnx)
+        self.assertRaises(bpgsql.ProgrammingError, self.run_async, self.pool.release(object()))
+        stats = self.pool.stats()
+        self.assertEqual((stats['requests'], stats['in_use'], stats['opened']), (2, 1, 1))
+
+    def test_fairness(self):
+        held = [self.run_async(self.pool.acquire()), self.run_async(self.pool.acquire())]
+        tasks = [asyncio.ensure_future(self.pool.acquire(), loop=self.loop) for i in range(3)]
+        self.run_async(asyncio.sleep(0.01))
+        self.assertEqual(self.pool.stats()['waiting'], 3)
+
+        # waiting tasks get connections in the order they asked
+        self.run_async(self.pool.release(held[0]))
+        self.run_async(asyncio.sleep(0.01))
+        self.assertEqual([t.done() for t in tasks], [True, False, False])
+        self.assert_(tasks[0].result() is held[0])
+        self.run_async(self.pool.release(held[1]))
+        self.run_async(self.pool.release(tasks[0].result()))
+        self.run_async(asyncio.sleep(0.01))
+        self.assertEqual([t.done() for t in tasks], [True, True, True])
+
+    def test_timeout(self):
+        held = [self.run_async(self.pool.acquire()), self.run_async(self.pool.acquire())]
+        self.assertRaises(bpgsql.pool.PoolTimeout, self.run_async, self.pool.acquire(0.05))
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+        self.assertEqual(self.pool.stats()['waiting'], 0)
+        self.run_async(self.pool.release(held[0]))
+        self.assert_(self.run_async(self.pool.acquire(0)) is held[0])
+
+        # a pool timeout of None waits as long as it takes
+        self.pool.timeout = None
+        self.loop.call_later(0.1, lambda: asyncio.ensure_future(self.pool.release(held[1]), loop=self.loop))
+        self.assert_(self.run_async(self.pool.acquire()) is held[1])
+
+    def test_connection(self):
+        # a transaction block left open is committed
+        pool_connection = self.pool.connection()
+        cnx = self.run_async(pool_connection.__aenter__())
+        cur = cnx.cursor()
+        self.run_async(cur.execute('BEGIN'))
+        self.run_async(cur.execute('CREATE TEMP TABLE test_pool (a integer)'))
+        self.run_async(pool_connection.__aexit__(None, None, None))
+        self.assertEqual(cnx._transaction()[0], b'I')
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+        self.run_async(cur.execute('SELECT * FROM test_pool'))
+
+    def test_replenish(self):
+        cnx = self.run_async(self.pool.acquire())
+        self.run_async(self.pool.release(cnx, close=True))
+        self.assertEqual(self.pool.stats()['size'], 0)
+        self.run_async(self.pool.maintain())
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+    def test_health_check(self):
+        cnx = self.run_async(self.pool.acquire())
+        pid = self.backend_pid(cnx)
+        self.run_async(self.pool.release(cnx))
+        other = bpgsql.connect(ConnectedTests.TEST_DSN)
+        other.cursor().execute('SELECT pg_terminate_backend(%s)', (pid,))
+        other.close()
+
+        self.pool.check_interval = 0
+        self.run_async(self.pool.maintain())
+        stats = self.pool.stats()
+        self.assertEqual((stats['size'], stats['closed']), (1, 1))
+        self.assertNotEqual(self.backend_pid(self.run_async(self.pool.acquire())), pid)
+
+
 def main():
     parser = OptionParser(usage='usage: %prog [options]')
     parser.add_option('--dsn', dest='dsn',
@@ -454,11 +2017,33 @@ def main():
     all_tests = []
     all_tests.append(unittest.makeSuite(DBAPIInterfaceTests, 'test_'))
     all_tests.append(unittest.makeSuite(InternalDSNParserTests, 'test_'))
+    all_tests.append(unittest.makeSuite(InternalConnectArgsTests, 'test_'))
+    all_tests.append(unittest.makeSuite(InternalProtocolTests, 'test_'))
+    all_tests.append(unittest.makeSuite(InternalStatementTests, 'test_'))
+    all_tests.append(unittest.makeSuite(InternalBinaryConversionTests, 'test_'))
+    all_tests.append(unittest.makeSuite(ReceiveBufferTests, 'test_'))
+    all_tests.append(unittest.makeSuite(SendBufferTests, 'test_'))
+    all_tests.append(unittest.makeSuite(ProtocolTests, 'test_'))
     all_tests.append(unittest.makeSuite(TypeTests, 'test_'))
+    all_tests.append(unittest.makeSuite(ConnectionTests, 'test_'))
+    all_tests.append(unittest.makeSuite(MultiHostTests, 'test_'))
+    all_tests.append(unittest.makeSuite(PreparedStatementTests, 'test_'))
+    all_tests.append(unittest.makeSuite(BinaryResultTests, 'test_'))
+    all_tests.append(unittest.makeSuite(StreamingCursorTests, 'test_'))
+    all_tests.append(unittest.makeSuite(NamedCursorTests, 'test_'))
+    all_tests.append(unittest.makeSuite(CopyTests, 'test_'))
+    all_tests.append(unittest.makeSuite(PipelineTests, 'test_'))
     all_tests.append(unittest.makeSuite(SelectTests, 'test_'))
     all_tests.append(unittest.makeSuite(CursorTests, 'test_'))
     all_tests.append(unittest.makeSuite(BasicTableTests, 'test_'))
+    all_tests.append(unittest.makeSuite(ExecuteManyTests, 'test_'))
     all_tests.append(unittest.makeSuite(LargeObjectTests, 'test_'))
+    if listen is not None:
+        all_tests.append(unittest.makeSuite(ListenerTests, 'test_'))
+    all_tests.append(unittest.makeSuite(PoolTests, 'test_'))
+    if asyncio is not None:
+        all_tests.append(unittest.makeSuite(AsyncConnectionTests, 'test_'))
+        all_tests.append(unittest.makeSuite(AsyncPoolTests, 'test_'))
 
     suite = unittest.TestSuite(all_tests)
 